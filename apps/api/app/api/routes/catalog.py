@@ -1,18 +1,39 @@
 from __future__ import annotations
 
+import logging
+from typing import Any
+
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy.orm import Session
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload
 
 from app.api.deps import get_admin_user, get_db
+from app.core.config import settings
 from app.models.block_definition import BlockDefinition
+from app.models.block_instance import BlockInstance
+from app.models.project import Project
+from app.models.republish_job import RepublishJob
 from app.schemas.block import (
     BlockDefinitionSchema,
     BlockDefinitionCreate,
     BlockDefinitionUpdate,
+    RepublishJobRead,
 )
+from app.schemas.domain import CachePurgeRequest
 from app.models.user import User
+from app.services.publisher import render_cache_stats
+from app.services.publishing import publish_targets
+from app.services.purge import purge_hostnames
+from app.services.republish import RENDER_FIELDS, queue_republish
+from app.services.storage import storage_stats
 
 router = APIRouter(prefix="/catalog", tags=["catalog"])
+logger = logging.getLogger("renderly.catalog")
+
+
+def _republish_location(job: RepublishJob) -> str:
+    return f"{settings.api_prefix}/catalog/blocks/{job.definition_id}/republish/{job.id}"
 
 
 @router.get("/blocks", response_model=list[BlockDefinitionSchema])
@@ -20,6 +41,50 @@ def list_blocks(db: Session = Depends(get_db)) -> list[BlockDefinition]:
     return db.query(BlockDefinition).order_by(BlockDefinition.category, BlockDefinition.name).all()
 
 
+@router.get("/render-cache")
+def get_render_cache_stats(current_user: User = Depends(get_admin_user)) -> dict[str, dict[str, int]]:
+    return render_cache_stats()
+
+
+@router.get("/storage")
+def get_storage_stats(current_user: User = Depends(get_admin_user)) -> dict[str, Any]:
+    return storage_stats()
+
+
+@router.post("/purge")
+def purge_published_cache(
+    payload: CachePurgeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> dict[str, Any]:
+    """Evict cached published pages by hostname, by project, or for every published project using a block."""
+    if payload.hostname is None and payload.project_id is None and payload.block_definition_id is None:
+        raise HTTPException(status_code=400, detail="Specify hostname, project_id or block_definition_id")
+    hostnames: set[str] = set()
+    if payload.hostname:
+        hostnames.add(payload.hostname.strip().lower().rstrip("."))
+    if payload.project_id is not None:
+        project = db.get(Project, payload.project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        hostnames.update(publish_targets(project))
+    if payload.block_definition_id is not None:
+        if not db.get(BlockDefinition, payload.block_definition_id):
+            raise HTTPException(status_code=404, detail="Block definition not found")
+        projects = (
+            db.query(Project)
+            .options(selectinload(Project.domains))
+            .filter(
+                Project.status == "published",
+                Project.blocks.any(BlockInstance.definition_id == payload.block_definition_id),
+            )
+            .all()
+        )
+        for project in projects:
+            hostnames.update(publish_targets(project))
+    return purge_hostnames(hostnames)
+
+
 @router.post(
     "/blocks",
     response_model=BlockDefinitionSchema,
@@ -43,6 +108,7 @@ def create_block_definition(
 def update_block_definition(
     block_id: int,
     payload: BlockDefinitionUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user),
 ) -> BlockDefinition:
@@ -50,14 +116,55 @@ def update_block_definition(
     if not obj:
         raise HTTPException(status_code=404, detail="Block definition not found")
     data = payload.model_dump(exclude_none=True)
+    rendering_changed = any(key in RENDER_FIELDS and getattr(obj, key) != value for key, value in data.items())
     for key, value in data.items():
         setattr(obj, key, value)
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    if rendering_changed:
+        # published pages pick up the new template in the background, batch by batch
+        try:
+            job = queue_republish(db, obj.id, current_user.id)
+        except Exception:  # noqa: BLE001 - the edit itself is saved; republish can be retried
+            logger.exception("could not queue a republish for block definition %s", obj.id)
+        else:
+            response.headers["Location"] = _republish_location(job)
     return obj
 
 
+@router.post("/blocks/{block_id}/republish", response_model=RepublishJobRead, status_code=status.HTTP_202_ACCEPTED)
+def republish_block_definition(
+    block_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> JSONResponse:
+    if not db.get(BlockDefinition, block_id):
+        raise HTTPException(status_code=404, detail="Block definition not found")
+    try:
+        job = queue_republish(db, block_id, current_user.id)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=503, detail="Publish queue is unavailable") from exc
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=jsonable_encoder(RepublishJobRead.model_validate(job)),
+        headers={"Location": _republish_location(job)},
+    )
+
+
+@router.get("/blocks/{block_id}/republish/{job_id}", response_model=RepublishJobRead)
+def republish_job_status(
+    block_id: int,
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user),
+) -> RepublishJob:
+    job = db.get(RepublishJob, job_id)
+    if not job or job.definition_id != block_id:
+        raise HTTPException(status_code=404, detail="Republish job not found")
+    return job
+
+
 @router.delete("/blocks/{block_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
 def delete_block_definition(
     block_id: int,
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Response, Query
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 import secrets
 import re
@@ -32,11 +33,13 @@ from app.schemas.project_member import (
     ProjectMemberUpdate,
 )
 from app.services.access import ProjectRole, ensure_role, get_project_with_role
-from app.services.publisher import snapshot_project, render_project_html
+from app.services.publisher import render_project_html, snapshot_project, stream_project_html
+from app.services.render_timing import collect_render_timings
 from app.services.localization import ensure_locales, sanitize_locale_payload
 from app.services.audit import record_event
 from app.services.domain_manager import verify_domain, DomainVerificationError
-from app.services.custom_domains import persist_domain_html
+from app.services.publishing import latest_published_version
+from app.services.routing import delete_routes, route_for, set_routes
 from app.services import revision_service
 
 router = APIRouter(prefix="/projects", tags=["projects"])
@@ -349,6 +352,11 @@ def verify_domain_binding(
     db.add(domain)
     db.commit()
     db.refresh(domain)
+    latest = latest_published_version(db, project.id)
+    if domain.status == "verified" and latest and project.status == "published":
+        set_routes([domain.hostname], route_for(project, latest))
+    elif domain.status != "verified":
+        delete_routes([domain.hostname])
     return _serialize_domain(domain)
 
 
@@ -372,8 +380,10 @@ def remove_domain(
     )
     if not domain:
         raise HTTPException(status_code=404, detail="Domain not found")
+    hostname = domain.hostname
     db.delete(domain)
     db.commit()
+    delete_routes([hostname])
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -558,17 +568,19 @@ def export_project(
 def export_project_html(
     project_id: int,
     lang: str | None = None,
+    timings: bool = Query(False),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     project, _ = get_project_with_role(project_id, current_user, db)
-    html = render_project_html(project, lang)
     filename = f"{project.slug or 'project'}-{project.id}.html"
-    return Response(
-        content=html,
-        media_type="text/html",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if timings:
+        with collect_render_timings() as render_timings:
+            html = render_project_html(project, lang)
+        headers["Server-Timing"] = render_timings.server_timing()
+        return Response(html, media_type="text/html", headers=headers)
+    return StreamingResponse(stream_project_html(project, lang), media_type="text/html", headers=headers)
 
 
 @router.post("/import", response_model=ProjectDetail, status_code=status.HTTP_201_CREATED)
@@ -1,120 +1,141 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, status
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+from typing import Any
 
-from app.api.deps import get_current_user, get_db
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+
+from app.api.deps import get_admin_user, get_current_user, get_db
 from app.core.config import settings
+from app.core.security import decode_token
+from app.db.session import SessionLocal
+from app.models.block_definition import BlockDefinition
+from app.models.block_instance import BlockInstance
 from app.models.project import Project
+from app.models.publish_job import PublishJob
 from app.models.published_version import PublishedVersion
 from app.models.user import User
-from app.schemas.project import PublicationResponse, PublicationInfo
-from app.services.publisher import render_project_html, version_for_project, snapshot_project
-from app.services.cdn import upload_html, delete_html
+from app.schemas.project import ProjectRenderBatch, PublicationResponse, PublicationInfo, PublishJobRead
+from app.services.publisher import (
+    render_block_fragments,
+    render_project_html,
+    snapshot_project,
+    stream_project_html,
+)
+from app.services.publishing import (
+    PublishError,
+    active_publish_job,
+    custom_domain_url,
+    enqueue_publish,
+    latest_published_version,
+    publish_project as run_publish,
+    remove_published_artifacts,
+)
+from app.services.batch_render import ndjson_lines, render_batch_records
+from app.services.render_timing import collect_render_timings
 from app.services.access import ProjectRole, ensure_role, get_project_with_role
-from app.services.audit import record_event
-from app.services.localization import ensure_locales
-from app.services.custom_domains import persist_domain_html, remove_domain_html
-from app.services.slugify import slugify
+from app.services.render_model import RenderProject
+from app.services.preview_sessions import PreviewOperationError, PreviewSession, render_preview_request
+
+logger = logging.getLogger("renderly.publish")
 
 router = APIRouter(prefix="/projects", tags=["publish"])
 
 
-def _default_project_hostname(project: Project) -> str | None:
-    root = (settings.project_subdomain_root or "").strip().lstrip(".")
-    if not root:
-        return None
-    if project.title:
-        base = slugify(project.title)
-    else:
-        base = ""
-    if not base:
-        fallback_slug = (project.slug or "").strip().lower()
-        base = slugify(fallback_slug) or f"project-{project.id}"
-    return f"{base}.{root.lower()}"
-
-
-def _project_subdomain_url(hostname: str) -> str:
-    scheme = (settings.project_subdomain_scheme or settings.custom_domain_proxy_scheme or "https").strip()
-    if not scheme:
-        scheme = "https"
-    return f"{scheme}://{hostname}/"
-
-
-def _publish_default_domain(project: Project, html: str) -> tuple[str | None, str | None]:
-    hostname = _default_project_hostname(project)
-    if not hostname:
-        persist_domain_html(project.slug, html)
-        return None, None
-    object_name = f"domains/{hostname}/index.html"
-    try:
-        upload_html(object_name, html)
-    except RuntimeError as exc:
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
-    persist_domain_html(hostname, html)
-    return hostname, _project_subdomain_url(hostname)
+def _publication_info(published: PublishedVersion, custom_url: str | None) -> PublicationInfo:
+    locales = (published.meta or {}).get("locales") or {}
+    return PublicationInfo(
+        version=published.version,
+        cdn_url=published.cdn_url,
+        object_path=published.object_path,
+        custom_domain_url=custom_url,
+        locales={locale: info["cdn_url"] for locale, info in locales.items()},
+    )
+
+
+def _publish_job_read(job: PublishJob) -> PublishJobRead:
+    publication = None
+    if job.published_version is not None:
+        publication = _publication_info(job.published_version, (job.result or {}).get("custom_domain_url"))
+    return PublishJobRead(
+        id=job.id,
+        project_id=job.project_id,
+        status=job.status,
+        stage=job.stage,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        publication=publication,
+    )
 
 
 @router.post("/{project_id}/publish", response_model=PublicationResponse)
 def publish_project(
     project_id: int,
     lang: str | None = Query(None),
+    all_locales: bool = Query(False),
+    timings: bool = Query(False),
+    run_async: bool = Query(False, alias="async"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> PublicationResponse:
+) -> PublicationResponse | JSONResponse:
     project, role = get_project_with_role(project_id, current_user, db)
     ensure_role(role, ProjectRole.owner)
-    html = render_project_html(project, lang)
-    version = version_for_project(project)
-    object_path = f"{project.slug}/{version}.html"
+    if run_async:
+        params = {"lang": lang, "all_locales": all_locales, "timings": timings}
+        # repeated clicks while a publish is pending join it instead of queueing duplicates
+        job = active_publish_job(db, project.id, params)
+        if job is None:
+            job = PublishJob(project_id=project.id, user_id=current_user.id, status="queued", params=params)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            try:
+                enqueue_publish(job.id)
+            except Exception as exc:  # noqa: BLE001
+                job.status = "failed"
+                job.error_message = "Publish queue is unavailable"
+                db.add(job)
+                db.commit()
+                raise HTTPException(status_code=503, detail="Publish queue is unavailable") from exc
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(_publish_job_read(job)),
+            headers={"Location": f"{settings.api_prefix}/projects/{project.id}/publish/jobs/{job.id}"},
+        )
     try:
-        stored_path, cdn_url = upload_html(object_path, html)
-    except RuntimeError as exc:
+        result = run_publish(
+            db,
+            project,
+            user_id=current_user.id,
+            lang=lang,
+            all_locales=all_locales,
+            timings=timings,
+        )
+    except PublishError as exc:
         raise HTTPException(status_code=502, detail=str(exc)) from exc
-    _, default_url = _publish_default_domain(project, html)
-    verified_domains = [domain for domain in project.domains if domain.status == "verified"]
-    custom_url = default_url
-    for domain in verified_domains:
-        domain_object = f"domains/{domain.hostname}/index.html"
-        try:
-            upload_html(domain_object, html)
-        except RuntimeError:
-            continue
-        persist_domain_html(domain.hostname, html)
-        if not custom_url or custom_url == default_url:
-            custom_url = f"{settings.custom_domain_proxy_scheme}://{domain.hostname}/"
-    published = PublishedVersion(
-        project_id=project.id,
-        version=version,
-        object_path=stored_path,
-        cdn_url=cdn_url,
-        meta={"block_count": len(project.blocks)},
-    )
-    project.status = "published"
-    db.add_all([project, published])
-    db.commit()
-    db.refresh(project)
-    record_event(
-        db,
-        action="project.publish",
-        project_id=project.id,
-        user_id=current_user.id,
-        payload={
-            "version": published.version,
-            "cdn_url": published.cdn_url,
-            "object_path": published.object_path,
-            "custom_domain_url": custom_url,
-        },
-    )
-    return PublicationResponse(
-        project=project,
-        publication=PublicationInfo(
-            version=published.version,
-            cdn_url=published.cdn_url,
-            object_path=published.object_path,
-            custom_domain_url=custom_url,
-        ),
-    )
+    return PublicationResponse(project=project, publication=_publication_info(result.published, result.custom_domain_url))
+
+
+@router.get("/{project_id}/publish/jobs/{job_id}", response_model=PublishJobRead)
+def publish_job_status(
+    project_id: int,
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> PublishJobRead:
+    project, role = get_project_with_role(project_id, current_user, db)
+    ensure_role(role, ProjectRole.editor)
+    job = db.get(PublishJob, job_id)
+    if not job or job.project_id != project.id:
+        raise HTTPException(status_code=404, detail="Publish job not found")
+    return _publish_job_read(job)
 
 
 @router.get("/{project_id}/published/latest", response_model=PublicationInfo)
@@ -125,28 +146,10 @@ def latest_publication(
 ) -> PublicationInfo:
     project, role = get_project_with_role(project_id, current_user, db)
     ensure_role(role, ProjectRole.editor)
-    latest = (
-        db.query(PublishedVersion)
-        .filter(PublishedVersion.project_id == project.id)
-        .order_by(PublishedVersion.created_at.desc())
-        .first()
-    )
+    latest = latest_published_version(db, project.id)
     if not latest:
         raise HTTPException(status_code=404, detail="Project has no published versions")
-    verified_domain = next((d for d in project.domains if d.status == "verified"), None)
-    custom_url = None
-    if verified_domain:
-        custom_url = f"{settings.custom_domain_proxy_scheme}://{verified_domain.hostname}/"
-    if not custom_url:
-        fallback_host = _default_project_hostname(project)
-        if fallback_host:
-            custom_url = _project_subdomain_url(fallback_host)
-    return PublicationInfo(
-        version=latest.version,
-        cdn_url=latest.cdn_url,
-        object_path=latest.object_path,
-        custom_domain_url=custom_url,
-    )
+    return _publication_info(latest, custom_domain_url(project))
 
 
 @router.delete(
@@ -161,34 +164,10 @@ def delete_latest_publication(
 ) -> Response:
     project, role = get_project_with_role(project_id, current_user, db)
     ensure_role(role, ProjectRole.owner)
-    latest = (
-        db.query(PublishedVersion)
-        .filter(PublishedVersion.project_id == project.id)
-        .order_by(PublishedVersion.created_at.desc())
-        .first()
-    )
+    latest = latest_published_version(db, project.id)
     if not latest:
         raise HTTPException(status_code=404, detail="Project has no published versions")
-    try:
-        delete_html(latest.object_path)
-    except RuntimeError:
-        pass
-    default_host = _default_project_hostname(project)
-    if default_host:
-        try:
-            delete_html(f"domains/{default_host}/index.html")
-        except RuntimeError:
-            pass
-        remove_domain_html(default_host)
-    for domain in project.domains:
-        if domain.status != "verified":
-            continue
-        domain_object = f"domains/{domain.hostname}/index.html"
-        try:
-            delete_html(domain_object)
-        except RuntimeError:
-            pass
-        remove_domain_html(domain.hostname)
+    remove_published_artifacts(db, project, latest)
     db.delete(latest)
     project.status = "draft"
     db.add(project)
@@ -196,64 +175,175 @@ def delete_latest_publication(
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+def _build_preview_project(project: Project, payload: dict) -> RenderProject:
+    snapshot = snapshot_project(project)
+    if "blocks" in payload:
+        snapshot["blocks"] = payload["blocks"]
+    if "project" in payload:
+        snapshot["project"].update(payload["project"])
+    definitions = {block.definition.key: block.definition for block in project.blocks}
+    return RenderProject.from_snapshot(snapshot, definitions)
+
+
+@router.post("/render/batch", response_class=StreamingResponse)
+def render_projects_batch(
+    payload: ProjectRenderBatch,
+    lang: str | None = Query(None),
+    db: Session = Depends(get_db),
+    _: User = Depends(get_admin_user),
+) -> StreamingResponse:
+    project_ids = list(dict.fromkeys(payload.project_ids))
+    if len(project_ids) > settings.batch_render_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_render_max_items} projects per batch",
+        )
+    projects = (
+        db.query(Project)
+        .options(selectinload(Project.blocks).joinedload(BlockInstance.definition))
+        .filter(Project.id.in_(project_ids))
+        .all()
+    )
+    # detach before streaming: the pool renders after this session is gone
+    render_projects = [(project.id, RenderProject.from_orm(project)) for project in projects]
+    found = {project_id for project_id, _ in render_projects}
+
+    def records():
+        for project_id in project_ids:
+            if project_id not in found:
+                yield {"project_id": project_id, "error": "Project not found"}
+        yield from render_batch_records(render_projects, "project_id", lang)
+
+    return StreamingResponse(ndjson_lines(records()), media_type="application/x-ndjson")
+
+
 @router.post("/{project_id}/preview")
 def preview_project(
     project_id: int,
+    response: Response,
     payload: dict = Body(...),
     lang: str | None = Query(None),
+    timings: bool = Query(False),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> dict[str, str]:
+) -> dict[str, Any]:
     project, role = get_project_with_role(project_id, current_user, db)
     ensure_role(role, ProjectRole.editor)
-    snapshot = snapshot_project(project)
-    if "blocks" in payload:
-        snapshot["blocks"] = payload["blocks"]
-    if "project" in payload:
-        snapshot["project"].update(payload["project"])
+    preview_project = _build_preview_project(project, payload)
+    changed_block_ids = payload.get("changed_block_ids")
+    if changed_block_ids is not None and not isinstance(changed_block_ids, list):
+        raise HTTPException(status_code=400, detail="changed_block_ids must be a list")
+    with collect_render_timings(timings) as render_timings:
+        if changed_block_ids is not None:
+            # the editor patches these sections into the loaded page instead of reloading it
+            result: dict[str, Any] = render_block_fragments(preview_project, changed_block_ids, lang)
+        else:
+            result = {"html": render_project_html(preview_project, lang)}
+    if render_timings:
+        response.headers["Server-Timing"] = render_timings.server_timing()
+    return result
 
-    title = snapshot["project"]["title"]
-    theme = snapshot["project"].get("theme") or {}
-    settings = snapshot["project"].get("settings") or {}
-    ensure_locales(settings)
 
-    definitions = {block.definition.key: block.definition for block in project.blocks}
+@router.post("/{project_id}/preview/html", response_class=StreamingResponse)
+def preview_project_html(
+    project_id: int,
+    payload: dict = Body(...),
+    lang: str | None = Query(None),
+    timings: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Response:
+    project, role = get_project_with_role(project_id, current_user, db)
+    ensure_role(role, ProjectRole.editor)
+    preview_project = _build_preview_project(project, payload)
+    if timings:
+        # headers go out before the body, so a timed preview is rendered up front
+        with collect_render_timings() as render_timings:
+            html = render_project_html(preview_project, lang)
+        return Response(html, media_type="text/html", headers={"Server-Timing": render_timings.server_timing()})
+    return StreamingResponse(stream_project_html(preview_project, lang), media_type="text/html")
 
-    class PreviewBlock:
-        def __init__(self, definition, order_index, config, translations, block_id=None):
-            self.definition = definition
-            self.order_index = order_index
-            self.config = config
-            self.translations = translations or {}
-            self.id = block_id
-
-    class PreviewProject:
-        def __init__(self, title, theme, settings, blocks):
-            self.title = title
-            self.theme = theme
-            self.settings = settings
-            self.blocks = blocks
-
-    blocks = []
-    for order, block_data in enumerate(snapshot["blocks"]):
-        definition = definitions.get(block_data.get("definition_key"))
-        if not definition:
-            class InlineDefinition:
-                def __init__(self, key: str):
-                    self.key = key
-                    self.default_config = {}
-
-            definition = InlineDefinition(block_data.get("definition_key", "unknown"))
-        blocks.append(
-            PreviewBlock(
-                definition=definition,
-                order_index=block_data.get("order_index", order),
-                config=block_data.get("config") or definition.default_config,
-                translations=block_data.get("translations") or {},
-                block_id=block_data.get("id"),
-            )
-        )
 
-    preview_project = PreviewProject(title, theme, settings, blocks)
-    html = render_project_html(preview_project, lang)
-    return {"html": html}
+def _websocket_user(db: Session, token: str | None) -> User | None:
+    if not token:
+        return None
+    try:
+        payload = decode_token(token)
+    except ValueError:
+        return None
+    return db.query(User).filter(User.email == payload["sub"]).first()
+
+
+@router.websocket("/{project_id}/preview/ws")
+async def preview_session_socket(
+    websocket: WebSocket,
+    project_id: int,
+    token: str | None = Query(None),
+    lang: str | None = Query(None),
+) -> None:
+    # the session copies everything it needs, so the connection goes back to the pool
+    # before the socket loop instead of staying checked out for the editor's lifetime
+    db = SessionLocal()
+    try:
+        # browsers cannot set headers on a WebSocket handshake, so the JWT comes in the query string
+        user = _websocket_user(db, token)
+        if user is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        try:
+            project, role = get_project_with_role(project_id, user, db)
+            ensure_role(role, ProjectRole.editor)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        definitions = {definition.key: definition for definition in db.query(BlockDefinition).all()}
+        session = PreviewSession(project, definitions, lang)
+    finally:
+        db.close()
+    await websocket.accept()
+
+    changed = asyncio.Event()
+    changed.set()
+
+    async def render_loop() -> None:
+        while True:
+            await changed.wait()
+            changed.clear()
+            if not session.has_pending:
+                continue
+            request = session.take_render_request()
+            try:
+                result = await run_in_threadpool(render_preview_request, request)
+            except Exception as exc:  # noqa: BLE001 - one bad render must not end the session
+                logger.exception("preview render failed for project %s", project_id)
+                await websocket.send_json({"type": "error", "seq": request.seq, "detail": f"Render failed: {exc}"})
+                continue
+            if session.is_superseded(request):
+                session.requeue(request)
+                changed.set()
+                continue
+            await websocket.send_json(result)
+
+    renderer = asyncio.create_task(render_loop())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object"})
+                continue
+            try:
+                session.apply(message)
+            except PreviewOperationError as exc:
+                await websocket.send_json({"type": "error", "seq": message.get("seq"), "detail": str(exc)})
+                continue
+            changed.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        renderer.cancel()
+        try:
+            await renderer
+        except asyncio.CancelledError:
+            pass
+        except Exception:  # noqa: BLE001 - e.g. a send racing the disconnect
+            logger.debug("preview renderer for project %s stopped with an error", project_id, exc_info=True)
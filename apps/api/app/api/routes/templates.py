@@ -1,14 +1,14 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, get_db, get_admin_user
+from app.core.config import settings
 from app.models.block_definition import BlockDefinition
 from app.models.block_instance import BlockInstance
 from app.models.community_template import CommunityTemplate, CommunityTemplateComment
@@ -18,12 +18,15 @@ from app.schemas.project import ProjectDetail
 from app.schemas.template import (
     TemplateComment,
     TemplateCommentCreate,
+    TemplatePreviewBatch,
     TemplatePublish,
     TemplateUpdate,
     TemplateSummary,
 )
+from app.services.batch_render import ndjson_lines, render_batch_records
 from app.services.publisher import render_project_html, snapshot_project
 from app.services.localization import ensure_locales
+from app.services.render_model import RenderProject
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
@@ -236,6 +239,80 @@ def add_template_comment(
     return _serialize_comment(comment)
 
 
+def _snapshot_definitions(db: Session, snapshots: list[dict]) -> dict[str, BlockDefinition]:
+    """Catalog definitions used by any of ``snapshots``, fetched in a single query."""
+    block_keys = {
+        block.get("definition_key")
+        for snapshot in snapshots
+        for block in snapshot.get("blocks") or []
+        if block.get("definition_key")
+    }
+    if not block_keys:
+        return {}
+    return {
+        definition.key: definition
+        for definition in db.query(BlockDefinition)
+        .filter(BlockDefinition.key.in_(block_keys))
+        .all()
+    }
+
+
+def _hide_scrollbars(html: str) -> str:
+    return html.replace(
+        "</head>",
+        "<style>body::-webkit-scrollbar{display:none;}body{scrollbar-width:none;}</style></head>",
+        1,
+    )
+
+
+def _allow_origin(response: Response, request: Request | None) -> None:
+    origin = request.headers.get("origin") if request else None
+    if origin:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Vary"] = "Origin"
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+
+
+@router.post("/preview/batch")
+def template_preview_batch(
+    payload: TemplatePreviewBatch,
+    request: Request,
+    lang: str | None = Query(default=None),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    template_ids = list(dict.fromkeys(payload.template_ids))
+    if len(template_ids) > settings.batch_render_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_render_max_items} templates per batch",
+        )
+    templates = db.query(CommunityTemplate).filter(CommunityTemplate.id.in_(template_ids)).all()
+    snapshots = {template.id: template.snapshot or {} for template in templates}
+    definitions = _snapshot_definitions(db, list(snapshots.values()))
+    projects = [
+        (
+            template.id,
+            RenderProject.from_snapshot(
+                snapshots[template.id], definitions, title=template.title, inline_definitions=True
+            ),
+        )
+        for template in templates
+    ]
+    missing = [template_id for template_id in template_ids if template_id not in snapshots]
+
+    def records():
+        for template_id in missing:
+            yield {"template_id": template_id, "error": "Template not found"}
+        for record in render_batch_records(projects, "template_id", lang, postprocess=_hide_scrollbars):
+            if "html" in record:
+                record["generated_at"] = datetime.utcnow().isoformat() + "Z"
+            yield record
+
+    response = StreamingResponse(ndjson_lines(records()), media_type="application/x-ndjson")
+    _allow_origin(response, request)
+    return response
+
+
 @router.get("/{template_id}/preview")
 def template_preview(
     template_id: int,
@@ -247,102 +324,16 @@ def template_preview(
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     snapshot = template.snapshot or {}
-    project_payload: dict[str, Any] = snapshot.get("project") or {}
-    title = project_payload.get("title") or template.title
-    theme = project_payload.get("theme") or {}
-    settings = project_payload.get("settings") or {}
-    ensure_locales(settings)
-
-    blocks_payload: list[dict[str, Any]] = snapshot.get("blocks") or []
-    block_keys = {
-        block.get("definition_key")
-        for block in blocks_payload
-        if block.get("definition_key")
-    }
-    definitions: dict[str, BlockDefinition] = {}
-    if block_keys:
-        definitions = {
-            definition.key: definition
-            for definition in db.query(BlockDefinition)
-            .filter(BlockDefinition.key.in_(block_keys))
-            .all()
-        }
-
-    class PreviewBlock:
-        def __init__(
-            self,
-            block_id: int | None,
-            definition: Any,
-            order_index: int,
-            config: dict[str, Any],
-            translations: dict[str, Any],
-        ):
-            self.id = block_id
-            self.definition = definition
-            self.order_index = order_index
-            self.config = config
-            self.translations = translations or {}
-
-    class PreviewProject:
-        def __init__(
-            self,
-            title: str,
-            theme: dict[str, Any],
-            settings: dict[str, Any],
-            blocks: list[PreviewBlock],
-        ):
-            self.title = title
-            self.theme = theme
-            self.settings = settings
-            self.blocks = blocks
-
-    preview_blocks: list[PreviewBlock] = []
-    for order, block_data in enumerate(blocks_payload):
-        key = block_data.get("definition_key")
-        definition: Any = definitions.get(key)
-        if definition is None:
-            class InlineDefinition:
-                def __init__(self, inline_key: str | None, data: dict[str, Any]):
-                    self.key = data.get("key") or inline_key or "custom"
-                    self.name = data.get("name")
-                    self.category = data.get("category")
-                    self.version = data.get("version")
-                    self.schema = data.get("schema") or []
-                    self.default_config = data.get("default_config") or {}
-                    self.template_markup = data.get("template_markup")
-                    self.template_styles = data.get("template_styles")
-
-            definition = InlineDefinition(key, block_data.get("definition") or {})
-        preview_blocks.append(
-            PreviewBlock(
-                block_id=block_data.get("id"),
-                definition=definition,
-                order_index=block_data.get("order_index", order),
-                config=block_data.get("config")
-                or getattr(definition, "default_config", {})
-                or {},
-                translations=block_data.get("translations") or {},
-            )
-        )
-
-    preview_project = PreviewProject(title, theme, settings, preview_blocks)
+    definitions = _snapshot_definitions(db, [snapshot])
+    preview_project = RenderProject.from_snapshot(snapshot, definitions, title=template.title, inline_definitions=True)
     html = render_project_html(preview_project, lang)
-    preview_html = html.replace(
-        "</head>",
-        "<style>body::-webkit-scrollbar{display:none;}body{scrollbar-width:none;}</style></head>",
-        1,
-    )
     payload = {
-        "html": preview_html,
+        "html": _hide_scrollbars(html),
         "generated_at": datetime.utcnow().isoformat() + "Z",
         "template_id": template.id,
     }
     response = JSONResponse(payload)
-    origin = request.headers.get("origin") if request else None
-    if origin:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Vary"] = "Origin"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
+    _allow_origin(response, request)
     return response
 
 
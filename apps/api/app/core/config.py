@@ -31,6 +31,14 @@ class Settings(BaseSettings):
     minio_secret_key: str = "renderlysecret"
     minio_secure: bool = False
     minio_presign_exp_seconds: int = 3600
+    storage_backend: str = "minio"
+    storage_local_dir: str = "/var/renderly/storage"
+    storage_public_base: str | None = None
+    storage_pool_size: int = 32
+    storage_connect_timeout: float = 5.0
+    storage_read_timeout: float = 30.0
+    storage_max_retries: int = 3
+    storage_retry_backoff: float = 0.2
     asset_bucket: str = "renderly-assets"
     asset_max_bytes: int = 10 * 1024 * 1024
     asset_presign_exp_seconds: int = 3600
@@ -40,11 +48,35 @@ class Settings(BaseSettings):
         alias="ASSET_PUBLIC_BASE",
     )
     redis_url: str = "redis://redis:6379/0"
+    routing_table_enabled: bool = False
+    # comma-separated endpoints that accept POST {"hosts": [...]}, e.g. http://edge:8090/_edge/purge
+    cache_purge_urls: str = ""
+    cache_purge_token: str | None = None
+    cache_purge_timeout: float = 2.0
     log_level: str = "INFO"
+    render_cache_max_bytes: int = 32 * 1024 * 1024
+    custom_template_cache_max_bytes: int = 4 * 1024 * 1024
+    custom_template_max_steps: int = 50_000
+    custom_template_timeout_ms: int = 500
+    custom_template_max_output_bytes: int = 1024 * 1024
+    template_bytecode_cache_dir: str | None = None
+    publish_max_workers: int = 8
+    publish_minify_html: bool = True
+    publish_brotli_quality: int = 11
+    publish_record_timings: bool = False
+    publish_job_timeout: int = 600
+    republish_batch_size: int = 25
+    republish_max_workers: int = 4
+    republish_batch_pause: float = 1.0
+    republish_job_timeout: int = 6 * 3600
+    render_slow_block_ms: float = 250.0
+    batch_render_max_items: int = 48
+    batch_render_max_workers: int = 4
     domain_manager_url: str = "http://domain-manager:8080"
     custom_domain_cname_target: str = "pages.renderly.local"
     custom_domain_proxy_scheme: str = "https"
     custom_domain_local_dir: str | None = "/var/renderly/domains"
+    custom_domain_keep_releases: int = 3
     project_subdomain_root: str | None = Field(default="pages.renderly.local", alias="PROJECT_SUBDOMAIN_ROOT")
     project_subdomain_scheme: str | None = Field(
         default=None,
@@ -9,3 +9,8 @@ from app.core.config import settings
 redis_conn = redis.from_url(settings.redis_url)
 WEBHOOK_QUEUE_NAME = "webhooks"
 webhook_queue = Queue(WEBHOOK_QUEUE_NAME, connection=redis_conn)
+PUBLISH_QUEUE_NAME = "publish"
+publish_queue = Queue(PUBLISH_QUEUE_NAME, connection=redis_conn)
+# hours-long catalog republishes must not hold up interactive publishes
+REPUBLISH_QUEUE_NAME = "republish"
+republish_queue = Queue(REPUBLISH_QUEUE_NAME, connection=redis_conn)
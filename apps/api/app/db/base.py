@@ -17,3 +17,5 @@ from app.models.project_revision import ProjectRevision  # noqa: F401
 from app.models.project_domain import ProjectDomain  # noqa: F401
 from app.models.project_share_link import ProjectShareLink  # noqa: F401
 from app.models.project_share_comment import ProjectShareComment  # noqa: F401
+from app.models.publish_job import PublishJob  # noqa: F401
+from app.models.republish_job import RepublishJob  # noqa: F401
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, ForeignKey, Integer, JSON
+from sqlalchemy import Column, ForeignKey, Index, Integer, JSON
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
 
 
 class BlockInstance(Base):
+    # covers "which projects use this definition" for republishing after a definition change
+    __table_args__ = (Index("ix_blockinstance_definition_id", "definition_id", "project_id"),)
+
     id = Column(Integer, primary_key=True)
     project_id = Column(ForeignKey("project.id", ondelete="CASCADE"))
     definition_id = Column(ForeignKey("blockdefinition.id", ondelete="CASCADE"))
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy.orm import relationship
+
+from app.db.base_class import Base
+
+
+class PublishJob(Base):
+    id = Column(Integer, primary_key=True)
+    project_id = Column(ForeignKey("project.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(20), nullable=False, default="queued")
+    stage = Column(String(50), nullable=True)
+    params = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON, nullable=True)
+    error_message = Column(Text, nullable=True)
+    published_version_id = Column(ForeignKey("publishedversion.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    published_version = relationship("PublishedVersion")
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON, String, Text
+
+from app.db.base_class import Base
+
+
+class RepublishJob(Base):
+    id = Column(Integer, primary_key=True)
+    definition_id = Column(ForeignKey("blockdefinition.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(20), nullable=False, default="queued")
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    republished = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=False, default=dict)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
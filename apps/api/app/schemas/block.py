@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Any, Literal
 
 from pydantic import BaseModel, Field, ConfigDict, validator
@@ -76,3 +77,21 @@ class BlockInstanceRead(BlockInstanceBase):
     id: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class RepublishJobRead(BaseModel):
+    id: int
+    definition_id: int
+    status: str
+    total: int
+    processed: int
+    republished: int
+    unchanged: int
+    failed: int
+    errors: dict[str, str] = Field(default_factory=dict)
+    error_message: str | None = None
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -19,3 +19,9 @@ class ProjectDomainRead(BaseModel):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CachePurgeRequest(BaseModel):
+    project_id: int | None = None
+    hostname: str | None = Field(default=None, min_length=3, max_length=255)
+    block_definition_id: int | None = None
@@ -65,11 +65,28 @@ class ProjectDetail(ProjectRead):
     blocks: list[BlockInstanceRead] = Field(default_factory=list)
 
 
+class ProjectRenderBatch(BaseModel):
+    project_ids: list[int] = Field(min_length=1)
+
+
 class PublicationInfo(BaseModel):
     version: str
     cdn_url: str
     object_path: str
     custom_domain_url: str | None = None
+    locales: dict[str, str] = Field(default_factory=dict)
+
+
+class PublishJobRead(BaseModel):
+    id: int
+    project_id: int
+    status: str
+    stage: str | None = None
+    error_message: str | None = None
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    publication: PublicationInfo | None = None
 
 
 class PublicationResponse(BaseModel):
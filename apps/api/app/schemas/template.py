@@ -23,6 +23,10 @@ class TemplateUpdate(BaseModel):
     tags: list[str] | None = None
 
 
+class TemplatePreviewBatch(BaseModel):
+    template_ids: list[int] = Field(min_length=1)
+
+
 class TemplateCommentBase(BaseModel):
     message: str = Field(min_length=1, max_length=2000)
 
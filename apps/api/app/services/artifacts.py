@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import re
+
+from app.core.config import settings
+from app.services.render_cache import LRUCache
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None  # type: ignore
+
+# suffixes nginx gzip_static / brotli_static look for next to the plain file
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+_PRESERVED_RE = re.compile(r"<(pre|textarea|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_LINE_BREAK_RE = re.compile(r"\s*\n\s*")
+
+# one publish uploads the same page to several domains; compress each page once
+_variant_cache = LRUCache(8 * 1024 * 1024, sizeof=lambda variants: sum(len(body) for body in variants.values()))
+
+
+def _collapse_whitespace(fragment: str) -> str:
+    return _LINE_BREAK_RE.sub("\n", fragment)
+
+
+def minify_html(html: str) -> str:
+    """Drop indentation and blank lines outside of pre/textarea/script.
+
+    Whitespace that contains a line break is collapsed to a single newline, so
+    inline text keeps its word spacing and the page renders the same.
+    """
+    parts: list[str] = []
+    position = 0
+    for match in _PRESERVED_RE.finditer(html):
+        parts.append(_collapse_whitespace(html[position : match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_collapse_whitespace(html[position:]))
+    return "".join(parts).strip() + "\n"
+
+
+def prepare_publish_html(html: str) -> str:
+    if not settings.publish_minify_html:
+        return html
+    return minify_html(html)
+
+
+def compress_variants(data: bytes) -> dict[str, bytes]:
+    digest = hashlib.sha1(data).digest()
+    cached = _variant_cache.get(digest)
+    if cached is not None:
+        return cached
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, mode=brotli.MODE_TEXT, quality=settings.publish_brotli_quality)
+    _variant_cache.set(digest, variants)
+    return variants
+
+
+def content_hash(pages: dict[str, str]) -> str:
+    """Digest of the published bytes; keys are locale codes ("" for a single-page publish)."""
+    digest = hashlib.sha256()
+    for locale in sorted(pages):
+        digest.update(locale.encode("utf-8") + b"\0")
+        digest.update(hashlib.sha256(pages[locale].encode("utf-8")).digest())
+    return digest.hexdigest()
@@ -9,17 +9,15 @@ import uuid
 from io import BytesIO
 from typing import Iterable, Optional
 from types import SimpleNamespace
-from datetime import timedelta
 from urllib.parse import urlparse, urlunparse
 
-from minio import Minio
-from minio.error import S3Error
 from fastapi import HTTPException, status
 
 from app.core.config import settings
 from app.models.asset import Asset
 from app.models.user import User
 from app.models.project import Project
+from app.services import storage
 from sqlalchemy.orm import Session
 
 try:
@@ -27,27 +25,9 @@ try:
 except Exception:  # pragma: no cover
     Image = None  # type: ignore
 
-_asset_client: Minio | None = None
 FILENAME_RE = re.compile(r"[^a-zA-Z0-9_.-]+")
 
 
-def get_client() -> Minio:
-    global _asset_client
-    if _asset_client is None:
-        _asset_client = Minio(
-            settings.minio_endpoint,
-            access_key=settings.minio_access_key,
-            secret_key=settings.minio_secret_key,
-            secure=settings.minio_secure,
-        )
-    return _asset_client
-
-
-def _ensure_bucket(client: Minio) -> None:
-    if not client.bucket_exists(settings.asset_bucket):
-        client.make_bucket(settings.asset_bucket)
-
-
 def sanitize_filename(filename: str) -> str:
     filename = os.path.basename(filename) or "asset"
     return FILENAME_RE.sub("-", filename).strip("-") or "asset"
@@ -98,24 +78,11 @@ def validate_asset_token(asset: Asset, token: str) -> bool:
 
 
 def _put_object(object_name: str, data: bytes, content_type: str) -> str:
-    client = get_client()
-    _ensure_bucket(client)
     try:
-        client.put_object(
-            settings.asset_bucket,
-            object_name,
-            data=BytesIO(data),
-            length=len(data),
-            content_type=content_type,
-        )
-        presigned = client.get_presigned_url(
-            "GET",
-            settings.asset_bucket,
-            object_name,
-            expires=timedelta(seconds=settings.asset_presign_exp_seconds),
-        )
+        storage.put_bytes(settings.asset_bucket, object_name, data, content_type)
+        presigned = storage.presigned_get_url(settings.asset_bucket, object_name, settings.asset_presign_exp_seconds)
         return _apply_public_base(presigned)
-    except S3Error as exc:  # pragma: no cover - network errors
+    except storage.StorageError as exc:  # pragma: no cover - network errors
         raise RuntimeError(f"Assets upload failed: {exc}") from exc
 
 
@@ -198,14 +165,5 @@ class _AssetStream(SimpleNamespace):
 
 
 def open_asset_stream(asset):
-    client = get_client()
-    obj = client.get_object(settings.asset_bucket, asset.object_name)
-    def close():
-        try:
-            obj.close()
-        finally:
-            try:
-                obj.release_conn()
-            except Exception:
-                pass
-    return _AssetStream(body=obj, close=close)
+    obj = storage.get_object(settings.asset_bucket, asset.object_name)
+    return _AssetStream(body=obj.stream(), close=obj.close)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Hashable, Iterable, Iterator
+
+from app.core.config import settings
+from app.services.publisher import render_project_html
+from app.services.render_model import RenderProject
+
+logger = logging.getLogger(__name__)
+
+
+def render_many(
+    projects: Iterable[tuple[Hashable, RenderProject]],
+    locale: str | None = None,
+    max_workers: int | None = None,
+) -> Iterator[tuple[Hashable, str | None, Exception | None]]:
+    """Render detached projects on a worker pool, yielding ``(key, html, error)`` as each one finishes.
+
+    Every project shares the process-wide block cache and compiled templates,
+    so blocks common to several pages are only rendered once.
+    """
+    items = list(projects)
+    if not items:
+        return
+    workers = max(1, min(max_workers or settings.batch_render_max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-batch") as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, render_project_html, project, locale): key
+            for key, project in items
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except Exception as exc:  # one broken page must not fail the whole batch
+                logger.exception("Batch render failed for %r", key)
+                yield key, None, exc
+
+
+def ndjson_lines(records: Iterable[dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def render_batch_records(
+    projects: Iterable[tuple[Hashable, RenderProject]],
+    id_field: str,
+    locale: str | None = None,
+    postprocess: Callable[[str], str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """:func:`render_many` results shaped as one JSON-ready record per project."""
+    for key, html, error in render_many(projects, locale):
+        if error is not None:
+            yield {id_field: key, "error": "Render failed"}
+            continue
+        yield {id_field: key, "html": postprocess(html) if postprocess else html}
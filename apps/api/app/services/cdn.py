@@ -1,64 +1,47 @@
 from __future__ import annotations
 
-from io import BytesIO
 from typing import Tuple
-from datetime import timedelta
-
-from minio import Minio
-from minio.error import S3Error
 
 from app.core.config import settings
+from app.services import storage
+from app.services.artifacts import ENCODING_SUFFIXES, compress_variants
 
-_client: Minio | None = None
-
-
-def get_client() -> Minio:
-    global _client
-    if _client is None:
-        _client = Minio(
-            settings.minio_endpoint,
-            access_key=settings.minio_access_key,
-            secret_key=settings.minio_secret_key,
-            secure=settings.minio_secure,
-        )
-    return _client
+# versioned objects are content-addressed, so their bytes never change under the same name
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
-def _ensure_bucket(client: Minio) -> None:
-    if not client.bucket_exists(settings.minio_bucket):
-        client.make_bucket(settings.minio_bucket)
-
-
-def upload_html(object_name: str, html: str) -> Tuple[str, str]:
-    client = get_client()
-    _ensure_bucket(client)
+def upload_html(
+    object_name: str,
+    html: str,
+    precompressed: bool = True,
+    cache_control: str | None = None,
+    presign: bool = True,
+) -> Tuple[str, str | None]:
     data = html.encode("utf-8")
-    stream = BytesIO(data)
-    length = len(data)
+    metadata = {"Cache-Control": cache_control} if cache_control else None
     try:
-        client.put_object(
-            settings.minio_bucket,
-            object_name,
-            data=stream,
-            length=length,
-            content_type="text/html",
-        )
-        url = client.get_presigned_url(
-            "GET",
-            settings.minio_bucket,
-            object_name,
-            expires=timedelta(seconds=settings.minio_presign_exp_seconds),
-        )
-    except S3Error as exc:
+        storage.put_bytes(settings.minio_bucket, object_name, data, "text/html", metadata=metadata)
+        if precompressed:
+            for encoding, body in compress_variants(data).items():
+                storage.put_bytes(
+                    settings.minio_bucket,
+                    f"{object_name}{ENCODING_SUFFIXES[encoding]}",
+                    body,
+                    "text/html",
+                    metadata={**(metadata or {}), "Content-Encoding": encoding},
+                )
+        # domain copies are served by the proxy, only versioned objects need a link
+        url = None
+        if presign:
+            url = storage.presigned_get_url(settings.minio_bucket, object_name, settings.minio_presign_exp_seconds)
+    except storage.StorageError as exc:
         raise RuntimeError(f"CDN upload failed: {exc}") from exc
     return object_name, url
 
 
 def delete_html(object_name: str) -> None:
-    client = get_client()
-    try:
-        client.remove_object(settings.minio_bucket, object_name)
-    except S3Error as exc:
-        if exc.code == "NoSuchKey":
-            return
-        raise RuntimeError(f"CDN delete failed: {exc}") from exc
+    for name in [object_name] + [f"{object_name}{suffix}" for suffix in ENCODING_SUFFIXES.values()]:
+        try:
+            storage.remove_object(settings.minio_bucket, name)
+        except storage.StorageError as exc:
+            raise RuntimeError(f"CDN delete failed: {exc}") from exc
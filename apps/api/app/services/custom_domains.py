@@ -1,33 +1,193 @@
 from __future__ import annotations
 
+import logging
+import os
+import shutil
+import tempfile
 from pathlib import Path
+from uuid import uuid4
 
 from app.core.config import settings
+from app.services.artifacts import ENCODING_SUFFIXES, compress_variants
 
+logger = logging.getLogger("renderly.custom_domains")
 
-def persist_domain_html(hostname: str, html: str) -> None:
+# <base>/<host> is a relative symlink to <base>/.releases/<host>/<version>; nginx and the
+# edge service resolve it per request, so swapping the link switches a whole host at once
+RELEASES_DIR = ".releases"
+
+
+def _fsync(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(root: Path) -> None:
+    for directory, _, files in os.walk(root):
+        for name in files:
+            _fsync(Path(directory) / name)
+        _fsync(Path(directory))
+
+
+def _base() -> Path | None:
     base = settings.custom_domain_local_dir
-    if not base:
-        return
-    root = Path(base)
+    return Path(base) if base else None
+
+
+def _releases(base: Path, hostname: str) -> Path:
+    return base / RELEASES_DIR / hostname
+
+
+def begin_domain_release(hostname: str) -> Path | None:
+    """A fresh staging directory for ``hostname``; ``None`` when local copies are off or unavailable."""
+    base = _base()
+    if base is None:
+        return None
     try:
-        target_dir = root / hostname
-        target_dir.mkdir(parents=True, exist_ok=True)
-        (target_dir / "index.html").write_text(html, encoding="utf-8")
+        releases = _releases(base, hostname)
+        releases.mkdir(parents=True, exist_ok=True)
+        stage = Path(tempfile.mkdtemp(dir=releases, prefix=".stage-"))
+        os.chmod(stage, 0o755)
+        return stage
     except OSError:
-        # local storage is best-effort
-        return
+        logger.warning("could not stage a release for %s", hostname, exc_info=True)
+        return None
+
+
+def write_release_page(stage: Path, html: str, locale: str | None = None) -> None:
+    """Write one page and its precompressed variants into a staged release; nothing is synced yet."""
+    target_dir = stage / locale if locale else stage
+    target_dir.mkdir(parents=True, exist_ok=True)
+    data = html.encode("utf-8")
+    (target_dir / "index.html").write_bytes(data)
+    for encoding, body in compress_variants(data).items():
+        (target_dir / f"index.html{ENCODING_SUFFIXES[encoding]}").write_bytes(body)
+
+
+def discard_release(stage: Path | None) -> None:
+    if stage is not None:
+        shutil.rmtree(stage, ignore_errors=True)
+
+
+def finish_domain_release(hostname: str, stage: Path, version: str) -> Path | None:
+    """Seal a staged release under its version name; an identical version already on disk is reused."""
+    release = stage.parent / version
+    try:
+        os.rename(stage, release)
+    except OSError:
+        # versions are content hashes, so an existing directory already holds these pages
+        discard_release(stage)
+        if not release.is_dir():
+            logger.warning("could not seal release %s for %s", version, hostname, exc_info=True)
+            return None
+    return release
+
+
+def _point(base: Path, hostname: str, release: Path) -> None:
+    link = base / hostname
+    if link.is_dir() and not link.is_symlink():
+        # pre-release layout: move the plain directory aside before the first swap
+        os.rename(link, _releases(base, hostname) / f".legacy-{uuid4().hex}")
+    tmp_link = base / f".{hostname}.link-{uuid4().hex}"
+    os.symlink(os.path.relpath(release, base), tmp_link)
+    os.replace(tmp_link, link)
+    # activation time orders releases for rollback and pruning
+    os.utime(release)
+
+
+def _prune(base: Path, hostname: str) -> None:
+    releases = _releases(base, hostname)
+    current = (base / hostname).resolve()
+    entries = sorted(
+        (entry for entry in releases.iterdir() if entry.is_dir() and entry.resolve() != current),
+        key=lambda entry: entry.stat().st_mtime_ns,
+        reverse=True,
+    )
+    # at least the newest inactive release stays for rollback; stages may belong to a running publish
+    keep = max(1, settings.custom_domain_keep_releases - 1)
+    sealed = [entry for entry in entries if not entry.name.startswith(".")]
+    retired = [entry for entry in entries if entry.name.startswith((".legacy-", ".trash-"))]
+    for entry in sealed[keep:] + retired:
+        shutil.rmtree(entry, ignore_errors=True)
+
+
+def activate_domain_releases(releases: dict[str, Path]) -> list[str]:
+    """Make every release live: one fsync pass over all of them, then one link swap per host.
+
+    Returns the hostnames that were switched; a host that fails keeps serving
+    its previous release.
+    """
+    base = _base()
+    if base is None or not releases:
+        return []
+    for hostname, release in list(releases.items()):
+        try:
+            _fsync_tree(release)
+        except OSError:
+            logger.warning("could not sync release for %s", hostname, exc_info=True)
+            releases.pop(hostname)
+    switched: list[str] = []
+    for hostname, release in releases.items():
+        try:
+            _point(base, hostname, release)
+        except OSError:
+            logger.warning("could not activate release for %s", hostname, exc_info=True)
+            continue
+        switched.append(hostname)
+    try:
+        _fsync(base)
+    except OSError:
+        pass
+    for hostname in switched:
+        try:
+            _prune(base, hostname)
+        except OSError:
+            logger.warning("could not prune releases for %s", hostname, exc_info=True)
+    return switched
+
+
+def rollback_domain_release(hostname: str) -> str | None:
+    """Point ``hostname`` back at the release that was live before the current one.
+
+    Returns the restored version, or ``None`` when there is nothing to roll back to.
+    """
+    base = _base()
+    if base is None:
+        return None
+    try:
+        current = (base / hostname).resolve()
+        candidates = [
+            entry
+            for entry in _releases(base, hostname).iterdir()
+            if entry.is_dir() and not entry.name.startswith(".") and entry.resolve() != current
+        ]
+        if not candidates:
+            return None
+        previous = max(candidates, key=lambda entry: entry.stat().st_mtime_ns)
+        _point(base, hostname, previous)
+        _fsync(base)
+    except OSError:
+        logger.warning("could not roll back %s", hostname, exc_info=True)
+        return None
+    return previous.name
 
 
 def remove_domain_html(hostname: str) -> None:
-    base = settings.custom_domain_local_dir
-    if not base:
+    base = _base()
+    if base is None:
         return
-    target_dir = Path(base) / hostname
+    link = base / hostname
     try:
-        if target_dir.exists():
-            for child in target_dir.iterdir():
-                child.unlink(missing_ok=True)  # type: ignore[arg-type]
-            target_dir.rmdir()
+        # the host disappears in one step; its releases are deleted afterwards
+        if link.is_symlink():
+            link.unlink()
+        elif link.is_dir():
+            releases = _releases(base, hostname)
+            releases.mkdir(parents=True, exist_ok=True)
+            os.rename(link, releases / f".trash-{uuid4().hex}")
+        shutil.rmtree(_releases(base, hostname), ignore_errors=True)
     except OSError:
         return
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.models.project import Project
+from app.services.localization import ensure_locales
+from app.services.publisher import render_block_fragments, render_project_html
+from app.services.render_model import RenderBlock, RenderDefinition, RenderProject
+
+
+class PreviewOperationError(ValueError):
+    """An edit operation that cannot be applied to the session state."""
+
+
+@dataclass
+class PreviewBlockState:
+    id: Any
+    definition: RenderDefinition
+    order_index: int
+    config: dict[str, Any]
+    translations: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RenderRequest:
+    """What the next render has to produce: the whole document or just some blocks."""
+
+    seq: Any
+    document: bool
+    block_ids: list[Any]
+    removed_ids: list[Any]
+    project: RenderProject
+    locale: str | None
+
+
+class PreviewSession:
+    """Working copy of a project for one live-preview connection.
+
+    Edits are applied in place and only mark what has to be re-rendered. The
+    renderer takes a :class:`RenderRequest` holding copies of the affected
+    state, so edits arriving mid-render never race with it, and drops the
+    result if those edits superseded it.
+    """
+
+    def __init__(self, project: Project, definitions: dict[str, Any], locale: str | None = None):
+        settings = copy.deepcopy(project.settings or {})
+        ensure_locales(settings)
+        self.title = project.title
+        self.theme = copy.deepcopy(project.theme or {})
+        self.settings = settings
+        self.locale = locale
+        self.definitions = {key: RenderDefinition.from_orm(definition) for key, definition in definitions.items()}
+        self.blocks: dict[Any, PreviewBlockState] = {}
+        for block in project.blocks:
+            self.blocks[block.id] = PreviewBlockState(
+                id=block.id,
+                definition=RenderDefinition.from_orm(block.definition),
+                order_index=block.order_index,
+                config=copy.deepcopy(block.config or {}),
+                translations=copy.deepcopy(block.translations or {}),
+            )
+        self.last_seq: Any = None
+        self._dirty: set[Any] = set()
+        self._removed: set[Any] = set()
+        self._document = True
+
+    @property
+    def has_pending(self) -> bool:
+        return self._document or bool(self._dirty) or bool(self._removed)
+
+    def apply(self, message: dict[str, Any]) -> None:
+        op = message.get("op")
+        handler = getattr(self, f"_op_{op}", None) if isinstance(op, str) else None
+        if handler is None:
+            raise PreviewOperationError(f"Unknown operation: {op!r}")
+        handler(message)
+        self.last_seq = message.get("seq", self.last_seq)
+
+    def _block(self, message: dict[str, Any]) -> PreviewBlockState:
+        block = self.blocks.get(message.get("id"))
+        if block is None:
+            raise PreviewOperationError(f"Unknown block: {message.get('id')!r}")
+        return block
+
+    def _op_update_block(self, message: dict[str, Any]) -> None:
+        block = self._block(message)
+        if isinstance(message.get("config"), dict):
+            block.config = copy.deepcopy(message["config"])
+        if isinstance(message.get("patch"), dict):
+            block.config = {**block.config, **copy.deepcopy(message["patch"])}
+        if isinstance(message.get("translations"), dict):
+            block.translations = copy.deepcopy(message["translations"])
+        self._dirty.add(block.id)
+
+    def _op_add_block(self, message: dict[str, Any]) -> None:
+        data = message.get("block") or {}
+        block_id = data.get("id")
+        if block_id is None or block_id in self.blocks:
+            raise PreviewOperationError("New blocks need an id that is not in use")
+        definition = self.definitions.get(data.get("definition_key"))
+        if definition is None:
+            raise PreviewOperationError(f"Unknown block definition: {data.get('definition_key')!r}")
+        self.blocks[block_id] = PreviewBlockState(
+            id=block_id,
+            definition=definition,
+            order_index=data.get("order_index", len(self.blocks)),
+            config=copy.deepcopy(data.get("config") or definition.default_config or {}),
+            translations=copy.deepcopy(data.get("translations") or {}),
+        )
+        # inserting shifts neighbours, so the page layout is re-sent as a whole
+        self._document = True
+
+    def _op_remove_block(self, message: dict[str, Any]) -> None:
+        block = self._block(message)
+        del self.blocks[block.id]
+        self._dirty.discard(block.id)
+        self._removed.add(block.id)
+
+    def _op_move_block(self, message: dict[str, Any]) -> None:
+        block = self._block(message)
+        try:
+            block.order_index = int(message.get("order_index", block.order_index))
+        except (TypeError, ValueError):
+            raise PreviewOperationError(f"Invalid order_index: {message.get('order_index')!r}") from None
+        self._document = True
+
+    def _op_update_project(self, message: dict[str, Any]) -> None:
+        if isinstance(message.get("title"), str):
+            self.title = message["title"]
+        if isinstance(message.get("theme"), dict):
+            self.theme = copy.deepcopy(message["theme"])
+        if isinstance(message.get("settings"), dict):
+            self.settings = copy.deepcopy(message["settings"])
+            ensure_locales(self.settings)
+        self._document = True
+
+    def _op_set_locale(self, message: dict[str, Any]) -> None:
+        self.locale = message.get("locale")
+        self._document = True
+
+    def _op_render(self, message: dict[str, Any]) -> None:
+        self._document = True
+
+    def take_render_request(self) -> RenderRequest:
+        if self._document:
+            block_ids = [block.id for block in self.blocks.values()]
+        else:
+            block_ids = [block_id for block_id in self._dirty if block_id in self.blocks]
+        blocks = tuple(
+            RenderBlock(
+                id=block.id,
+                definition=block.definition,
+                order_index=block.order_index,
+                config=copy.deepcopy(block.config),
+                translations=copy.deepcopy(block.translations),
+            )
+            for block in (self.blocks[block_id] for block_id in block_ids)
+        )
+        request = RenderRequest(
+            seq=self.last_seq,
+            document=self._document,
+            block_ids=block_ids,
+            removed_ids=[] if self._document else sorted(self._removed, key=str),
+            project=RenderProject(
+                title=self.title,
+                theme=copy.deepcopy(self.theme),
+                settings=copy.deepcopy(self.settings),
+                blocks=blocks,
+            ),
+            locale=self.locale,
+        )
+        self._document = False
+        self._dirty.clear()
+        self._removed.clear()
+        return request
+
+    def is_superseded(self, request: RenderRequest) -> bool:
+        """True once edits made after ``request`` was taken touch what it rendered."""
+        if self._document:
+            return True
+        return not request.document and any(block_id in self._dirty for block_id in request.block_ids)
+
+    def requeue(self, request: RenderRequest) -> None:
+        """Put back the work of a render whose result was dropped because newer edits arrived."""
+        if request.document:
+            self._document = True
+        self._dirty.update(request.block_ids)
+        self._removed.update(request.removed_ids)
+
+
+def render_preview_request(request: RenderRequest) -> dict[str, Any]:
+    if request.document:
+        return {
+            "type": "document",
+            "seq": request.seq,
+            "html": render_project_html(request.project, request.locale),
+        }
+    fragments = render_block_fragments(request.project, request.block_ids, request.locale)
+    return {
+        "type": "fragments",
+        "seq": request.seq,
+        "blocks": fragments["blocks"],
+        "styles": fragments["styles"],
+        "removed": request.removed_ids,
+    }
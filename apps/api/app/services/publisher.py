@@ -2,31 +2,42 @@ from __future__ import annotations
 
 
 
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from datetime import datetime
 from dataclasses import dataclass
+from functools import lru_cache
 import hashlib
+import json
 import logging
+import re
+from pathlib import Path
 
-from typing import Any
+from typing import Any, Iterator
 
 
 
-from jinja2 import Environment, Template, TemplateError
+from jinja2 import BytecodeCache, DictLoader, Environment, FileSystemBytecodeCache, Template, TemplateError
 from markupsafe import Markup, escape
 
 
 
+from app.core.config import settings as app_settings
 from app.models.block_instance import BlockInstance
 
 from app.models.project import Project
 
 from app.services.localization import ensure_locales, resolve_locale, block_payload_for_locale
+from app.services.render_cache import LRUCache
+from app.services.render_model import RenderProject
+from app.services.render_timing import timed_block, timed_compile, timed_phase
+from app.services.template_sandbox import BudgetedSandboxEnvironment, render_with_budget
 
 
 
 
 
-BASE_TEMPLATE = Template(
+BASE_TEMPLATE_SOURCE = (
 
     """
 
@@ -58,65 +69,7 @@ BASE_TEMPLATE = Template(
 
       h1, h2, h3 { margin-top: 0; }
 
-      .hero { display: grid; gap: 32px; align-items: center; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); }
-
-      .hero .eyebrow { text-transform: uppercase; letter-spacing: 0.1em; color: #94a3b8; font-size: 0.85rem; margin-bottom: 8px; display: inline-block; }
-
-      .hero button { background: {{ accent }}; color: #fff; border: none; padding: 16px 32px; border-radius: 999px; font-size: 1.1rem; cursor: pointer; }
-
-      .hero figure { margin: 0; text-align: center; }
-
-      .hero figure img { width: 100%; border-radius: 24px; object-fit: cover; box-shadow: 0 20px 40px rgba(15, 23, 42, 0.12); }
-
-      .feature-grid .grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 16px; }
-
-      .feature-grid article { padding: 12px; border-radius: 18px; background: rgba(99, 102, 241, 0.08); }
-
-      .gallery { display: grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap: 16px; }
-
-      .gallery figure { margin: 0; }
-
-      .gallery img { width: 100%; border-radius: 18px; }
-
-      .cta { text-align: center; }
-
-      .cta button { background: {{ accent }}; color: #fff; border: none; padding: 16px 32px; border-radius: 16px; cursor: pointer; font-size: 1rem; }
-
-      .form-block form { display: flex; flex-direction: column; gap: 12px; margin-top: 16px; }
-
-      .form-block label { display: flex; flex-direction: column; text-align: left; gap: 4px; font-size: 0.95rem; }
-
-      .form-block input { border-radius: 12px; border: 1px solid #cbd5f5; padding: 10px 12px; }
-
-      .form-block button { align-self: flex-start; background: {{ accent }}; color: #fff; border: none; padding: 12px 20px; border-radius: 10px; cursor: pointer; }
-
-      .price-list .plans { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 16px; }
-
-      .price-list .plan { border: 1px solid #e2e8f0; border-radius: 20px; padding: 16px; text-align: center; }
-
-      .price-list ul { list-style: none; padding: 0; margin: 12px 0 0; }
-
-      .schedule ul { list-style: none; padding: 0; margin: 0; display: flex; flex-direction: column; gap: 12px; }
-
-      .schedule li { padding: 12px 16px; border-radius: 14px; background: rgba(15, 23, 42, 0.05); display: flex; justify-content: space-between; gap: 12px; }
-
-      .team .members { display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 20px; }
-
-      .team figure { text-align: center; }
-
-      .team img { width: 120px; height: 120px; border-radius: 50%; object-fit: cover; }
-
-      .testimonials blockquote { margin: 12px 0; padding: 16px; border-left: 4px solid {{ accent }}; background: rgba(99, 102, 241, 0.08); }
-
-      .faq details { border: 1px solid #e2e8f0; border-radius: 14px; padding: 12px 16px; margin-bottom: 12px; }
-
-      .asset-placeholder { min-height: 220px; border: 2px dashed rgba(99, 102, 241, 0.35); border-radius: 18px; display: flex; flex-direction: column; align-items: center; justify-content: center; gap: 6px; text-align: center; color: #94a3b8; background: rgba(99, 102, 241, 0.05); padding: 24px; font-size: 0.95rem; }
-
-      .asset-placeholder strong { color: #475569; font-weight: 600; }
-
-      .asset-placeholder.small { min-height: 140px; padding: 16px; }
-
-      .asset-placeholder.avatar { min-height: 120px; min-width: 120px; border-radius: 999px; }
+{% for group in css_groups %}{% include "css/" ~ group ~ ".css" %}{% endfor %}
 
     </style>
 
@@ -143,13 +96,72 @@ BASE_TEMPLATE = Template(
 )
 
 
+# Stylesheet fragments for built-in blocks, keyed by the section class they style.
+# Order matters: fragments are emitted in this order so the cascade stays the same.
+CSS_GROUP_SOURCES: dict[str, str] = {
+    "hero": (
+        "      .hero { display: grid; gap: 32px; align-items: center; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); }\n"
+        "      .hero .eyebrow { text-transform: uppercase; letter-spacing: 0.1em; color: #94a3b8; font-size: 0.85rem; margin-bottom: 8px; display: inline-block; }\n"
+        "      .hero button { background: {{ accent }}; color: #fff; border: none; padding: 16px 32px; border-radius: 999px; font-size: 1.1rem; cursor: pointer; }\n"
+        "      .hero figure { margin: 0; text-align: center; }\n"
+        "      .hero figure img { width: 100%; border-radius: 24px; object-fit: cover; box-shadow: 0 20px 40px rgba(15, 23, 42, 0.12); }\n"
+    ),
+    "feature-grid": (
+        "      .feature-grid .grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 16px; }\n"
+        "      .feature-grid article { padding: 12px; border-radius: 18px; background: rgba(99, 102, 241, 0.08); }\n"
+    ),
+    "gallery": (
+        "      .gallery { display: grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap: 16px; }\n"
+        "      .gallery figure { margin: 0; }\n"
+        "      .gallery img { width: 100%; border-radius: 18px; }\n"
+    ),
+    "cta": (
+        "      .cta { text-align: center; }\n"
+        "      .cta button { background: {{ accent }}; color: #fff; border: none; padding: 16px 32px; border-radius: 16px; cursor: pointer; font-size: 1rem; }\n"
+    ),
+    "form-block": (
+        "      .form-block form { display: flex; flex-direction: column; gap: 12px; margin-top: 16px; }\n"
+        "      .form-block label { display: flex; flex-direction: column; text-align: left; gap: 4px; font-size: 0.95rem; }\n"
+        "      .form-block input { border-radius: 12px; border: 1px solid #cbd5f5; padding: 10px 12px; }\n"
+        "      .form-block button { align-self: flex-start; background: {{ accent }}; color: #fff; border: none; padding: 12px 20px; border-radius: 10px; cursor: pointer; }\n"
+    ),
+    "price-list": (
+        "      .price-list .plans { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 16px; }\n"
+        "      .price-list .plan { border: 1px solid #e2e8f0; border-radius: 20px; padding: 16px; text-align: center; }\n"
+        "      .price-list ul { list-style: none; padding: 0; margin: 12px 0 0; }\n"
+    ),
+    "schedule": (
+        "      .schedule ul { list-style: none; padding: 0; margin: 0; display: flex; flex-direction: column; gap: 12px; }\n"
+        "      .schedule li { padding: 12px 16px; border-radius: 14px; background: rgba(15, 23, 42, 0.05); display: flex; justify-content: space-between; gap: 12px; }\n"
+    ),
+    "team": (
+        "      .team .members { display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 20px; }\n"
+        "      .team figure { text-align: center; }\n"
+        "      .team img { width: 120px; height: 120px; border-radius: 50%; object-fit: cover; }\n"
+    ),
+    "testimonials": (
+        "      .testimonials blockquote { margin: 12px 0; padding: 16px; border-left: 4px solid {{ accent }}; background: rgba(99, 102, 241, 0.08); }\n"
+    ),
+    "faq": (
+        "      .faq details { border: 1px solid #e2e8f0; border-radius: 14px; padding: 12px 16px; margin-bottom: 12px; }\n"
+    ),
+    "asset-placeholder": (
+        "      .asset-placeholder { min-height: 220px; border: 2px dashed rgba(99, 102, 241, 0.35); border-radius: 18px; display: flex; flex-direction: column; align-items: center; justify-content: center; gap: 6px; text-align: center; color: #94a3b8; background: rgba(99, 102, 241, 0.05); padding: 24px; font-size: 0.95rem; }\n"
+        "      .asset-placeholder strong { color: #475569; font-weight: 600; }\n"
+        "      .asset-placeholder.small { min-height: 140px; padding: 16px; }\n"
+        "      .asset-placeholder.avatar { min-height: 120px; min-width: 120px; border-radius: 999px; }\n"
+    ),
+}
+
+
 
 
 logger = logging.getLogger(__name__)
 
 
-CUSTOM_TEMPLATE_ENV = Environment(autoescape=False, trim_blocks=True, lstrip_blocks=True)
-_CUSTOM_TEMPLATE_CACHE: dict[str, tuple[str, Template]] = {}
+CUSTOM_TEMPLATE_ENV = BudgetedSandboxEnvironment(autoescape=False, trim_blocks=True, lstrip_blocks=True)
+# values are (template, source length) so the byte budget tracks the markup size
+CUSTOM_TEMPLATE_CACHE = LRUCache(app_settings.custom_template_cache_max_bytes, sizeof=lambda entry: entry[1])
 
 
 @dataclass
@@ -157,6 +169,15 @@ class RenderedBlock:
     html: str
     style_key: str | None = None
     style_rules: str | None = None
+    # render failures (budget overruns in particular) may not repeat, so they stay out of the cache
+    cacheable: bool = True
+
+    @property
+    def size(self) -> int:
+        return len(self.html) + len(self.style_rules or "")
+
+
+BLOCK_RENDER_CACHE = LRUCache(app_settings.render_cache_max_bytes, sizeof=lambda rendered: rendered.size)
 
 
 @dataclass
@@ -171,6 +192,49 @@ class TemplateListItem:
         return f"{self.base_key}.{self.index}.{sub_key}"
 
 
+FieldPath = tuple[tuple[str, int | None], ...]
+
+
+def _as_index(part: str) -> int | None:
+    try:
+        return int(part)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def compile_field_path(path: str) -> FieldPath:
+    """Tokenize ``items[3].title`` / ``items.3.title`` once into ``(("items", None), ("3", 3), ("title", None))``."""
+    parts: list[str] = []
+    for segment in path.replace("]", "").split("."):
+        parts.extend(part for part in segment.split("[") if part)
+    return tuple((part, _as_index(part)) for part in parts)
+
+
+def resolve_field_path(data: Any, accessor: FieldPath) -> Any:
+    current = data
+    for key, index in accessor:
+        if isinstance(current, list):
+            if index is None or index < 0 or index >= len(current):
+                return None
+            current = current[index]
+        elif isinstance(current, dict):
+            current = current.get(key)
+        else:
+            return None
+    return current
+
+
+def _field_text(data: Any, default: str) -> str:
+    if data is None:
+        return default
+    if isinstance(data, (int, float)):
+        return str(data)
+    if isinstance(data, str):
+        return data
+    return default
+
+
 class TemplateHelpers:
     def __init__(self, block: BlockInstance, payload: dict[str, Any]):
         self.block = block
@@ -210,14 +274,11 @@ class TemplateHelpers:
         return self._field(path, tag, classes, default, attrs, allow_html)
 
     def value(self, path: str, default: str = "") -> str:
-        data = self._raw_value(path)
-        if data is None:
-            return default
-        if isinstance(data, (int, float)):
-            return str(data)
-        if isinstance(data, str):
-            return data
-        return default
+        return _field_text(self._raw_value(path), default)
+
+    def values(self, *paths: str, default: str = "") -> dict[str, str]:
+        """Several field values at once: ``{% set f = helpers.values('title', 'cta.label') %}``."""
+        return {path: self.value(path, default) for path in paths}
 
     def list_items(self, key: str) -> list[TemplateListItem]:
         raw = self._raw_value(key)
@@ -251,7 +312,13 @@ class TemplateHelpers:
         return self._field(item.path(sub_key), tag, classes, default, attrs, allow_html=True)
 
     def item_value(self, item: TemplateListItem, sub_key: str | None = None, default: str = "") -> str:
-        return self.value(item.path(sub_key), default)
+        if sub_key is None:
+            return _field_text(item.value, default)
+        # walk from the item itself instead of re-resolving the list from the payload root
+        return _field_text(resolve_field_path(item.value, compile_field_path(sub_key)), default)
+
+    def item_values(self, item: TemplateListItem, *sub_keys: str, default: str = "") -> dict[str, str]:
+        return {sub_key: self.item_value(item, sub_key, default) for sub_key in sub_keys}
 
     def asset(
         self,
@@ -343,25 +410,7 @@ class TemplateHelpers:
     def _raw_value(self, path: str) -> Any:
         if not isinstance(self.payload, dict) or not path:
             return None
-        normalized = []
-        for segment in path.replace("]", "").split("."):
-            normalized.extend(part for part in segment.split("[") if part)
-        current: Any = self.payload
-        for part in normalized:
-            if isinstance(current, list):
-                try:
-                    index = int(part)
-                except ValueError:
-                    return None
-                if index < 0 or index >= len(current):
-                    return None
-                current = current[index]
-                continue
-            if isinstance(current, dict):
-                current = current.get(part)
-                continue
-            return None
-        return current
+        return resolve_field_path(self.payload, compile_field_path(path))
 
     def _humanize(self, key: str) -> str:
         return key.replace("_", " ").title()
@@ -375,16 +424,34 @@ class TemplateHelpers:
         )
 
 
-def _get_compiled_template(cache_key: str, markup: str) -> Template:
+def _template_cache_key(definition: Any, markup: str) -> tuple:
+    definition_id = getattr(definition, "id", None)
+    updated_at = getattr(definition, "updated_at", None)
+    if definition_id is not None and updated_at is not None:
+        return ("definition", definition_id, updated_at)
+    # inline snapshot definitions have no row to version against; fall back to the markup digest
     checksum = hashlib.sha1(markup.encode("utf-8")).hexdigest()
-    cached = _CUSTOM_TEMPLATE_CACHE.get(cache_key)
-    if cached and cached[0] == checksum:
-        return cached[1]
-    template = CUSTOM_TEMPLATE_ENV.from_string(markup)
-    _CUSTOM_TEMPLATE_CACHE[cache_key] = (checksum, template)
+    return ("inline", definition.key, getattr(definition, "version", None), checksum)
+
+
+def _get_compiled_template(definition: Any, markup: str) -> Template:
+    cache_key = _template_cache_key(definition, markup)
+    cached = CUSTOM_TEMPLATE_CACHE.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    with timed_compile():
+        template = CUSTOM_TEMPLATE_ENV.from_string(markup)
+    CUSTOM_TEMPLATE_CACHE.set(cache_key, (template, len(markup)))
     return template
 
 
+def render_cache_stats() -> dict[str, dict[str, int]]:
+    return {
+        "blocks": BLOCK_RENDER_CACHE.stats(),
+        "templates": CUSTOM_TEMPLATE_CACHE.stats(),
+    }
+
+
 def _render_template_error(helpers: TemplateHelpers, message: str) -> str:
     attrs = [
         f'class="{helpers.section_classes("is-error")}"',
@@ -395,12 +462,11 @@ def _render_template_error(helpers: TemplateHelpers, message: str) -> str:
 
 
 def _render_dynamic_block(block: BlockInstance, payload: dict[str, Any], style_attr: str) -> RenderedBlock | None:
-    markup = block.definition.template_markup
+    markup = getattr(block.definition, "template_markup", None)
     if not markup:
         return None
-    cache_key = str(block.definition.id or block.definition.key)
     try:
-        template = _get_compiled_template(cache_key, markup)
+        template = _get_compiled_template(block.definition, markup)
     except TemplateError as exc:
         logger.warning("Failed to compile template for block %s: %s", block.definition.key, exc)
         helpers = TemplateHelpers(block, payload)
@@ -415,10 +481,10 @@ def _render_dynamic_block(block: BlockInstance, payload: dict[str, Any], style_a
         "is_video_url": is_video_url,
     }
     try:
-        inner = template.render(**context)
+        inner = render_with_budget(template, context)
     except TemplateError as exc:
         logger.warning("Failed to render template for block %s: %s", block.definition.key, exc)
-        return RenderedBlock(html=_render_template_error(helpers, f"Template error: {exc}"))
+        return RenderedBlock(html=_render_template_error(helpers, f"Template error: {exc}"), cacheable=False)
     section_attrs = [
         f'class="{helpers.section_classes()}"',
         f'data-block-section="{helpers.block_id}"',
@@ -493,9 +559,9 @@ def is_video_url(url: str | None) -> bool:
 
 
 
-BLOCK_TEMPLATES: dict[str, Template] = {
+BLOCK_TEMPLATE_SOURCES: dict[str, str] = {
 
-    "hero": Template(
+    "hero": (
 
         """
 
@@ -553,7 +619,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
         """
 
     ),
-    "speaker-highlight": Template(
+    "speaker-highlight": (
         """
         {% set block_id = block.id or block.order_index %}
         {% set layout_mode = (layout or "left").lower() %}
@@ -629,7 +695,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
         """
     ),
 
-    "feature-grid": Template(
+    "feature-grid": (
 
         """
 
@@ -661,7 +727,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "media-gallery": Template(
+    "media-gallery": (
 
         """
 
@@ -725,7 +791,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "cta": Template(
+    "cta": (
 
         """
 
@@ -753,7 +819,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "form": Template(
+    "form": (
 
         """
 
@@ -795,7 +861,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "price-list": Template(
+    "price-list": (
 
         """
 
@@ -828,7 +894,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "schedule": Template(
+    "schedule": (
 
         """
 
@@ -868,7 +934,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "team": Template(
+    "team": (
 
         """
 
@@ -958,7 +1024,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "testimonials": Template(
+    "testimonials": (
 
         """
 
@@ -986,7 +1052,7 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
     ),
 
-    "faq": Template(
+    "faq": (
 
         """
 
@@ -1018,148 +1084,309 @@ BLOCK_TEMPLATES: dict[str, Template] = {
 
 
 
-def render_block(block: BlockInstance, locale: str, settings: dict[str, Any]) -> RenderedBlock:
-
-    template = BLOCK_TEMPLATES.get(block.definition.key)
-
-    payload: dict[str, Any] = (
-
-        block_payload_for_locale(block, locale, settings) or block.definition.default_config or {}
-
-    )
-
-    payload = dict(payload)
-
-    style_attr = _style_to_attr(payload.pop("style", None))
+HEADER_TEMPLATE_SOURCE = """
 
-    dynamic = _render_dynamic_block(block, payload, style_attr)
-    if dynamic:
-        return dynamic
-
-    if template is None:
-
-        block_id = block.id or block.order_index or 0
-
-        attrs = [f'data-block-section="{block_id}"']
-
-        if style_attr:
-
-            attrs.append(f'style="{style_attr}"')
+        <header style="padding:16px 24px;background:{{ background }};color:{{ color }};">
 
-        return RenderedBlock(html=f"<section {' '.join(attrs)}><pre>{payload}</pre></section>")
+          <strong>{{ title }}</strong>
 
-    return RenderedBlock(
+        </header>
 
-        html=template.render(style_attr=style_attr, block=block, is_video_url=is_video_url, **payload)
+        """
 
-    )
+FOOTER_TEMPLATE_SOURCE = """
 
+        <footer style="padding:32px 24px;background:{{ background }};color:{{ color }};">
 
+          <p>{{ footer_text }}</p>
 
+        </footer>
 
+        """
 
-def render_project_html(project: Project, locale: str | None = None) -> str:
 
-    theme = project.theme or {}
+def _template_bytecode_cache() -> BytecodeCache | None:
+    directory = app_settings.template_bytecode_cache_dir
+    if directory is None:
+        return FileSystemBytecodeCache()
+    if not directory:
+        return None
+    try:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        logger.warning("Template bytecode cache dir %s is not writable, compiling in memory", directory)
+        return None
+    return FileSystemBytecodeCache(directory)
 
-    settings = project.settings or {}
 
-    ensure_locales(settings)
+def _builtin_template_sources() -> dict[str, str]:
+    sources = {
+        "base.html": BASE_TEMPLATE_SOURCE,
+        "header.html": HEADER_TEMPLATE_SOURCE,
+        "footer.html": FOOTER_TEMPLATE_SOURCE,
+    }
+    for key, source in BLOCK_TEMPLATE_SOURCES.items():
+        sources[f"blocks/{key}.html"] = source
+    for group, source in CSS_GROUP_SOURCES.items():
+        sources[f"css/{group}.css"] = source
+    return sources
 
-    selected_locale = resolve_locale(settings, locale)
 
-    header = Template(
+TEMPLATE_ENV = Environment(
+    loader=DictLoader(_builtin_template_sources()),
+    bytecode_cache=_template_bytecode_cache(),
+    auto_reload=False,
+)
+BASE_TEMPLATE = TEMPLATE_ENV.get_template("base.html")
+HEADER_TEMPLATE = TEMPLATE_ENV.get_template("header.html")
+FOOTER_TEMPLATE = TEMPLATE_ENV.get_template("footer.html")
+BLOCK_TEMPLATES: dict[str, Template] = {
+    key: TEMPLATE_ENV.get_template(f"blocks/{key}.html") for key in BLOCK_TEMPLATE_SOURCES
+}
 
-        """
 
-        <header style="padding:16px 24px;background:{{ background }};color:{{ color }};">
+_CSS_TOKEN_RE = re.compile(r"[A-Za-z][\w-]*")
 
-          <strong>{{ title }}</strong>
 
-        </header>
+def _css_groups_in(source: str) -> frozenset[str]:
+    return frozenset(token for token in _CSS_TOKEN_RE.findall(source) if token in CSS_GROUP_SOURCES)
 
-        """
 
-    ).render(
+# block key -> stylesheet fragments its built-in template can emit
+BLOCK_CSS_INDEX: dict[str, frozenset[str]] = {
+    key: _css_groups_in(source) for key, source in BLOCK_TEMPLATE_SOURCES.items()
+}
 
-        title=project.title,
 
-        background=theme.get("header_bg", "#ffffff"),
+@lru_cache(maxsize=256)
+def _custom_markup_css_groups(markup: str) -> frozenset[str]:
+    groups = _css_groups_in(markup)
+    if "helpers." in markup:
+        # asset helpers fall back to the shared placeholder markup
+        groups |= {"asset-placeholder"}
+    return groups
 
-        color=theme.get("header_text", "#0f172a"),
 
+def css_groups_for_blocks(blocks: list[BlockInstance]) -> list[str]:
+    """Stylesheet fragments needed by the given blocks, in stylesheet order."""
+    needed: set[str] = set()
+    for block in blocks:
+        markup = getattr(block.definition, "template_markup", None)
+        if markup:
+            needed |= _custom_markup_css_groups(markup)
+        else:
+            needed |= BLOCK_CSS_INDEX.get(block.definition.key, frozenset())
+    return [group for group in CSS_GROUP_SOURCES if group in needed]
+
+
+def _definition_revision(definition: Any) -> Any:
+    updated_at = getattr(definition, "updated_at", None)
+    if updated_at is not None:
+        return updated_at.isoformat()
+    # inline definitions (template snapshots) carry no timestamp, so key on the markup itself
+    return [getattr(definition, "template_markup", None), getattr(definition, "template_styles", None)]
+
+
+def block_cache_key(block: BlockInstance, payload: dict[str, Any], style_attr: str) -> str:
+    definition = block.definition
+    material = json.dumps(
+        [
+            definition.key,
+            getattr(definition, "version", None),
+            _definition_revision(definition),
+            block.id,
+            block.order_index,
+            payload,
+            style_attr,
+        ],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
     )
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()
 
-    footer = Template(
 
-        """
+def render_block(block: BlockInstance, locale: str, settings: dict[str, Any]) -> RenderedBlock:
+    with timed_block(block.id or block.order_index, block.definition.key) as timing:
+        rendered, cached = _render_block_cached(block, locale, settings)
+        if timing is not None:
+            timing["bytes"] = len(rendered.html.encode("utf-8"))
+            timing["cached"] = cached
+    return rendered
 
-        <footer style="padding:32px 24px;background:{{ background }};color:{{ color }};">
 
-          <p>{{ footer_text }}</p>
+def _render_block_cached(block: BlockInstance, locale: str, settings: dict[str, Any]) -> tuple[RenderedBlock, bool]:
+    payload: dict[str, Any] = (
+        block_payload_for_locale(block, locale, settings) or block.definition.default_config or {}
+    )
+    payload = dict(payload)
+    style_attr = _style_to_attr(payload.pop("style", None))
+    if not BLOCK_RENDER_CACHE.enabled:
+        return _render_block_uncached(block, payload, style_attr), False
+    cache_key = block_cache_key(block, payload, style_attr)
+    cached = BLOCK_RENDER_CACHE.get(cache_key)
+    if cached is not None:
+        return cached, True
+    rendered = _render_block_uncached(block, payload, style_attr)
+    if rendered.cacheable:
+        BLOCK_RENDER_CACHE.set(cache_key, rendered)
+    return rendered, False
+
+
+def _render_block_uncached(block: BlockInstance, payload: dict[str, Any], style_attr: str) -> RenderedBlock:
+    template = BLOCK_TEMPLATES.get(block.definition.key)
+    dynamic = _render_dynamic_block(block, payload, style_attr)
+    if dynamic:
+        return dynamic
+    if template is None:
+        block_id = block.id or block.order_index or 0
+        attrs = [f'data-block-section="{block_id}"']
+        if style_attr:
+            attrs.append(f'style="{style_attr}"')
+        return RenderedBlock(html=f"<section {' '.join(attrs)}><pre>{payload}</pre></section>")
+    return RenderedBlock(
+        html=template.render(style_attr=style_attr, block=block, is_video_url=is_video_url, **payload)
+    )
 
-        </footer>
 
-        """
+_HEADER_SLOT = "\x00renderly-header\x00"
+_CONTENT_SLOT = "\x00renderly-content\x00"
+_FOOTER_SLOT = "\x00renderly-footer\x00"
 
-    ).render(
 
-        footer_text=settings.get("footer_text", "Сделано на Renderly"),
+def _block_style(block: BlockInstance) -> tuple[str, str] | None:
+    definition = block.definition
+    if not getattr(definition, "template_markup", None):
+        return None
+    rules = (getattr(definition, "template_styles", None) or "").strip()
+    if not rules:
+        return None
+    return definition.key, rules
 
-        background=theme.get("footer_bg", "#0f172a"),
 
-        color=theme.get("footer_text", "#ffffff"),
+def _style_tag(style_key: str, style_rules: str) -> str:
+    return f'<style data-block-style="{style_key}">\n{style_rules}\n</style>'
 
-    )
 
-    rendered_blocks = [
-        render_block(block, selected_locale, settings)
-        for block in sorted(project.blocks, key=lambda b: b.order_index)
-    ]
+def stream_project_html(project: Project, locale: str | None = None) -> Iterator[str]:
+    """Render the page piece by piece: head, header, one chunk per block, footer.
 
+    Everything that touches the project (theme, settings, block list, definitions)
+    is read before the iterator is returned, so the blocks can be rendered after
+    the request's DB session is gone.
+    """
+    project = RenderProject.from_orm(project)
+    theme = project.theme or {}
+    settings = project.settings or {}
+    ensure_locales(settings)
+    selected_locale = resolve_locale(settings, locale)
+    with timed_phase("header"):
+        header = HEADER_TEMPLATE.render(
+            title=project.title,
+            background=theme.get("header_bg", "#ffffff"),
+            color=theme.get("header_text", "#0f172a"),
+        )
+    with timed_phase("footer"):
+        footer = FOOTER_TEMPLATE.render(
+            footer_text=settings.get("footer_text", "Сделано на Renderly"),
+            background=theme.get("footer_bg", "#0f172a"),
+            color=theme.get("footer_text", "#ffffff"),
+        )
+    blocks = sorted(project.blocks, key=lambda b: b.order_index)
     style_tags: dict[str, str] = {}
-    content_parts: list[str] = []
-    for rendered in rendered_blocks:
-        content_parts.append(rendered.html)
-        if rendered.style_key and rendered.style_rules and rendered.style_key not in style_tags:
-            style_tags[rendered.style_key] = (
-                f'<style data-block-style="{rendered.style_key}">\n{rendered.style_rules}\n</style>'
-            )
-
+    for block in blocks:
+        style = _block_style(block)
+        if style and style[0] not in style_tags:
+            style_tags[style[0]] = _style_tag(*style)
+    with timed_phase("base"):
+        page = BASE_TEMPLATE.render(
+            title=project.title,
+            background=theme.get("page_bg", "#f8fafc"),
+            text_color=theme.get("text_color", "#0f172a"),
+            accent=theme.get("accent", "#6366f1"),
+            header_bg=theme.get("header_bg", "#ffffff"),
+            header_text=theme.get("header_text", "#0f172a"),
+            footer_bg=theme.get("footer_bg", "#0f172a"),
+            footer_text=theme.get("footer_text", "#ffffff"),
+            header=_HEADER_SLOT,
+            footer=_FOOTER_SLOT,
+            content=_CONTENT_SLOT,
+            css_groups=css_groups_for_blocks(blocks),
+        )
+    head, rest = page.split(_HEADER_SLOT, 1)
+    before_content, rest = rest.split(_CONTENT_SLOT, 1)
+    before_footer, tail = rest.split(_FOOTER_SLOT, 1)
     style_html = "\n".join(style_tags.values())
-    content = "\n".join(part for part in ([style_html] if style_html else []) + content_parts)
-
-    return BASE_TEMPLATE.render(
-
-        title=project.title,
 
-        background=theme.get("page_bg", "#f8fafc"),
+    def _chunks() -> Iterator[str]:
+        yield head
+        yield header
+        yield before_content + style_html
+        separator = "\n" if style_html else ""
+        for block in blocks:
+            yield separator + render_block(block, selected_locale, settings).html
+            separator = "\n"
+        yield before_footer
+        yield footer
+        yield tail
 
-        text_color=theme.get("text_color", "#0f172a"),
+    return _chunks()
 
-        accent=theme.get("accent", "#6366f1"),
 
-        header_bg=theme.get("header_bg", "#ffffff"),
-
-        header_text=theme.get("header_text", "#0f172a"),
-
-        footer_bg=theme.get("footer_bg", "#0f172a"),
+def render_project_html(project: Project, locale: str | None = None) -> str:
+    return "".join(stream_project_html(project, locale))
 
-        footer_text=theme.get("footer_text", "#ffffff"),
 
-        header=header,
+def render_block_fragments(
+    project: Project,
+    block_ids: list[int],
+    locale: str | None = None,
+) -> dict[str, Any]:
+    """Render only the given blocks, for patching an already loaded preview in place.
 
-        footer=footer,
+    Returns the ``<section data-block-section>`` markup of each block that was found,
+    the ``<style data-block-style>`` tags those blocks need and the ids that were not.
+    """
+    project = RenderProject.from_orm(project)
+    settings = project.settings or {}
+    ensure_locales(settings)
+    selected_locale = resolve_locale(settings, locale)
+    wanted = set(block_ids)
+    fragments: list[dict[str, Any]] = []
+    style_tags: dict[str, str] = {}
+    for block in sorted(project.blocks, key=lambda b: b.order_index):
+        if block.id not in wanted:
+            continue
+        rendered = render_block(block, selected_locale, settings)
+        fragments.append({"id": block.id, "order_index": block.order_index, "html": rendered.html})
+        style = _block_style(block)
+        if style and style[0] not in style_tags:
+            style_tags[style[0]] = _style_tag(*style)
+    found = {fragment["id"] for fragment in fragments}
+    return {
+        "blocks": fragments,
+        "styles": list(style_tags.values()),
+        "missing": [block_id for block_id in block_ids if block_id not in found],
+    }
 
-        content=content,
 
-    )
+def render_project_locales(project: Project, locales: list[str], max_workers: int = 4) -> dict[str, str]:
+    # detach from the ORM here: worker threads must not touch the request's session
+    project = RenderProject.from_orm(project)
+    workers = max(1, min(max_workers, len(locales)))
+    # each locale renders in its own copy of the caller's context so render timings keep collecting
+    contexts = [contextvars.copy_context() for _ in locales]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-locale") as pool:
+        pages = pool.map(lambda code, context: context.run(render_project_html, project, code), locales, contexts)
+        return dict(zip(locales, pages))
 
 
 
 
 
-def version_for_project(project: Project) -> str:
+def version_for_project(project: Project, content_hash: str | None = None) -> str:
+    if content_hash:
+        return f"{project.id}-{content_hash[:16]}"
 
     timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
 
@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.tasks import publish_queue
+from app.db.session import SessionLocal
+from app.models.block_definition import BlockDefinition
+from app.models.project import Project
+from app.models.publish_job import PublishJob
+from app.models.published_version import PublishedVersion
+from app.services.artifacts import content_hash, prepare_publish_html
+from app.services.audit import record_event
+from app.services.cdn import IMMUTABLE_CACHE_CONTROL, delete_html, upload_html
+from app.services.custom_domains import (
+    activate_domain_releases,
+    begin_domain_release,
+    discard_release,
+    finish_domain_release,
+    remove_domain_html,
+    rollback_domain_release,
+    write_release_page,
+)
+from app.services.localization import ensure_locales
+from app.services.publisher import render_project_html, render_project_locales, snapshot_project, version_for_project
+from app.services.render_model import RenderProject
+from app.services.render_timing import collect_render_timings
+from app.services.purge import purge_hostnames
+from app.services.routing import delete_routes, route_for, set_routes
+from app.services.slugify import slugify
+
+logger = logging.getLogger("renderly.publishing")
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+class PublishError(RuntimeError):
+    """The versioned artifact or the default host could not be uploaded."""
+
+
+@dataclass
+class PublishResult:
+    published: PublishedVersion
+    custom_domain_url: str | None
+    deduplicated: bool = False
+
+
+def default_project_hostname(project: Project) -> str | None:
+    root = (settings.project_subdomain_root or "").strip().lstrip(".")
+    if not root:
+        return None
+    if project.title:
+        base = slugify(project.title)
+    else:
+        base = ""
+    if not base:
+        fallback_slug = (project.slug or "").strip().lower()
+        base = slugify(fallback_slug) or f"project-{project.id}"
+    return f"{base}.{root.lower()}"
+
+
+def project_subdomain_url(hostname: str) -> str:
+    scheme = (settings.project_subdomain_scheme or settings.custom_domain_proxy_scheme or "https").strip()
+    if not scheme:
+        scheme = "https"
+    return f"{scheme}://{hostname}/"
+
+
+def latest_published_version(db: Session, project_id: int) -> PublishedVersion | None:
+    return (
+        db.query(PublishedVersion)
+        .filter(PublishedVersion.project_id == project_id)
+        .order_by(PublishedVersion.created_at.desc(), PublishedVersion.id.desc())
+        .first()
+    )
+
+
+def published_snapshot(project: Project) -> dict[str, Any]:
+    """The content a publish renders, kept on its version so it can be rendered again later."""
+    snapshot = snapshot_project(project)
+    for block in snapshot["blocks"]:
+        # a re-render takes the definition from the catalog, so only its key is kept
+        block.pop("definition", None)
+    return snapshot
+
+
+def _snapshot_content(db: Session, snapshot: dict[str, Any]) -> RenderProject:
+    keys = {block.get("definition_key") for block in snapshot.get("blocks") or []}
+    definitions = {
+        definition.key: definition
+        for definition in db.query(BlockDefinition).filter(BlockDefinition.key.in_(keys))
+    }
+    return RenderProject.from_snapshot(snapshot, definitions)
+
+
+def publish_targets(project: Project) -> list[str]:
+    hosts = {default_project_hostname(project) or project.slug}
+    hosts.update(domain.hostname for domain in project.domains if domain.status == "verified")
+    return sorted(hosts)
+
+
+def custom_domain_url(project: Project) -> str | None:
+    verified_domain = next((d for d in project.domains if d.status == "verified"), None)
+    if verified_domain:
+        return f"{settings.custom_domain_proxy_scheme}://{verified_domain.hostname}/"
+    fallback_host = default_project_hostname(project)
+    if fallback_host:
+        return project_subdomain_url(fallback_host)
+    return None
+
+
+def _upload_many(objects: dict[str, str], **upload_kwargs) -> dict[str, tuple[str, str] | RuntimeError]:
+    if not objects:
+        return {}
+    workers = max(1, min(settings.publish_max_workers, len(objects)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="publish-upload") as pool:
+        futures = {name: pool.submit(upload_html, name, html, **upload_kwargs) for name, html in objects.items()}
+    results: dict[str, tuple[str, str] | RuntimeError] = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except RuntimeError as exc:
+            results[name] = exc
+    return results
+
+
+def _upload_locale_versions(project: Project, version: str, pages: dict[str, str]) -> dict[str, tuple[str, str]]:
+    object_names = {locale: f"{project.slug}/{version}/{locale}/index.html" for locale in pages}
+    results = _upload_many(
+        {object_names[locale]: html for locale, html in pages.items()},
+        cache_control=IMMUTABLE_CACHE_CONTROL,
+    )
+    uploaded: dict[str, tuple[str, str]] = {}
+    for locale, object_name in object_names.items():
+        result = results[object_name]
+        if isinstance(result, RuntimeError):
+            raise PublishError(str(result)) from result
+        uploaded[locale] = result
+    return uploaded
+
+
+def _publish_domain_object(
+    hostname: str,
+    locale: str | None,
+    html: str,
+    started: float,
+    stage: Path | None,
+) -> tuple[str | None, float]:
+    object_name = f"domains/{hostname}/{locale}/index.html" if locale else f"domains/{hostname}/index.html"
+    error = None
+    try:
+        upload_html(object_name, html, presign=False)
+    except RuntimeError as exc:
+        error = str(exc)
+    if stage is not None:
+        try:
+            write_release_page(stage, html, locale=locale)
+        except OSError:
+            logger.warning("could not write the local copy of %s", object_name)
+    return error, perf_counter() - started
+
+
+def _publish_domains(
+    hostnames: list[str],
+    html: str,
+    pages: dict[str, str],
+) -> tuple[dict[str, dict[str, Any]], dict[str, Path]]:
+    """Upload every host's pages concurrently and stage each host's local release.
+
+    Returns per-host ``status`` and the milliseconds until its last object
+    landed (a failed root page marks the host failed, failed locales are
+    listed), plus the staging directories to seal and activate.
+    """
+    stages = {hostname: begin_domain_release(hostname) for hostname in hostnames}
+    tasks = [(hostname, None, html) for hostname in hostnames]
+    tasks += [(hostname, locale, page) for hostname in hostnames for locale, page in pages.items()]
+    if not tasks:
+        return {}, {}
+    started = perf_counter()
+    workers = max(1, min(settings.publish_max_workers, len(tasks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="publish-domain") as pool:
+        futures = [
+            (hostname, locale, pool.submit(_publish_domain_object, hostname, locale, page, started, stages[hostname]))
+            for hostname, locale, page in tasks
+        ]
+    results: dict[str, dict[str, Any]] = {hostname: {"status": "ok", "ms": 0.0} for hostname in hostnames}
+    for hostname, locale, future in futures:
+        error, elapsed = future.result()
+        entry = results[hostname]
+        entry["ms"] = max(entry["ms"], round(elapsed * 1000, 1))
+        if error is None:
+            continue
+        if locale is None:
+            entry["status"] = "failed"
+            entry["error"] = error
+        else:
+            entry.setdefault("failed_locales", []).append(locale)
+    staged: dict[str, Path] = {}
+    for hostname, stage in stages.items():
+        if stage is None:
+            continue
+        if results[hostname]["status"] == "ok":
+            staged[hostname] = stage
+        else:
+            discard_release(stage)
+    return results, staged
+
+
+def _activate_releases(staged: dict[str, Path], version: str) -> list[str]:
+    releases = {}
+    for hostname, stage in staged.items():
+        release = finish_domain_release(hostname, stage, version)
+        if release is not None:
+            releases[hostname] = release
+    return activate_domain_releases(releases)
+
+
+def publish_project(
+    db: Session,
+    project: Project,
+    *,
+    user_id: int | None,
+    lang: str | None = None,
+    all_locales: bool = False,
+    timings: bool = False,
+    on_stage: Callable[[str], None] | None = None,
+    snapshot: dict[str, Any] | None = None,
+) -> PublishResult:
+    """Render, upload and record a new published version of ``project``.
+
+    ``snapshot`` (see :func:`published_snapshot`) is rendered instead of the
+    project's working copy, so an earlier publication can be rebuilt without
+    its owner's unpublished edits.
+
+    Raises :class:`PublishError` when the versioned artifact or the default
+    host cannot be uploaded; failing custom domains are skipped.
+    """
+
+    def stage(name: str) -> None:
+        if on_stage is not None:
+            on_stage(name)
+
+    stage("rendering")
+    if snapshot is None:
+        snapshot = published_snapshot(project)
+        content: Project | RenderProject = project
+    else:
+        content = _snapshot_content(db, snapshot)
+    meta: dict = {"block_count": len(content.blocks), "lang": lang, "snapshot": snapshot}
+    pages: dict[str, str] = {}
+    with collect_render_timings(timings or settings.publish_record_timings) as render_timings:
+        if all_locales:
+            if content is project:
+                project.settings = project.settings or {}
+            locales = ensure_locales(content.settings)
+            pages = render_project_locales(content, locales["locales"], max_workers=settings.publish_max_workers)
+        else:
+            html = render_project_html(content, lang)
+    if all_locales:
+        pages = {locale: prepare_publish_html(page) for locale, page in pages.items()}
+        html = pages[locales["default_locale"]]
+    else:
+        html = prepare_publish_html(html)
+    digest = content_hash(pages or {"": html})
+    targets = publish_targets(project)
+    latest = latest_published_version(db, project.id)
+    if (
+        project.status == "published"
+        and latest
+        and (latest.meta or {}).get("content_hash") == digest
+        and latest.meta.get("domains") == targets
+    ):
+        # same bytes to the same hosts and still published: everything is already live.
+        # Unpublishing sets the project back to draft and removes the host copies,
+        # so an older row with a matching hash must be published again.
+        project.status = "published"
+        db.add(project)
+        db.commit()
+        db.refresh(project)
+        custom_url = custom_domain_url(project)
+        record_event(
+            db,
+            action="project.publish",
+            project_id=project.id,
+            user_id=user_id,
+            payload={
+                "version": latest.version,
+                "cdn_url": latest.cdn_url,
+                "object_path": latest.object_path,
+                "custom_domain_url": custom_url,
+                "locales": sorted(pages),
+                "deduplicated": True,
+            },
+        )
+        set_routes(targets, route_for(project, latest))
+        return PublishResult(published=latest, custom_domain_url=custom_url, deduplicated=True)
+    stage("uploading")
+    version = version_for_project(project, digest)
+    meta["content_hash"] = digest
+    if all_locales:
+        uploaded = _upload_locale_versions(project, version, pages)
+        stored_path, cdn_url = uploaded[locales["default_locale"]]
+        meta["default_locale"] = locales["default_locale"]
+        meta["locales"] = {
+            locale: {"object_path": object_path, "cdn_url": url}
+            for locale, (object_path, url) in uploaded.items()
+        }
+    else:
+        object_path = f"{project.slug}/{version}.html"
+        try:
+            stored_path, cdn_url = upload_html(object_path, html, cache_control=IMMUTABLE_CACHE_CONTROL)
+        except RuntimeError as exc:
+            raise PublishError(str(exc)) from exc
+    stage("domains")
+    default_host = default_project_hostname(project)
+    verified_hosts = [domain.hostname for domain in project.domains if domain.status == "verified"]
+    hostnames = list(dict.fromkeys(([default_host] if default_host else []) + verified_hosts))
+    domain_results, staged = _publish_domains(hostnames, html, pages)
+    if default_host and domain_results[default_host]["status"] != "ok":
+        for release_dir in staged.values():
+            discard_release(release_dir)
+        raise PublishError(domain_results[default_host]["error"])
+    if not default_host:
+        # without a subdomain root the page is only served from local disk
+        release_dir = begin_domain_release(project.slug)
+        try:
+            if release_dir is not None:
+                write_release_page(release_dir, html)
+                for locale, page in pages.items():
+                    write_release_page(release_dir, page, locale=locale)
+                staged[project.slug] = release_dir
+        except OSError:
+            logger.warning("could not write the local copy of %s", project.slug)
+            discard_release(release_dir)
+    # every host's files are synced in one pass, then each host switches with a single rename
+    activated = _activate_releases(staged, version)
+    default_url = project_subdomain_url(default_host) if default_host else None
+    published_hosts = {default_host or project.slug}
+    custom_url = default_url
+    for hostname in verified_hosts:
+        if domain_results[hostname]["status"] != "ok":
+            continue
+        published_hosts.add(hostname)
+        if not custom_url or custom_url == default_url:
+            custom_url = f"{settings.custom_domain_proxy_scheme}://{hostname}/"
+    meta["domain_results"] = domain_results
+    # a host that failed to upload keeps the next identical publish from being skipped
+    meta["domains"] = sorted(published_hosts)
+    published = PublishedVersion(
+        project_id=project.id,
+        version=version,
+        object_path=stored_path,
+        cdn_url=cdn_url,
+        meta=meta,
+    )
+    project.status = "published"
+    db.add_all([project, published])
+    try:
+        db.commit()
+    except Exception:
+        # hosts must not serve a version the database never recorded
+        for hostname in activated:
+            rollback_domain_release(hostname)
+        raise
+    db.refresh(project)
+    set_routes(meta["domains"], route_for(project, published))
+    _purge_quietly(meta["domains"])
+    record_event(
+        db,
+        action="project.publish",
+        project_id=project.id,
+        user_id=user_id,
+        payload={
+            "version": published.version,
+            "cdn_url": published.cdn_url,
+            "object_path": published.object_path,
+            "custom_domain_url": custom_url,
+            "locales": sorted(pages),
+            **({"timings": render_timings.as_dict()} if render_timings else {}),
+        },
+    )
+    return PublishResult(published=published, custom_domain_url=custom_url)
+
+
+def _domain_objects(hostname: str, locales: dict) -> list[str]:
+    return [f"domains/{hostname}/index.html"] + [f"domains/{hostname}/{locale}/index.html" for locale in locales]
+
+
+def _delete_quietly(object_name: str) -> None:
+    try:
+        delete_html(object_name)
+    except RuntimeError:
+        logger.warning("could not delete %s", object_name)
+
+
+def _purge_quietly(hostnames: list[str]) -> None:
+    report = purge_hostnames(hostnames)
+    if report["targets"]:
+        logger.info("purged %s cached entries for %s", report["evicted"], ", ".join(report["hostnames"]))
+
+
+def _versioned_objects(published: PublishedVersion) -> set[str]:
+    locales = (published.meta or {}).get("locales") or {}
+    return {published.object_path} | {info["object_path"] for info in locales.values()}
+
+
+def remove_published_artifacts(db: Session, project: Project, published: PublishedVersion) -> None:
+    """Delete a version's objects and every host copy of it, concurrently and best-effort.
+
+    Versioned objects are named by content hash, so an older row can point at the
+    same object (publish A, B, then A again); those objects are kept.
+    """
+    locales = (published.meta or {}).get("locales") or {}
+    still_referenced: set[str] = set()
+    others = db.query(PublishedVersion).filter(
+        PublishedVersion.project_id == published.project_id,
+        PublishedVersion.id != published.id,
+    )
+    for other in others:
+        still_referenced |= _versioned_objects(other)
+    object_names = sorted(_versioned_objects(published) - still_referenced)
+    default_host = default_project_hostname(project)
+    verified_hosts = [domain.hostname for domain in project.domains if domain.status == "verified"]
+    hostnames = list(dict.fromkeys(([default_host] if default_host else []) + verified_hosts))
+    for hostname in hostnames:
+        object_names += _domain_objects(hostname, locales)
+    workers = max(1, min(settings.publish_max_workers, len(object_names)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="publish-delete") as pool:
+        list(pool.map(_delete_quietly, object_names))
+    delete_routes(hostnames)
+    for hostname in hostnames:
+        remove_domain_html(hostname)
+    _purge_quietly(hostnames)
+
+
+def active_publish_job(db: Session, project_id: int, params: dict) -> PublishJob | None:
+    """A queued or running job with the same parameters that a new request can join instead."""
+    # jobs older than the queue timeout were lost with their worker and must not block new ones
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.publish_job_timeout)
+    candidates = (
+        db.query(PublishJob)
+        .filter(
+            PublishJob.project_id == project_id,
+            PublishJob.status.in_(ACTIVE_JOB_STATUSES),
+            PublishJob.created_at >= cutoff,
+        )
+        .order_by(PublishJob.id.desc())
+        .all()
+    )
+    return next((job for job in candidates if job.params == params), None)
+
+
+def enqueue_publish(job_id: int) -> None:
+    publish_queue.enqueue(
+        run_publish_job,
+        job_id,
+        job_timeout=settings.publish_job_timeout,
+    )
+
+
+def run_publish_job(job_id: int, db: Session | None = None) -> None:
+    session = db or SessionLocal()
+    try:
+        job = session.get(PublishJob, job_id)
+        if not job:
+            logger.warning("publish job %s not found", job_id)
+            return
+        _run_job(session, job)
+    finally:
+        if db is None:
+            session.close()
+
+
+def _run_job(db: Session, job: PublishJob) -> None:
+    logger.info("processing publish job %s for project %s", job.id, job.project_id)
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    db.add(job)
+    db.commit()
+
+    def on_stage(name: str) -> None:
+        job.stage = name
+        db.add(job)
+        db.commit()
+
+    project = db.get(Project, job.project_id)
+    try:
+        if project is None:
+            raise PublishError("Project not found")
+        params = job.params or {}
+        result = publish_project(
+            db,
+            project,
+            user_id=job.user_id,
+            lang=params.get("lang"),
+            all_locales=bool(params.get("all_locales")),
+            timings=bool(params.get("timings")),
+            on_stage=on_stage,
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("publish job %s failed", job.id)
+        db.rollback()
+        job.status = "failed"
+        job.error_message = str(exc)
+        job.finished_at = datetime.utcnow()
+        db.add(job)
+        db.commit()
+        raise
+    job.status = "finished"
+    job.stage = "finished"
+    job.published_version_id = result.published.id
+    job.result = {"custom_domain_url": result.custom_domain_url, "deduplicated": result.deduplicated}
+    job.finished_at = datetime.utcnow()
+    db.add(job)
+    db.commit()
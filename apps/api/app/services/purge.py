@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Iterable
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger("renderly.purge")
+
+
+def purge_targets() -> list[str]:
+    return [url.strip() for url in (settings.cache_purge_urls or "").split(",") if url.strip()]
+
+
+def _purge_one(url: str, hostnames: list[str]) -> dict[str, Any]:
+    headers = {"Authorization": f"Bearer {settings.cache_purge_token}"} if settings.cache_purge_token else {}
+    started = perf_counter()
+    try:
+        response = httpx.post(url, json={"hosts": hostnames}, headers=headers, timeout=settings.cache_purge_timeout)
+        response.raise_for_status()
+        data = response.json() if response.content else {}
+    except (httpx.HTTPError, ValueError) as exc:
+        return {"status": "failed", "ms": round((perf_counter() - started) * 1000, 1), "error": str(exc) or type(exc).__name__}
+    return {
+        "status": "ok",
+        "ms": round((perf_counter() - started) * 1000, 1),
+        "evicted": int(data.get("evicted", 0)) if isinstance(data, dict) else 0,
+    }
+
+
+def purge_hostnames(hostnames: Iterable[str]) -> dict[str, Any]:
+    """Tell every configured cache layer to drop what it holds for ``hostnames``.
+
+    Targets are called concurrently and each one's failure is reported, not
+    raised: a purge that misses one layer must not fail a publish.
+    """
+    hosts = sorted(set(hostnames))
+    targets = purge_targets()
+    report: dict[str, Any] = {"hostnames": hosts, "evicted": 0, "targets": {}}
+    if not hosts or not targets:
+        return report
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="cache-purge") as pool:
+        futures = {url: pool.submit(_purge_one, url, hosts) for url in targets}
+    for url, future in futures.items():
+        result = future.result()
+        report["targets"][url] = result
+        report["evicted"] += result.get("evicted", 0)
+        if result["status"] != "ok":
+            logger.warning("cache purge via %s failed: %s", url, result["error"])
+    return report
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Mapping
+
+from app.services.localization import ensure_locales
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class RenderDefinition:
+    key: str
+    id: int | None = None
+    name: str | None = None
+    category: str | None = None
+    version: str | None = None
+    schema: list[Any] = field(default_factory=list)
+    default_config: dict[str, Any] = field(default_factory=dict)
+    template_markup: str | None = None
+    template_styles: str | None = None
+    updated_at: datetime | None = None
+
+    @classmethod
+    def from_orm(cls, definition: Any) -> RenderDefinition:
+        if isinstance(definition, cls):
+            return definition
+        return cls(
+            key=definition.key,
+            id=getattr(definition, "id", None),
+            name=getattr(definition, "name", None),
+            category=getattr(definition, "category", None),
+            version=getattr(definition, "version", None),
+            schema=getattr(definition, "schema", None) or [],
+            default_config=getattr(definition, "default_config", None) or {},
+            template_markup=getattr(definition, "template_markup", None),
+            template_styles=getattr(definition, "template_styles", None),
+            updated_at=getattr(definition, "updated_at", None),
+        )
+
+    @classmethod
+    def from_snapshot(cls, key: str | None, data: Mapping[str, Any] | None) -> RenderDefinition:
+        """Definition carried inline by a snapshot block, for keys missing from the catalog."""
+        data = data or {}
+        return cls(
+            key=data.get("key") or key or "unknown",
+            name=data.get("name"),
+            category=data.get("category"),
+            version=data.get("version"),
+            schema=data.get("schema") or [],
+            default_config=data.get("default_config") or {},
+            template_markup=data.get("template_markup"),
+            template_styles=data.get("template_styles"),
+        )
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class RenderBlock:
+    id: Any
+    definition: RenderDefinition
+    order_index: int
+    config: dict[str, Any]
+    translations: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class RenderProject:
+    """Everything the publisher reads from a project, detached from the ORM session."""
+
+    title: str
+    theme: dict[str, Any]
+    settings: dict[str, Any]
+    blocks: tuple[RenderBlock, ...]
+    id: int | None = None
+    slug: str | None = None
+
+    @classmethod
+    def from_orm(cls, project: Any) -> RenderProject:
+        if isinstance(project, cls):
+            return project
+        definitions: dict[int, RenderDefinition] = {}
+        blocks = []
+        for block in project.blocks:
+            # blocks of one definition share a single converted copy
+            definition = definitions.get(id(block.definition))
+            if definition is None:
+                definition = definitions[id(block.definition)] = RenderDefinition.from_orm(block.definition)
+            blocks.append(
+                RenderBlock(
+                    id=block.id,
+                    definition=definition,
+                    order_index=block.order_index,
+                    config=block.config or {},
+                    translations=block.translations or {},
+                )
+            )
+        settings = project.settings or {}
+        ensure_locales(settings)
+        return cls(
+            title=project.title,
+            theme=project.theme or {},
+            settings=settings,
+            blocks=tuple(blocks),
+            id=getattr(project, "id", None),
+            slug=getattr(project, "slug", None),
+        )
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: Mapping[str, Any],
+        definitions: Mapping[str, Any] | None = None,
+        title: str | None = None,
+        inline_definitions: bool = False,
+    ) -> RenderProject:
+        """Build from a ``snapshot_project``-shaped dict; catalog ``definitions`` win over inline ones.
+
+        Inline definitions carry their own template markup, so they are only
+        honoured with ``inline_definitions`` (stored template snapshots); otherwise
+        a key missing from ``definitions`` renders as a bare block of that key.
+        """
+        project = snapshot.get("project") or {}
+        settings = project.get("settings") or {}
+        ensure_locales(settings)
+        catalog = definitions or {}
+        converted: dict[str, RenderDefinition] = {}
+        blocks = []
+        for order, block_data in enumerate(snapshot.get("blocks") or []):
+            key = block_data.get("definition_key")
+            if key in catalog:
+                if key not in converted:
+                    converted[key] = RenderDefinition.from_orm(catalog[key])
+                definition = converted[key]
+            else:
+                inline = block_data.get("definition") if inline_definitions else None
+                definition = RenderDefinition.from_snapshot(key, inline)
+            blocks.append(
+                RenderBlock(
+                    id=block_data.get("id"),
+                    definition=definition,
+                    order_index=block_data.get("order_index", order),
+                    config=block_data.get("config") or definition.default_config,
+                    translations=block_data.get("translations") or {},
+                )
+            )
+        return cls(
+            title=project.get("title") or title or "",
+            theme=project.get("theme") or {},
+            settings=settings,
+            blocks=tuple(blocks),
+            slug=project.get("slug"),
+        )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Any, Iterator
+
+from app.core.config import settings
+
+logger = logging.getLogger("renderly.render_timing")
+
+_active: ContextVar[RenderTimings | None] = ContextVar("renderly_render_timings", default=None)
+_current_block: ContextVar[dict[str, Any] | None] = ContextVar("renderly_render_timings_block", default=None)
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+class RenderTimings:
+    """Per-render measurements: page phases plus compile/render time and size of every block."""
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.blocks: list[dict[str, Any]] = []
+        self._lock = Lock()
+        self._started = perf_counter()
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds * 1000
+
+    def add_block(self, entry: dict[str, Any]) -> None:
+        with self._lock:
+            self.blocks.append(entry)
+        if entry["render_ms"] + entry["compile_ms"] >= settings.render_slow_block_ms:
+            logger.warning(
+                "Slow block %s (%s): compile %.1fms, render %.1fms, %d bytes",
+                entry["block_id"],
+                entry["key"],
+                entry["compile_ms"],
+                entry["render_ms"],
+                entry["bytes"],
+            )
+
+    @property
+    def total_ms(self) -> float:
+        return (perf_counter() - self._started) * 1000
+
+    def slowest_blocks(self, limit: int) -> list[dict[str, Any]]:
+        return sorted(self.blocks, key=lambda entry: entry["compile_ms"] + entry["render_ms"], reverse=True)[:limit]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total_ms": round(self.total_ms, 3),
+            "phases": {name: round(value, 3) for name, value in self.phases.items()},
+            "blocks": [
+                {**entry, "compile_ms": round(entry["compile_ms"], 3), "render_ms": round(entry["render_ms"], 3)}
+                for entry in self.blocks
+            ],
+        }
+
+    def server_timing(self, max_blocks: int = 20) -> str:
+        metrics = [f"{name};dur={value:.2f}" for name, value in self.phases.items()]
+        for entry in self.slowest_blocks(max_blocks):
+            name = _TOKEN_RE.sub("-", f"block-{entry['block_id']}-{entry['key']}")
+            duration = entry["compile_ms"] + entry["render_ms"]
+            metrics.append(f'{name};dur={duration:.2f};desc="{entry["bytes"]}B"')
+        metrics.append(f"total;dur={self.total_ms:.2f}")
+        return ", ".join(metrics)
+
+
+def current_timings() -> RenderTimings | None:
+    return _active.get()
+
+
+@contextmanager
+def collect_render_timings(enabled: bool = True) -> Iterator[RenderTimings | None]:
+    if not enabled:
+        yield None
+        return
+    timings = RenderTimings()
+    token = _active.set(timings)
+    try:
+        yield timings
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    timings = _active.get()
+    if timings is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, perf_counter() - started)
+
+
+@contextmanager
+def timed_block(block_id: Any, key: str) -> Iterator[dict[str, Any] | None]:
+    """Measure one block; the caller fills in ``bytes`` and ``cached`` on the yielded entry."""
+    timings = _active.get()
+    if timings is None:
+        yield None
+        return
+    entry: dict[str, Any] = {
+        "block_id": block_id,
+        "key": key,
+        "compile_ms": 0.0,
+        "render_ms": 0.0,
+        "bytes": 0,
+        "cached": False,
+    }
+    token = _current_block.set(entry)
+    started = perf_counter()
+    try:
+        yield entry
+    finally:
+        _current_block.reset(token)
+        entry["render_ms"] = max((perf_counter() - started) * 1000 - entry["compile_ms"], 0.0)
+        timings.add_block(entry)
+
+
+@contextmanager
+def timed_compile() -> Iterator[None]:
+    entry = _current_block.get()
+    if entry is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        entry["compile_ms"] += (perf_counter() - started) * 1000
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import sleep
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.core.tasks import republish_queue
+from app.db.session import SessionLocal
+from app.models.block_instance import BlockInstance
+from app.models.project import Project
+from app.models.republish_job import RepublishJob
+from app.services.publishing import latest_published_version, publish_project
+
+logger = logging.getLogger("renderly.republish")
+
+# fields whose change alters the HTML of every page that uses the definition
+RENDER_FIELDS = ("template_markup", "template_styles", "default_config")
+# per-project messages kept on the job; the counters stay exact beyond this
+MAX_RECORDED_ERRORS = 50
+
+
+def affected_project_ids(db: Session, definition_id: int) -> list[int]:
+    """Published projects with at least one block of ``definition_id``, via the definition index."""
+    rows = (
+        db.query(BlockInstance.project_id)
+        .join(Project, Project.id == BlockInstance.project_id)
+        .filter(BlockInstance.definition_id == definition_id, Project.status == "published")
+        .distinct()
+        .order_by(BlockInstance.project_id)
+        .all()
+    )
+    return [project_id for (project_id,) in rows]
+
+
+def queue_republish(db: Session, definition_id: int, user_id: int | None) -> RepublishJob:
+    """A queued job for ``definition_id``, joining one that has not started yet.
+
+    A running job may already have rendered some pages with the old
+    definition, so it is never joined.
+    """
+    job = (
+        db.query(RepublishJob)
+        .filter(RepublishJob.definition_id == definition_id, RepublishJob.status == "queued")
+        .order_by(RepublishJob.id.desc())
+        .first()
+    )
+    if job is not None:
+        return job
+    job = RepublishJob(definition_id=definition_id, user_id=user_id, status="queued", errors={})
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    try:
+        republish_queue.enqueue(run_republish_job, job.id, job_timeout=settings.republish_job_timeout)
+    except Exception:
+        job.status = "failed"
+        job.error_message = "Republish queue is unavailable"
+        db.add(job)
+        db.commit()
+        raise
+    return job
+
+
+def _republish_project(project_id: int, user_id: int | None, db: Session | None = None) -> str:
+    session = db or SessionLocal()
+    try:
+        project = (
+            session.query(Project)
+            .options(selectinload(Project.domains))
+            .filter(Project.id == project_id)
+            .first()
+        )
+        if project is None or project.status != "published":
+            return "unchanged"
+        latest = latest_published_version(session, project.id)
+        meta = (latest.meta or {}) if latest else {}
+        if not meta.get("snapshot"):
+            # the working copy may hold edits its owner has not published yet
+            raise RuntimeError("The live version predates recorded snapshots; publish the project again")
+        try:
+            # rebuild what is live, in the same shape: same language, all locales if it had them
+            result = publish_project(
+                session,
+                project,
+                user_id=user_id,
+                lang=meta.get("lang"),
+                all_locales=bool(meta.get("locales")),
+                snapshot=meta["snapshot"],
+            )
+        except Exception:
+            session.rollback()
+            raise
+        # identical HTML (the block is configured so the change does not show) uploads nothing
+        return "unchanged" if result.deduplicated else "republished"
+    finally:
+        if db is None:
+            session.close()
+
+
+def _run_batch(db: Session, project_ids: list[int], user_id: int | None) -> dict[int, str | Exception]:
+    outcomes: dict[int, str | Exception] = {}
+    if settings.republish_max_workers <= 1:
+        for project_id in project_ids:
+            try:
+                outcomes[project_id] = _republish_project(project_id, user_id, db)
+            except Exception as exc:  # noqa: BLE001
+                outcomes[project_id] = exc
+        return outcomes
+    # each project gets its own session; the job's session only records progress
+    workers = min(settings.republish_max_workers, len(project_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="republish") as pool:
+        futures = {project_id: pool.submit(_republish_project, project_id, user_id) for project_id in project_ids}
+    for project_id, future in futures.items():
+        try:
+            outcomes[project_id] = future.result()
+        except Exception as exc:  # noqa: BLE001
+            outcomes[project_id] = exc
+    return outcomes
+
+
+def run_republish_job(job_id: int, db: Session | None = None) -> None:
+    session = db or SessionLocal()
+    try:
+        job = session.get(RepublishJob, job_id)
+        if not job:
+            logger.warning("republish job %s not found", job_id)
+            return
+        _run_job(session, job)
+    finally:
+        if db is None:
+            session.close()
+
+
+def _run_job(db: Session, job: RepublishJob) -> None:
+    project_ids = affected_project_ids(db, job.definition_id)
+    logger.info("republishing %s projects for definition %s (job %s)", len(project_ids), job.definition_id, job.id)
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    job.total = len(project_ids)
+    db.add(job)
+    db.commit()
+    user_id = job.user_id
+    batch_size = max(1, settings.republish_batch_size)
+    try:
+        for offset in range(0, len(project_ids), batch_size):
+            if offset and settings.republish_batch_pause > 0:
+                # spread the uploads out instead of hitting storage and the edges all at once
+                sleep(settings.republish_batch_pause)
+            outcomes = _run_batch(db, project_ids[offset : offset + batch_size], user_id)
+            errors = dict(job.errors or {})
+            for project_id, outcome in outcomes.items():
+                if isinstance(outcome, Exception):
+                    logger.warning("republishing project %s failed: %s", project_id, outcome)
+                    job.failed += 1
+                    if len(errors) < MAX_RECORDED_ERRORS:
+                        errors[str(project_id)] = str(outcome) or type(outcome).__name__
+                elif outcome == "republished":
+                    job.republished += 1
+                else:
+                    job.unchanged += 1
+            job.errors = errors
+            job.processed += len(outcomes)
+            db.add(job)
+            db.commit()
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("republish job %s failed", job.id)
+        db.rollback()
+        job.status = "failed"
+        job.error_message = str(exc)
+        job.finished_at = datetime.utcnow()
+        db.add(job)
+        db.commit()
+        raise
+    job.status = "finished"
+    job.finished_at = datetime.utcnow()
+    db.add(job)
+    db.commit()
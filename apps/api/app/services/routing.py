@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Iterable
+
+from app.core.config import settings
+from app.core.tasks import redis_conn
+from app.models.project import Project
+from app.models.published_version import PublishedVersion
+
+logger = logging.getLogger("renderly.routing")
+
+ROUTE_KEY_PREFIX = "renderly:route:"
+ROUTE_CHANNEL = "renderly:routes"
+
+
+def route_key(hostname: str) -> str:
+    return f"{ROUTE_KEY_PREFIX}{hostname}"
+
+
+def route_for(project: Project, published: PublishedVersion) -> dict[str, Any]:
+    """Where a host's page lives: the immutable versioned objects, never the mutable domain copies."""
+    meta = published.meta or {}
+    locales = {locale: info["object_path"] for locale, info in (meta.get("locales") or {}).items()}
+    return {
+        "project_id": project.id,
+        "version": published.version,
+        "artifact": published.object_path,
+        "default_locale": meta.get("default_locale"),
+        "locales": locales,
+    }
+
+
+def _apply(routes: dict[str, dict[str, Any] | None]) -> None:
+    if not settings.routing_table_enabled or not routes:
+        return
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for hostname, route in routes.items():
+            if route is None:
+                pipe.delete(route_key(hostname))
+            else:
+                pipe.set(route_key(hostname), json.dumps(route, sort_keys=True))
+            pipe.publish(ROUTE_CHANNEL, hostname)
+        pipe.execute()
+    except Exception:  # noqa: BLE001 - disk copies keep serving while Redis is away
+        logger.exception("could not update routes for %s", sorted(routes))
+
+
+def set_routes(hostnames: Iterable[str], route: dict[str, Any]) -> None:
+    _apply({hostname: route for hostname in hostnames})
+
+
+def delete_routes(hostnames: Iterable[str]) -> None:
+    _apply({hostname: None for hostname in hostnames})
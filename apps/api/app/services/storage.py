@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterator
+from urllib.parse import quote
+
+import certifi
+import urllib3
+from minio import Minio
+from minio.error import S3Error
+
+from app.core.config import settings
+
+RETRY_STATUSES = (500, 502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+
+_backend: StorageBackend | None = None
+_backend_lock = Lock()
+# buckets known to exist; creating one is rare, checking it on every put is a round trip
+_ready_buckets: set[str] = set()
+_bucket_lock = Lock()
+
+
+class StorageError(RuntimeError):
+    """An object-store operation failed, whichever backend served it."""
+
+
+class StorageMetrics:
+    """Per-operation call, error, byte and latency counters for the object store."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._ops: dict[str, dict[str, float]] = {}
+
+    def record(self, operation: str, elapsed: float, nbytes: int = 0, error: bool = False) -> None:
+        with self._lock:
+            entry = self._ops.setdefault(
+                operation,
+                {"calls": 0, "errors": 0, "bytes": 0, "total_ms": 0.0, "max_ms": 0.0},
+            )
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["bytes"] += nbytes
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                operation: {
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 1),
+                    "max_ms": round(entry["max_ms"], 1),
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0,
+                }
+                for operation, entry in self._ops.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+
+STORAGE_METRICS = StorageMetrics()
+
+
+@contextmanager
+def _measured(operation: str, nbytes: int = 0) -> Iterator[None]:
+    started = perf_counter()
+    try:
+        yield
+    except Exception:
+        STORAGE_METRICS.record(operation, perf_counter() - started, error=True)
+        raise
+    STORAGE_METRICS.record(operation, perf_counter() - started, nbytes)
+
+
+class StoredObject:
+    """An opened object: iterate :meth:`stream` for the body, then :meth:`close`."""
+
+    def __init__(self, chunks: Iterator[bytes], close: Callable[[], None] | None = None) -> None:
+        self._chunks = chunks
+        self._close = close
+
+    def stream(self) -> Iterator[bytes]:
+        return self._chunks
+
+    def close(self) -> None:
+        if self._close is not None:
+            self._close()
+
+
+class StorageBackend(ABC):
+    name: str
+
+    @abstractmethod
+    def ensure_bucket(self, bucket: str) -> None: ...
+
+    @abstractmethod
+    def put(self, bucket: str, object_name: str, data: bytes, content_type: str, metadata: dict[str, str] | None) -> None: ...
+
+    @abstractmethod
+    def url(self, bucket: str, object_name: str, expires_seconds: int) -> str: ...
+
+    @abstractmethod
+    def remove(self, bucket: str, object_name: str) -> None:
+        """Delete an object; a missing object is not an error."""
+
+    @abstractmethod
+    def open(self, bucket: str, object_name: str) -> StoredObject: ...
+
+
+def _http_client() -> urllib3.PoolManager:
+    return urllib3.PoolManager(
+        maxsize=settings.storage_pool_size,
+        # threads beyond the pool size wait for a connection instead of opening throwaway ones
+        block=True,
+        timeout=urllib3.Timeout(connect=settings.storage_connect_timeout, read=settings.storage_read_timeout),
+        retries=urllib3.Retry(
+            total=settings.storage_max_retries,
+            backoff_factor=settings.storage_retry_backoff,
+            status_forcelist=RETRY_STATUSES,
+        ),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+    )
+
+
+class MinioBackend(StorageBackend):
+    name = "minio"
+
+    def __init__(self) -> None:
+        self.client = Minio(
+            settings.minio_endpoint,
+            access_key=settings.minio_access_key,
+            secret_key=settings.minio_secret_key,
+            secure=settings.minio_secure,
+            http_client=_http_client(),
+        )
+
+    def ensure_bucket(self, bucket: str) -> None:
+        try:
+            if not self.client.bucket_exists(bucket):
+                self.client.make_bucket(bucket)
+        except (S3Error, urllib3.exceptions.HTTPError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    def put(self, bucket: str, object_name: str, data: bytes, content_type: str, metadata: dict[str, str] | None) -> None:
+        try:
+            self.client.put_object(
+                bucket,
+                object_name,
+                data=BytesIO(data),
+                length=len(data),
+                content_type=content_type,
+                metadata=metadata,
+            )
+        except (S3Error, urllib3.exceptions.HTTPError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    def url(self, bucket: str, object_name: str, expires_seconds: int) -> str:
+        try:
+            return self.client.get_presigned_url("GET", bucket, object_name, expires=timedelta(seconds=expires_seconds))
+        except (S3Error, urllib3.exceptions.HTTPError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    def remove(self, bucket: str, object_name: str) -> None:
+        try:
+            self.client.remove_object(bucket, object_name)
+        except S3Error as exc:
+            if exc.code == "NoSuchKey":
+                return
+            raise StorageError(str(exc)) from exc
+        except urllib3.exceptions.HTTPError as exc:
+            raise StorageError(str(exc)) from exc
+
+    def open(self, bucket: str, object_name: str) -> StoredObject:
+        try:
+            response = self.client.get_object(bucket, object_name)
+        except (S3Error, urllib3.exceptions.HTTPError) as exc:
+            raise StorageError(str(exc)) from exc
+
+        def close() -> None:
+            try:
+                response.close()
+            finally:
+                response.release_conn()
+
+        return StoredObject(response.stream(CHUNK_SIZE), close)
+
+
+class LocalBackend(StorageBackend):
+    """Objects as plain files under ``root/<bucket>/<object name>``.
+
+    The layout mirrors object names so a web server can serve the tree
+    directly with sendfile, ``.gz``/``.br`` siblings included. Writes go to a
+    temporary file in the target directory and are renamed into place, so
+    readers never see a half-written page.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root).resolve()
+
+    def _path(self, bucket: str, object_name: str) -> Path:
+        path = (self.root / bucket / object_name).resolve()
+        if not path.is_relative_to(self.root / bucket):
+            raise StorageError(f"Object name escapes the bucket: {object_name}")
+        return path
+
+    def ensure_bucket(self, bucket: str) -> None:
+        (self.root / bucket).mkdir(parents=True, exist_ok=True)
+
+    def put(self, bucket: str, object_name: str, data: bytes, content_type: str, metadata: dict[str, str] | None) -> None:
+        path = self._path(bucket, object_name)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as handle:
+                    handle.write(data)
+                os.chmod(tmp_name, 0o644)
+                os.replace(tmp_name, path)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+        except OSError as exc:
+            raise StorageError(str(exc)) from exc
+
+    def url(self, bucket: str, object_name: str, expires_seconds: int) -> str:
+        base = (settings.storage_public_base or "").rstrip("/")
+        if base:
+            return f"{base}/{bucket}/{quote(object_name)}"
+        return self._path(bucket, object_name).as_uri()
+
+    def remove(self, bucket: str, object_name: str) -> None:
+        try:
+            self._path(bucket, object_name).unlink(missing_ok=True)
+        except OSError as exc:
+            raise StorageError(str(exc)) from exc
+
+    def open(self, bucket: str, object_name: str) -> StoredObject:
+        try:
+            handle = self._path(bucket, object_name).open("rb")
+        except OSError as exc:
+            raise StorageError(str(exc)) from exc
+        return StoredObject(iter(partial(handle.read, CHUNK_SIZE), b""), handle.close)
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local dict store for tests, benchmarks and throwaway instances."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.objects: dict[tuple[str, str], tuple[bytes, str, dict[str, str]]] = {}
+        self._lock = Lock()
+
+    def ensure_bucket(self, bucket: str) -> None:
+        return None
+
+    def put(self, bucket: str, object_name: str, data: bytes, content_type: str, metadata: dict[str, str] | None) -> None:
+        with self._lock:
+            self.objects[(bucket, object_name)] = (bytes(data), content_type, dict(metadata or {}))
+
+    def url(self, bucket: str, object_name: str, expires_seconds: int) -> str:
+        return f"memory://{bucket}/{quote(object_name)}"
+
+    def remove(self, bucket: str, object_name: str) -> None:
+        with self._lock:
+            self.objects.pop((bucket, object_name), None)
+
+    def open(self, bucket: str, object_name: str) -> StoredObject:
+        stored = self.objects.get((bucket, object_name))
+        if stored is None:
+            raise StorageError(f"No such object: {bucket}/{object_name}")
+        data = stored[0]
+        return StoredObject(iter([data[i : i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]))
+
+
+BACKENDS: dict[str, Callable[[], StorageBackend]] = {
+    "minio": MinioBackend,
+    "local": lambda: LocalBackend(settings.storage_local_dir),
+    "memory": MemoryBackend,
+}
+
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                factory = BACKENDS.get(settings.storage_backend)
+                if factory is None:
+                    raise StorageError(f"Unknown storage backend: {settings.storage_backend}")
+                _backend = factory()
+    return _backend
+
+
+def set_backend(backend: StorageBackend | None) -> None:
+    """Swap the process-wide backend; ``None`` rebuilds it from settings on next use."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+        _ready_buckets.clear()
+
+
+def ensure_bucket(bucket: str) -> None:
+    if bucket in _ready_buckets:
+        return
+    with _bucket_lock:
+        if bucket in _ready_buckets:
+            return
+        with _measured("ensure_bucket"):
+            get_backend().ensure_bucket(bucket)
+        _ready_buckets.add(bucket)
+
+
+def put_bytes(
+    bucket: str,
+    object_name: str,
+    data: bytes,
+    content_type: str,
+    metadata: dict[str, str] | None = None,
+) -> None:
+    ensure_bucket(bucket)
+    with _measured("put", len(data)):
+        get_backend().put(bucket, object_name, data, content_type, metadata)
+
+
+def presigned_get_url(bucket: str, object_name: str, expires_seconds: int) -> str:
+    with _measured("presign"):
+        return get_backend().url(bucket, object_name, expires_seconds)
+
+
+def remove_object(bucket: str, object_name: str) -> None:
+    with _measured("remove"):
+        get_backend().remove(bucket, object_name)
+
+
+def get_object(bucket: str, object_name: str) -> StoredObject:
+    with _measured("get"):
+        return get_backend().open(bucket, object_name)
+
+
+def storage_stats() -> dict[str, Any]:
+    return {
+        "backend": get_backend().name,
+        "pool_size": settings.storage_pool_size,
+        "operations": STORAGE_METRICS.snapshot(),
+    }
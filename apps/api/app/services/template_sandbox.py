@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator
+
+from jinja2 import Template, nodes
+from jinja2.exceptions import TemplateRuntimeError
+from jinja2.runtime import Context
+from jinja2.sandbox import SandboxedEnvironment, safe_range
+from jinja2.visitor import NodeTransformer
+
+from app.core.config import settings
+
+LOOP_GUARD = "_renderly_loop_guard"
+SIZE_GUARD = "_renderly_size_guard"
+
+
+class RenderBudgetExceeded(TemplateRuntimeError):
+    """A custom template ran past its iteration, time or output budget."""
+
+
+@dataclass
+class RenderBudget:
+    max_steps: int
+    max_output_bytes: int
+    timeout_seconds: float
+    steps: int = 0
+    deadline: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.deadline = perf_counter() + self.timeout_seconds
+
+    @classmethod
+    def from_settings(cls) -> RenderBudget:
+        return cls(
+            max_steps=settings.custom_template_max_steps,
+            max_output_bytes=settings.custom_template_max_output_bytes,
+            timeout_seconds=settings.custom_template_timeout_ms / 1000,
+        )
+
+    def tick(self) -> None:
+        self.steps += 1
+        if self.steps > self.max_steps:
+            raise RenderBudgetExceeded(f"template exceeded {self.max_steps} steps")
+        if perf_counter() > self.deadline:
+            raise RenderBudgetExceeded(f"template exceeded {self.timeout_seconds * 1000:.0f}ms")
+
+    def check_length(self, length: int) -> None:
+        if length > self.max_output_bytes:
+            raise RenderBudgetExceeded(f"template value exceeded {self.max_output_bytes} bytes")
+
+    def check_size(self, value: Any) -> Any:
+        if isinstance(value, (str, list, tuple, dict)):
+            self.check_length(len(value))
+        return value
+
+
+_budget: ContextVar[RenderBudget | None] = ContextVar("renderly_template_budget", default=None)
+
+
+def _loop_guard(iterable: Iterable[Any]) -> Iterator[Any]:
+    budget = _budget.get()
+    if budget is None:
+        yield from iterable
+        return
+    for item in iterable:
+        budget.tick()
+        yield item
+
+
+def _size_guard(value: Any) -> Any:
+    budget = _budget.get()
+    if budget is None:
+        return value
+    budget.tick()
+    return budget.check_size(value)
+
+
+def _budget_range(*args: int) -> range:
+    budget = _budget.get()
+    if budget is not None:
+        try:
+            length = len(range(*args))
+        except OverflowError:
+            length = budget.max_steps + 1
+        if length > budget.max_steps:
+            raise RenderBudgetExceeded(f"template range exceeded {budget.max_steps} steps")
+    return safe_range(*args)
+
+
+# widths in "%08d" / "{:>80}" pad the result before any size check could see it
+_PERCENT_WIDTHS = re.compile(r"%[-+ #0]*(\d+)")
+_BRACE_WIDTHS = re.compile(r"\{[^{}]*:[^{}]*?(\d+)[^{}]*\}")
+
+
+def _text_length(value: Any) -> int:
+    return len(value) if isinstance(value, str) else len(str(value))
+
+
+def _sequence_length(items: Any, separator: Any = "") -> int:
+    if not isinstance(items, (list, tuple)):
+        # generators are left alone: measuring them would consume them
+        return 0
+    return sum(_text_length(item) for item in items) + _text_length(separator) * max(len(items) - 1, 0)
+
+
+def _replace_length(value: Any, old: Any, new: Any, count: Any = None) -> int:
+    text, old, new = str(value), str(old), str(new)
+    hits = text.count(old) if old else len(text) + 1
+    if isinstance(count, int) and count >= 0:
+        hits = min(hits, count)
+    return len(text) + hits * max(len(new) - len(old), 0)
+
+
+def _format_length(fmt: Any, *args: Any, **kwargs: Any) -> int:
+    text = str(fmt)
+    widths = sum(int(width) for width in _PERCENT_WIDTHS.findall(text) + _BRACE_WIDTHS.findall(text))
+    return len(text) + widths + sum(_text_length(arg) for arg in (*args, *kwargs.values()))
+
+
+def _pad_length(value: Any, width: Any = 80, *args: Any, **kwargs: Any) -> int:
+    return max(_text_length(value), width if isinstance(width, int) else 0)
+
+
+def _indent_length(value: Any, width: Any = 4, *args: Any, **kwargs: Any) -> int:
+    text = str(value)
+    pad = width if isinstance(width, int) else len(str(width))
+    return len(text) + pad * (text.count("\n") + 1)
+
+
+def _expandtabs_length(value: Any, tabsize: Any = 8) -> int:
+    text = str(value)
+    return len(text) + text.count("\t") * (tabsize if isinstance(tabsize, int) else 8)
+
+
+# filters and str methods whose result can be far larger than their input, with an upper
+# bound on that size computed from the arguments, so the budget trips before allocation
+_GROWTH_FILTERS: dict[str, Callable[..., int]] = {
+    "replace": _replace_length,
+    "join": lambda value, d="", *args, **kwargs: _sequence_length(value, d),
+    "format": _format_length,
+    "center": _pad_length,
+    "indent": _indent_length,
+}
+_GROWTH_METHODS: dict[str, Callable[..., int]] = {
+    "replace": _replace_length,
+    "join": lambda separator, items: _sequence_length(items, separator),
+    "format": _format_length,
+    "center": _pad_length,
+    "ljust": _pad_length,
+    "rjust": _pad_length,
+    "zfill": _pad_length,
+    "expandtabs": _expandtabs_length,
+}
+
+
+def _check_growth(projector: Callable[..., int], *args: Any, **kwargs: Any) -> None:
+    budget = _budget.get()
+    if budget is None:
+        return
+    try:
+        length = projector(*args, **kwargs)
+    except (TypeError, ValueError):
+        # bad arguments: the call itself reports them
+        return
+    budget.check_length(length)
+
+
+def _guard_growth(func: Callable[..., Any], projector: Callable[..., int]) -> Callable[..., Any]:
+    # @pass_eval_context / @pass_environment filters get that object first; wraps keeps the marker
+    skip = 1 if hasattr(func, "jinja_pass_arg") else 0
+
+    @wraps(func)
+    def guarded(*args: Any, **kwargs: Any) -> Any:
+        _check_growth(projector, *args[skip:], **kwargs)
+        return func(*args, **kwargs)
+
+    return guarded
+
+
+class _BudgetTransformer(NodeTransformer):
+    """Route loop iterables, string concatenation and filter results through the budget guards."""
+
+    def visit_For(self, node: nodes.For) -> nodes.For:
+        self.generic_visit(node)
+        node.iter = nodes.Call(nodes.Name(LOOP_GUARD, "load"), [node.iter], [], None, None, lineno=node.lineno)
+        return node
+
+    def visit_Concat(self, node: nodes.Concat) -> nodes.Call:
+        self.generic_visit(node)
+        return nodes.Call(nodes.Name(SIZE_GUARD, "load"), [node], [], None, None, lineno=node.lineno)
+
+    def visit_Filter(self, node: nodes.Filter) -> nodes.Node:
+        self.generic_visit(node)
+        if node.node is None:
+            # {% filter %} blocks carry a bare filter chain that must stay a Filter node
+            return node
+        return nodes.Call(nodes.Name(SIZE_GUARD, "load"), [node], [], None, None, lineno=node.lineno)
+
+
+class BudgetedSandboxEnvironment(SandboxedEnvironment):
+    """Sandboxed environment whose templates stop once the active :class:`RenderBudget` runs out.
+
+    Budgets only apply inside :func:`render_with_budget`; rendering a template
+    directly behaves like the plain sandbox.
+    """
+
+    intercepted_binops = frozenset(["+", "*", "**"])
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.globals[LOOP_GUARD] = _loop_guard
+        self.globals[SIZE_GUARD] = _size_guard
+        self.globals["range"] = _budget_range
+        for name, projector in _GROWTH_FILTERS.items():
+            self.filters[name] = _guard_growth(self.filters[name], projector)
+
+    def _parse(self, source: str, name: str | None, filename: str | None) -> nodes.Template:
+        tree = super()._parse(source, name, filename)
+        tree = _BudgetTransformer().visit(tree)
+        tree.set_environment(self)
+        return tree
+
+    def _generate(self, source: nodes.Template, name: str | None, filename: str | None, defer_init: bool = False) -> str:
+        # constant folding runs filters at compile time; under a budget an oversized
+        # result is left to the render, where the render's budget rejects it
+        token = _budget.set(RenderBudget.from_settings())
+        try:
+            return super()._generate(source, name, filename, defer_init=defer_init)
+        finally:
+            _budget.reset(token)
+
+    def call_binop(self, context: Context, operator: str, left: Any, right: Any) -> Any:
+        budget = _budget.get()
+        if budget is not None:
+            budget.tick()
+            # reject repetition before it allocates
+            if operator == "*" and isinstance(right, int) and isinstance(left, (str, list, tuple)):
+                budget.check_length(len(left) * right)
+            elif operator == "*" and isinstance(left, int) and isinstance(right, (str, list, tuple)):
+                budget.check_length(len(right) * left)
+            elif operator == "**" and isinstance(right, int) and right > 128:
+                raise RenderBudgetExceeded("template exponent is too large")
+        result = super().call_binop(context, operator, left, right)
+        return budget.check_size(result) if budget is not None else result
+
+    def call(__self, __context: Context, __obj: Any, *args: Any, **kwargs: Any) -> Any:  # noqa: N805
+        budget = _budget.get()
+        if budget is not None:
+            budget.tick()
+            owner = getattr(__obj, "__self__", None)
+            projector = _GROWTH_METHODS.get(getattr(__obj, "__name__", "")) if isinstance(owner, str) else None
+            if projector is not None:
+                _check_growth(projector, owner, *args, **kwargs)
+        return super().call(__context, __obj, *args, **kwargs)
+
+
+def render_with_budget(template: Template, context: dict[str, Any], budget: RenderBudget | None = None) -> str:
+    budget = budget or RenderBudget.from_settings()
+    token = _budget.set(budget)
+    try:
+        chunks: list[str] = []
+        size = 0
+        for chunk in template.generate(**context):
+            size += len(chunk)
+            if size > budget.max_output_bytes:
+                raise RenderBudgetExceeded(f"template output exceeded {budget.max_output_bytes} bytes")
+            chunks.append(chunk)
+        return "".join(chunks)
+    except (OverflowError, MemoryError) as exc:
+        # the sandbox's own limits (range size, huge ints) are budget failures too
+        raise RenderBudgetExceeded(f"template exceeded its budget: {exc or type(exc).__name__}") from exc
+    finally:
+        _budget.reset(token)
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from rq import Connection, Worker
 
-from app.core.tasks import redis_conn, WEBHOOK_QUEUE_NAME
+from app.core.tasks import redis_conn, PUBLISH_QUEUE_NAME, REPUBLISH_QUEUE_NAME, WEBHOOK_QUEUE_NAME
 
 
 def main() -> None:
     with Connection(redis_conn):
-        worker = Worker([WEBHOOK_QUEUE_NAME])
+        # republish is last: a worker only picks it up when nothing else is waiting
+        worker = Worker([WEBHOOK_QUEUE_NAME, PUBLISH_QUEUE_NAME, REPUBLISH_QUEUE_NAME])
         worker.work(with_scheduler=True)
 
 
@@ -0,0 +1,147 @@
+"""Publisher micro-benchmarks.
+
+Run from apps/api:
+
+    python -m benchmarks.publisher_bench run --output benchmarks/baselines/local.json
+    python -m benchmarks.publisher_bench compare benchmarks/baselines/local.json current.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import gc
+import json
+import platform
+import statistics
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.append(str(API_DIR))
+
+from app.services import publisher, storage  # noqa: E402
+from app.services.cdn import upload_html  # noqa: E402
+from app.services.revision_service import compute_diff  # noqa: E402
+from benchmarks.synthetic import build_project  # noqa: E402
+
+# (blocks, locales)
+SCENARIOS: list[tuple[int, int]] = [(10, 1), (100, 3), (500, 10)]
+QUICK_SCENARIOS: list[tuple[int, int]] = [(10, 1), (50, 2)]
+DEFAULT_THRESHOLD = 0.15
+
+
+def _cases(project: Any) -> dict[str, Callable[[], Any]]:
+    locales = project.settings["locales"]["locales"]
+    snapshot = publisher.snapshot_project(project)
+    changed = copy.deepcopy(snapshot)
+    for block in changed["blocks"][::3]:
+        block["config"] = {**(block["config"] or {}), "headline": "Changed"}
+
+    html = publisher.render_project_html(project)
+
+    def render_cold() -> str:
+        publisher.BLOCK_RENDER_CACHE.clear()
+        return publisher.render_project_html(project)
+
+    return {
+        "render_cold": render_cold,
+        "render_warm": lambda: publisher.render_project_html(project),
+        "render_all_locales": lambda: publisher.render_project_locales(project, locales),
+        "snapshot": lambda: publisher.snapshot_project(project),
+        "compute_diff": lambda: compute_diff(snapshot, changed),
+        "upload_memory": lambda: upload_html(f"{project.slug}/bench.html", html),
+    }
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> dict[str, float]:
+    func()  # warm-up: template compilation, caches
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append((perf_counter() - started) * 1000)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(timings), 4),
+        "min_ms": round(min(timings), 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(scenarios: list[tuple[int, int]], repeat: int) -> dict[str, Any]:
+    # uploads go to the in-memory store so they measure our code, not the network
+    storage.set_backend(storage.MemoryBackend())
+    results: dict[str, dict[str, float]] = {}
+    for block_count, locale_count in scenarios:
+        project = build_project(block_count, locale_count)
+        for name, func in _cases(project).items():
+            key = f"{name}[{block_count}x{locale_count}]"
+            results[key] = _measure(func, repeat)
+            print(f"{key:<32} {results[key]['median_ms']:>10.3f} ms {results[key]['peak_kib']:>10.1f} KiB")
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[str]:
+    """Return one line per benchmark that got slower or hungrier than ``threshold`` allows."""
+    regressions = []
+    for key, base in baseline["results"].items():
+        now = current["results"].get(key)
+        if now is None:
+            continue
+        for metric in ("median_ms", "peak_kib"):
+            if not base[metric]:
+                continue
+            ratio = now[metric] / base[metric]
+            if ratio > 1 + threshold:
+                regressions.append(f"{key} {metric}: {base[metric]} -> {now[metric]} ({ratio - 1:+.0%})")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the suite and optionally store results as JSON")
+    run.add_argument("--output", type=Path)
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--quick", action="store_true", help="small projects only")
+    compare = commands.add_parser("compare", help="compare two result files, exit 1 on regressions")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run_benchmarks(QUICK_SCENARIOS if args.quick else SCENARIOS, args.repeat)
+        if args.output:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    regressions = compare_results(baseline, current, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import copy
+import json
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.services.publisher import BLOCK_TEMPLATE_SOURCES
+
+SEED_DEFINITIONS = Path(__file__).resolve().parents[1] / "app" / "seeds" / "block_definitions.json"
+LOCALE_CODES = ["ru", "en", "de", "fr", "es", "it", "kk", "uz", "tr", "zh"]
+
+HELPERS_MARKUP = """
+<div class="promo-card">
+  {{ helpers.text('eyebrow', tag='span', classes='promo-eyebrow') }}
+  {{ helpers.text('title', tag='h2') }}
+  {{ helpers.richtext('body') }}
+  {% for item in helpers.items('items') %}
+    <article class="promo-item">{{ helpers.item_text(item, 'title', tag='h3') }}{{ helpers.item_text(item, 'text') }}</article>
+  {% endfor %}
+  {{ helpers.asset('image_url', label='Promo') }}
+</div>
+"""
+
+
+def _definition(key: str, **extra) -> SimpleNamespace:
+    data = {
+        "id": None,
+        "key": key,
+        "name": key.replace("-", " ").title(),
+        "category": "content",
+        "version": "1.0.0",
+        "schema": [],
+        "default_config": {},
+        "template_markup": None,
+        "template_styles": None,
+        "updated_at": datetime(2025, 1, 1),
+    }
+    data.update(extra)
+    return SimpleNamespace(**data)
+
+
+def load_definitions() -> list[SimpleNamespace]:
+    """Seed catalog definitions plus one helpers-based custom template."""
+    seeds = json.loads(SEED_DEFINITIONS.read_text(encoding="utf-8"))
+    definitions = []
+    for index, seed in enumerate(seeds, start=1):
+        definitions.append(
+            _definition(
+                seed["key"],
+                id=index,
+                name=seed["name"],
+                category=seed["category"],
+                version=seed["version"],
+                schema=seed.get("schema") or [],
+                default_config=seed.get("default_config") or {},
+                template_markup=seed.get("template_markup"),
+                template_styles=seed.get("template_styles"),
+            )
+        )
+    definitions.append(
+        _definition(
+            "bench-promo",
+            id=len(definitions) + 1,
+            default_config={
+                "eyebrow": "Набор 2025",
+                "title": "Программа обучения",
+                "body": "<p>Курс для тех, кто переходит в разработку.</p>",
+                "items": [{"title": f"Модуль {n}", "text": "Практика и проекты"} for n in range(1, 6)],
+                "image_url": "https://placehold.co/640x360",
+            },
+            template_markup=HELPERS_MARKUP,
+            template_styles=".promo-card { display: grid; gap: 12px; }",
+        )
+    )
+    missing = set(BLOCK_TEMPLATE_SOURCES) - {definition.key for definition in definitions}
+    definitions.extend(_definition(key) for key in sorted(missing))
+    return definitions
+
+
+def _localized(config: dict, locale: str) -> dict:
+    translated = copy.deepcopy(config)
+    for key, value in translated.items():
+        if isinstance(value, str) and not value.startswith(("http", "#")):
+            translated[key] = f"[{locale}] {value}"
+    return translated
+
+
+def build_project(block_count: int, locale_count: int = 1, project_id: int = 1) -> SimpleNamespace:
+    """A Project-shaped object with ``block_count`` blocks cycling through every definition."""
+    definitions = load_definitions()
+    locales = LOCALE_CODES[: max(1, locale_count)]
+    blocks = []
+    for index in range(block_count):
+        definition = definitions[index % len(definitions)]
+        config = copy.deepcopy(definition.default_config)
+        if isinstance(config.get("headline"), str):
+            config["headline"] = f"{config['headline']} #{index}"
+        blocks.append(
+            SimpleNamespace(
+                id=index + 1,
+                order_index=index,
+                definition=definition,
+                config=config,
+                translations={locale: _localized(config, locale) for locale in locales[1:]},
+            )
+        )
+    return SimpleNamespace(
+        id=project_id,
+        title=f"Benchmark {block_count}x{len(locales)}",
+        slug=f"bench-{block_count}-{len(locales)}",
+        description="Synthetic benchmark project",
+        theme={"accent": "#2563eb"},
+        settings={"locales": {"default_locale": locales[0], "locales": locales}},
+        status="draft",
+        visibility="private",
+        blocks=blocks,
+    )
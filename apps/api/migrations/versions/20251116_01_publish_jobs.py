@@ -0,0 +1,44 @@
+"""background publish jobs
+
+Revision ID: 20251116_01
+Revises: 20251115_02
+Create Date: 2025-11-16 10:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20251116_01"
+down_revision = "20251115_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "publishjob",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="queued"),
+        sa.Column("stage", sa.String(length=50), nullable=True),
+        sa.Column("params", sa.JSON(), nullable=False),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("published_version_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["published_version_id"], ["publishedversion.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_publishjob_project_id", "publishjob", ["project_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_publishjob_project_id", table_name="publishjob")
+    op.drop_table("publishjob")
@@ -0,0 +1,48 @@
+"""definition republish jobs and the definition -> project index
+
+Revision ID: 20251117_01
+Revises: 20251116_01
+Create Date: 2025-11-17 10:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20251117_01"
+down_revision = "20251116_01"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # finding every project that uses a definition must not scan all block instances
+    op.create_index("ix_blockinstance_definition_id", "blockinstance", ["definition_id", "project_id"])
+    op.create_table(
+        "republishjob",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("definition_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="queued"),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("processed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("republished", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("unchanged", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("errors", sa.JSON(), nullable=False),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["definition_id"], ["blockdefinition.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_republishjob_definition_id", "republishjob", ["definition_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_republishjob_definition_id", table_name="republishjob")
+    op.drop_table("republishjob")
+    op.drop_index("ix_blockinstance_definition_id", table_name="blockinstance")
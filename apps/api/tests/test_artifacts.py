@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import gzip
+import os
+
+from app.services.artifacts import compress_variants, minify_html
+from app.services.custom_domains import (
+    RELEASES_DIR,
+    activate_domain_releases,
+    begin_domain_release,
+    finish_domain_release,
+    remove_domain_html,
+    rollback_domain_release,
+    write_release_page,
+)
+
+
+def release_pages(hostname: str, html: str, pages: dict[str, str], version: str):
+    staged = begin_domain_release(hostname)
+    write_release_page(staged, html)
+    for locale, page in pages.items():
+        write_release_page(staged, page, locale=locale)
+    return finish_domain_release(hostname, staged, version)
+
+
+def test_minify_html_keeps_preformatted_blocks() -> None:
+    html = "\n<html>\n    <body>\n\n      <p>Hello   world</p>\n<pre>  a\n    b</pre>\n    </body>\n</html>\n"
+    minified = minify_html(html)
+    assert minified == "<html>\n<body>\n<p>Hello   world</p>\n<pre>  a\n    b</pre>\n</body>\n</html>\n"
+
+
+def test_domain_release_writes_precompressed_variants(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr("app.services.custom_domains.settings.custom_domain_local_dir", str(tmp_path))
+    release = release_pages("promo.example.edu", "<p>Привет</p>", {}, "v1")
+    assert activate_domain_releases({"promo.example.edu": release}) == ["promo.example.edu"]
+
+    target = tmp_path / "promo.example.edu"
+    assert (target / "index.html").read_text(encoding="utf-8") == "<p>Привет</p>"
+    assert gzip.decompress((target / "index.html.gz").read_bytes()).decode("utf-8") == "<p>Привет</p>"
+    assert set(compress_variants("<p>Привет</p>".encode("utf-8"))) <= {"gzip", "br"}
+
+
+def test_domain_releases_swap_atomically_and_roll_back(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr("app.services.custom_domains.settings.custom_domain_local_dir", str(tmp_path))
+    monkeypatch.setattr("app.services.custom_domains.settings.custom_domain_keep_releases", 2)
+    # a host published before releases existed is a plain directory
+    legacy = tmp_path / "promo.example.edu"
+    legacy.mkdir()
+    (legacy / "index.html").write_text("<p>old</p>", encoding="utf-8")
+
+    for version in ("v1", "v2", "v3"):
+        releases = {
+            host: release_pages(host, f"<p>{version}</p>", {"en": f"<p>{version} en</p>"}, version)
+            for host in ("promo.example.edu", "other.example.edu")
+        }
+        # both hosts are synced together, then each switches with one link swap
+        assert sorted(activate_domain_releases(releases)) == ["other.example.edu", "promo.example.edu"]
+        os.utime(tmp_path / RELEASES_DIR / "promo.example.edu" / version, ns=(0, int(version[1:]) * 10**9))
+
+    link = tmp_path / "promo.example.edu"
+    assert link.is_symlink()
+    assert not os.path.isabs(os.readlink(link))
+    assert (link / "index.html").read_text(encoding="utf-8") == "<p>v3</p>"
+    assert (link / "en" / "index.html").read_text(encoding="utf-8") == "<p>v3 en</p>"
+    assert (tmp_path / "other.example.edu" / "index.html").read_text(encoding="utf-8") == "<p>v3</p>"
+    # the live release and one to roll back to; the legacy directory is gone
+    assert sorted(os.listdir(tmp_path / RELEASES_DIR / "promo.example.edu")) == ["v2", "v3"]
+
+    assert rollback_domain_release("promo.example.edu") == "v2"
+    assert (link / "index.html").read_text(encoding="utf-8") == "<p>v2</p>"
+
+    remove_domain_html("promo.example.edu")
+    assert not link.exists() and not link.is_symlink()
+    assert not (tmp_path / RELEASES_DIR / "promo.example.edu").exists()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from benchmarks.publisher_bench import compare_results
+from benchmarks.synthetic import build_project
+from app.services.publisher import BLOCK_TEMPLATE_SOURCES, render_project_locales
+
+
+def test_synthetic_project_covers_builtin_and_custom_blocks() -> None:
+    project = build_project(30, locale_count=3)
+    keys = {block.definition.key for block in project.blocks}
+    assert set(BLOCK_TEMPLATE_SOURCES) <= keys
+    assert any(block.definition.template_markup for block in project.blocks)
+
+    pages = render_project_locales(project, project.settings["locales"]["locales"])
+    assert set(pages) == {"ru", "en", "de"}
+    assert "[en]" in pages["en"] and "[en]" not in pages["ru"]
+    assert "Template error" not in pages["ru"]
+
+
+def test_compare_results_flags_regressions_above_threshold() -> None:
+    baseline = {"results": {"render_cold[10x1]": {"median_ms": 1.0, "peak_kib": 100.0}}}
+    current = {"results": {"render_cold[10x1]": {"median_ms": 1.1, "peak_kib": 150.0}}}
+    regressions = compare_results(baseline, current, threshold=0.15)
+    assert regressions == ["render_cold[10x1] peak_kib: 100.0 -> 150.0 (+50%)"]
+    assert compare_results(baseline, baseline, threshold=0.15) == []
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import httpx
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from app.models.block_definition import BlockDefinition
+from app.models.block_instance import BlockInstance
+from app.models.project import Project
+from app.models.project_domain import ProjectDomain
+from app.services.publishing import latest_published_version, publish_project
+from app.services.republish import run_republish_job
 
 
 def token_for(client: TestClient, email: str, password: str) -> dict[str, str]:
@@ -51,3 +57,165 @@ def test_admin_crud_block_definition(
     response = client.delete(f"/api/catalog/blocks/{block_id}", headers=headers)
     assert response.status_code == 204
     assert db_session.query(BlockDefinition).count() == 0
+
+
+def test_render_cache_stats_admin_only(client: TestClient, user, admin_user) -> None:  # type: ignore[override]
+    user_headers = token_for(client, "test@example.com", "secret123")
+    assert client.get("/api/catalog/render-cache", headers=user_headers).status_code == 403
+
+    admin_headers = token_for(client, "admin@example.com", "admin123")
+    response = client.get("/api/catalog/render-cache", headers=admin_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert {"hits", "misses", "evictions", "bytes"} <= set(body["templates"])
+    assert "entries" in body["blocks"]
+
+    storage = client.get("/api/catalog/storage", headers=admin_headers)
+    assert storage.status_code == 200
+    assert "operations" in storage.json()
+
+
+class FakePurgeResponse:
+    content = b"{}"
+
+    def __init__(self, evicted: int) -> None:
+        self.evicted = evicted
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict[str, int]:
+        return {"evicted": self.evicted}
+
+
+def test_admin_purge_by_block_definition_fans_out(
+    monkeypatch, client: TestClient, user, admin_user, db_session: Session  # type: ignore[override]
+) -> None:
+    definition = BlockDefinition(key="promo", name="Promo", category="content", version="1.0.0", schema=[], default_config={})
+    db_session.add(definition)
+    db_session.commit()
+    for title, status in (("Live promo", "published"), ("Draft promo", "draft")):
+        project = Project(owner_id=user.id, title=title, slug=title.lower().replace(" ", "-"), theme={}, settings={}, status=status)
+        db_session.add(project)
+        db_session.flush()
+        db_session.add(BlockInstance(project_id=project.id, definition_id=definition.id, config={}))
+        if status == "published":
+            db_session.add(ProjectDomain(project_id=project.id, hostname="promo.example.edu", status="verified", verification_token="t"))
+    db_session.commit()
+
+    calls: list[tuple[str, list[str]]] = []
+
+    def fake_post(url: str, json: dict, headers: dict, timeout: float):
+        calls.append((url, json["hosts"]))
+        if "broken" in url:
+            raise httpx.ConnectError("connection refused")
+        return FakePurgeResponse(evicted=3)
+
+    monkeypatch.setattr("app.services.purge.settings.cache_purge_urls", "http://edge-a/_edge/purge, http://broken/_edge/purge")
+    monkeypatch.setattr("app.services.purge.httpx.post", fake_post)
+
+    user_headers = token_for(client, "test@example.com", "secret123")
+    assert client.post("/api/catalog/purge", json={"hostname": "promo.example.edu"}, headers=user_headers).status_code == 403
+
+    admin_headers = token_for(client, "admin@example.com", "admin123")
+    assert client.post("/api/catalog/purge", json={}, headers=admin_headers).status_code == 400
+    response = client.post("/api/catalog/purge", json={"block_definition_id": definition.id}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["hostnames"] == ["live-promo.pages.renderly.local", "promo.example.edu"]
+    assert report["evicted"] == 3
+    assert report["targets"]["http://edge-a/_edge/purge"]["status"] == "ok"
+    assert report["targets"]["http://broken/_edge/purge"]["status"] == "failed"
+    assert {url for url, _ in calls} == {"http://edge-a/_edge/purge", "http://broken/_edge/purge"}
+
+
+def test_template_change_republishes_affected_projects_in_batches(
+    monkeypatch, client: TestClient, user, admin_user, db_session: Session  # type: ignore[override]
+) -> None:
+    definition = BlockDefinition(
+        key="banner",
+        name="Banner",
+        category="content",
+        version="1.0.0",
+        schema=[],
+        default_config={"title": "Sale"},
+        template_markup="<section>{{ helpers.value('title') }}</section>",
+    )
+    other = BlockDefinition(key="plain", name="Plain", category="content", version="1.0.0", schema=[], default_config={})
+    db_session.add_all([definition, other])
+    db_session.commit()
+
+    uploads: dict[str, str] = {}
+    broken: set[str] = set()
+
+    def fake_upload(path: str, html: str, presign: bool = True, **kwargs):
+        if path.split("/")[0] in broken:
+            raise RuntimeError("CDN upload failed")
+        uploads[path] = html
+        return path, f"https://cdn.local/{path}" if presign else None
+
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+    projects: dict[str, Project] = {}
+    for slug, publish, used in (
+        ("shop-a", True, definition),
+        ("shop-b", True, definition),
+        ("broken-shop", True, definition),
+        ("draft-shop", False, definition),
+        ("unrelated", True, other),
+    ):
+        project = Project(owner_id=user.id, title=slug, slug=slug, theme={}, settings={}, status="draft")
+        db_session.add(project)
+        db_session.flush()
+        db_session.add(BlockInstance(project_id=project.id, definition_id=used.id, config={}))
+        db_session.commit()
+        db_session.refresh(project)
+        if publish:
+            publish_project(db_session, project, user_id=user.id, lang="en")
+        projects[slug] = project
+    # an unpublished edit must stay out of the republished pages
+    draft_block = projects["shop-a"].blocks[0]
+    draft_block.config = {"title": "Draft title"}
+    db_session.add(draft_block)
+    db_session.commit()
+    broken.add("broken-shop")
+    uploads.clear()
+
+    queued: list[int] = []
+    monkeypatch.setattr("app.services.republish.republish_queue.enqueue", lambda func, job_id, **kwargs: queued.append(job_id))
+    headers = token_for(client, "admin@example.com", "admin123")
+
+    renamed = client.put(f"/api/catalog/blocks/{definition.id}", json={"name": "Banner v2"}, headers=headers)
+    assert renamed.status_code == 200
+    assert "location" not in renamed.headers and queued == []
+
+    updated = client.put(
+        f"/api/catalog/blocks/{definition.id}",
+        json={"template_markup": "<section class='v2'>{{ helpers.value('title') }}</section>"},
+        headers=headers,
+    )
+    assert updated.status_code == 200, updated.text
+    location = updated.headers["location"]
+    assert len(queued) == 1
+    # a second edit before the worker starts joins the queued job
+    again = client.post(f"/api/catalog/blocks/{definition.id}/republish", headers=headers)
+    assert again.status_code == 202
+    assert again.headers["location"] == location and len(queued) == 1
+
+    monkeypatch.setattr("app.services.republish.settings.republish_max_workers", 1)
+    monkeypatch.setattr("app.services.republish.settings.republish_batch_size", 2)
+    monkeypatch.setattr("app.services.republish.settings.republish_batch_pause", 0)
+    run_republish_job(queued[0], db=db_session)
+
+    status = client.get(location, headers=headers).json()
+    assert status["status"] == "finished"
+    assert (status["total"], status["processed"], status["republished"], status["failed"]) == (3, 3, 2, 1)
+    assert list(status["errors"].values()) == ["CDN upload failed"]
+    versioned = {path: html for path, html in uploads.items() if not path.startswith("domains/")}
+    assert {path.split("/")[0] for path in versioned} == {"shop-a", "shop-b"}
+    assert all("v2" in html and "Sale" in html for html in versioned.values())
+    assert all("Draft title" not in html for html in versioned.values())
+    live = latest_published_version(db_session, projects["shop-a"].id)
+    assert live.meta["lang"] == "en"
+    assert live.meta["snapshot"]["blocks"][0]["config"] == {}
+    db_session.refresh(draft_block)
+    assert draft_block.config == {"title": "Draft title"}
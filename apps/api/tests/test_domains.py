@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import json
+
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from app.models.project import Project
 from app.models.project_domain import ProjectDomain
+from app.models.published_version import PublishedVersion
 from app.models.block_definition import BlockDefinition
 from .test_projects import auth_headers
 
@@ -67,11 +70,11 @@ def test_domain_lifecycle(monkeypatch, client: TestClient, user, db_session: Ses
 
     calls: list[str] = []
 
-    def fake_upload(path: str, html: str):
+    def fake_upload(path: str, html: str, **kwargs):
         calls.append(path)
         return path, f"https://cdn.local/{path}"
 
-    monkeypatch.setattr("app.api.routes.publish.upload_html", fake_upload)
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
 
     response = client.post(
         f"/api/projects/{project.id}/publish",
@@ -81,3 +84,101 @@ def test_domain_lifecycle(monkeypatch, client: TestClient, user, db_session: Ses
     publication = response.json()["publication"]
     assert publication["custom_domain_url"] == "https://promo.example.edu/"
     assert any(path.startswith("domains/promo.example.edu") for path in calls)
+
+
+def test_publish_fans_out_to_domains_and_records_results(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero(db_session)
+    project = create_project(db_session, user)
+    for hostname in ("good.example.edu", "broken.example.edu"):
+        db_session.add(ProjectDomain(project_id=project.id, hostname=hostname, status="verified", verification_token=hostname))
+    db_session.commit()
+    headers = auth_headers(client, "test@example.com", "secret123")
+
+    def fake_upload(path: str, html: str, presign: bool = True, **kwargs):
+        if path.startswith("domains/broken.example.edu/"):
+            raise RuntimeError("CDN upload failed: timeout")
+        return path, f"https://cdn.local/{path}" if presign else None
+
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+
+    response = client.post(f"/api/projects/{project.id}/publish", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["publication"]["custom_domain_url"] == "https://good.example.edu/"
+
+    published = db_session.query(PublishedVersion).filter_by(project_id=project.id).one()
+    results = published.meta["domain_results"]
+    assert results["good.example.edu"]["status"] == "ok"
+    assert results["broken.example.edu"] == {
+        "status": "failed",
+        "ms": results["broken.example.edu"]["ms"],
+        "error": "CDN upload failed: timeout",
+    }
+    assert "broken.example.edu" not in published.meta["domains"]
+
+
+class RecordingPipeline:
+    def __init__(self, calls: list[tuple]) -> None:
+        self.calls = calls
+
+    def set(self, key: str, value: str) -> None:
+        self.calls.append(("set", key, json.loads(value)))
+
+    def delete(self, key: str) -> None:
+        self.calls.append(("delete", key))
+
+    def publish(self, channel: str, message: str) -> None:
+        self.calls.append(("publish", channel, message))
+
+    def execute(self) -> None:
+        return None
+
+
+def test_publish_and_unpublish_update_routing_table_and_purge(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero(db_session)
+    project = create_project(db_session, user)
+    db_session.add(ProjectDomain(project_id=project.id, hostname="promo.example.edu", status="verified", verification_token="t"))
+    db_session.commit()
+    headers = auth_headers(client, "test@example.com", "secret123")
+
+    calls: list[tuple] = []
+    monkeypatch.setattr("app.services.routing.settings.routing_table_enabled", True)
+    monkeypatch.setattr("app.services.routing.redis_conn.pipeline", lambda transaction=False: RecordingPipeline(calls))
+    monkeypatch.setattr(
+        "app.services.publishing.upload_html",
+        lambda path, html, presign=True, **kwargs: (path, f"https://cdn.local/{path}" if presign else None),
+    )
+    monkeypatch.setattr("app.services.publishing.delete_html", lambda path: None)
+    purged: list[list[str]] = []
+    monkeypatch.setattr(
+        "app.services.publishing.purge_hostnames",
+        lambda hostnames: purged.append(sorted(hostnames)) or {"hostnames": sorted(hostnames), "evicted": 0, "targets": {}},
+    )
+
+    response = client.post(f"/api/projects/{project.id}/publish", headers=headers)
+    assert response.status_code == 200, response.text
+    published = db_session.query(PublishedVersion).filter_by(project_id=project.id).one()
+
+    written = {call[1]: call[2] for call in calls if call[0] == "set"}
+    route = written["renderly:route:promo.example.edu"]
+    assert route["version"] == published.version
+    assert route["artifact"] == published.object_path
+    assert ("publish", "renderly:routes", "promo.example.edu") in calls
+
+    calls.clear()
+    deleted = client.delete(f"/api/projects/{project.id}/published/latest", headers=headers)
+    assert deleted.status_code == 204, deleted.text
+    assert ("delete", "renderly:route:promo.example.edu") in calls
+    assert ("publish", "renderly:routes", "promo.example.edu") in calls
+    # both the publish and the unpublish evicted the cached pages
+    assert len(purged) == 2
+    assert all("promo.example.edu" in hosts for hosts in purged)
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import json
+
+import pytest
 from fastapi.testclient import TestClient
 
+from app.api.routes import publish as publish_routes
 from app.models.block_definition import BlockDefinition
 from app.models.published_version import PublishedVersion
 from app.models.audit_event import AuditEvent
+from app.services.publishing import run_publish_job
+from app.services.slugify import slugify
 from sqlalchemy.orm import Session
 
+from .conftest import TestingSessionLocal
+
 
 def auth_headers(client: TestClient, email: str, password: str) -> dict[str, str]:
     response = client.post(
@@ -120,6 +128,53 @@ def test_preview_endpoint_no_side_effects(
     assert db_session.query(PublishedVersion).count() == 0
 
 
+def test_preview_returns_only_changed_block_fragments(
+    client: TestClient, user, db_session: Session
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    created = client.post(
+        "/api/projects",
+        json={"title": "Patchable", "slug": "patchable", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    block_ids = []
+    for index, headline in enumerate(["First", "Second"]):
+        block = client.post(
+            f"/api/projects/{project_id}/blocks",
+            json={"definition_key": "hero", "order_index": index, "config": {"headline": headline}},
+            headers=headers,
+        ).json()
+        block_ids.append(block["id"])
+
+    response = client.post(
+        f"/api/projects/{project_id}/preview",
+        json={
+            "blocks": [
+                {"id": block_ids[1], "definition_key": "hero", "order_index": 1, "config": {"headline": "Edited"}}
+            ],
+            "changed_block_ids": [block_ids[1], 9999],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert "html" not in body
+    assert [fragment["id"] for fragment in body["blocks"]] == [block_ids[1]]
+    fragment = body["blocks"][0]["html"]
+    assert f'data-block-section="{block_ids[1]}"' in fragment
+    assert "Edited" in fragment and "<html" not in fragment
+    assert body["missing"] == [9999]
+
+    invalid = client.post(
+        f"/api/projects/{project_id}/preview",
+        json={"changed_block_ids": "all"},
+        headers=headers,
+    )
+    assert invalid.status_code == 400
+
+
 def test_member_can_view_and_edit_project(
     client: TestClient,
     user,
@@ -200,10 +255,10 @@ def test_publish_creates_audit_event(
 ) -> None:  # type: ignore[override]
     headers = auth_headers(client, "test@example.com", "secret123")
 
-    def fake_upload(object_path: str, html: str):
+    def fake_upload(object_path: str, html: str, **kwargs):
         return object_path, f"https://cdn.local/{object_path}"
 
-    monkeypatch.setattr("app.api.routes.publish.upload_html", fake_upload)
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
 
     created = client.post(
         "/api/projects",
@@ -233,6 +288,54 @@ def test_publish_creates_audit_event(
     assert any(item["action"] == "project.publish" for item in body["items"])
 
 
+def test_async_publish_returns_job_and_reports_progress(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    headers = auth_headers(client, "test@example.com", "secret123")
+    queued: list[int] = []
+
+    def fake_upload(object_path: str, html: str, **kwargs):
+        return object_path, f"https://cdn.local/{object_path}"
+
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+    monkeypatch.setattr("app.api.routes.publish.enqueue_publish", queued.append)
+
+    created = client.post(
+        "/api/projects",
+        json={"title": "Async", "slug": "async", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+
+    accepted = client.post(f"/api/projects/{project_id}/publish?async=true", headers=headers)
+    assert accepted.status_code == 202, accepted.text
+    job = accepted.json()
+    assert job["status"] == "queued"
+    assert accepted.headers["location"].endswith(f"/projects/{project_id}/publish/jobs/{job['id']}")
+    assert queued == [job["id"]]
+
+    # a second click while the job is pending joins it
+    again = client.post(f"/api/projects/{project_id}/publish?async=true", headers=headers)
+    assert again.json()["id"] == job["id"]
+    assert queued == [job["id"]]
+
+    run_publish_job(job["id"], db=db_session)
+
+    status = client.get(f"/api/projects/{project_id}/publish/jobs/{job['id']}", headers=headers)
+    assert status.status_code == 200
+    body = status.json()
+    assert body["status"] == "finished"
+    assert body["finished_at"]
+    assert body["publication"]["cdn_url"].startswith("https://cdn.local/async/")
+    assert db_session.query(PublishedVersion).filter_by(project_id=project_id).count() == 1
+
+    missing = client.get(f"/api/projects/{project_id}/publish/jobs/9999", headers=headers)
+    assert missing.status_code == 404
+
+
 def test_publish_uses_slug_subdomain(
     monkeypatch,
     client: TestClient,
@@ -241,11 +344,11 @@ def test_publish_uses_slug_subdomain(
     headers = auth_headers(client, "test@example.com", "secret123")
     calls: list[str] = []
 
-    def fake_upload(object_path: str, html: str):
+    def fake_upload(object_path: str, html: str, **kwargs):
         calls.append(object_path)
         return object_path, f"https://cdn.local/{object_path}"
 
-    monkeypatch.setattr("app.api.routes.publish.upload_html", fake_upload)
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
     monkeypatch.setattr("app.api.routes.publish.settings.project_subdomain_root", "pages.renderly.local")
     monkeypatch.setattr("app.api.routes.publish.settings.project_subdomain_scheme", "https")
 
@@ -278,14 +381,14 @@ def test_delete_latest_publication(
     headers = auth_headers(client, "test@example.com", "secret123")
     deleted: list[str] = []
 
-    def fake_upload(object_path: str, html: str):
+    def fake_upload(object_path: str, html: str, **kwargs):
         return object_path, f"https://cdn.local/{object_path}"
 
     def fake_delete(object_path: str):
         deleted.append(object_path)
 
-    monkeypatch.setattr("app.api.routes.publish.upload_html", fake_upload)
-    monkeypatch.setattr("app.api.routes.publish.delete_html", fake_delete)
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+    monkeypatch.setattr("app.services.publishing.delete_html", fake_delete)
     monkeypatch.setattr(
         "app.api.routes.publish.settings.project_subdomain_root",
         "pages.renderly.local",
@@ -463,3 +566,320 @@ def ensure_hero_definition(db_session: Session) -> BlockDefinition:
     db_session.commit()
     db_session.refresh(definition)
     return definition
+
+
+def test_raw_html_preview_and_export_stream(
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    created = client.post(
+        "/api/projects",
+        json={"title": "Stream", "slug": "stream", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    client.post(
+        f"/api/projects/{project_id}/blocks",
+        json={"definition_key": "hero", "order_index": 0, "config": {"headline": "Streamed"}},
+        headers=headers,
+    )
+
+    preview = client.post(
+        f"/api/projects/{project_id}/preview/html",
+        json={"project": {"title": "Raw preview"}},
+        headers=headers,
+    )
+    assert preview.status_code == 200
+    assert preview.headers["content-type"].startswith("text/html")
+    assert "Raw preview" in preview.text
+    assert "Streamed" in preview.text
+
+    export = client.get(f"/api/projects/{project_id}/export/html", headers=headers)
+    assert export.status_code == 200
+    assert "attachment" in export.headers["content-disposition"]
+    assert export.text.strip().startswith("<!doctype html>")
+    assert "Streamed" in export.text
+
+
+def test_admin_batch_render_streams_ndjson(
+    client: TestClient,
+    user,
+    admin_user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    project_ids = []
+    for title in ("Batch one", "Batch two"):
+        created = client.post(
+            "/api/projects",
+            json={"title": title, "slug": slugify(title), "description": "", "theme": {}, "settings": {}},
+            headers=headers,
+        )
+        project_id = created.json()["id"]
+        client.post(
+            f"/api/projects/{project_id}/blocks",
+            json={"definition_key": "hero", "order_index": 0, "config": {"headline": f"{title} hero"}},
+            headers=headers,
+        )
+        project_ids.append(project_id)
+
+    assert client.post("/api/projects/render/batch", json={"project_ids": project_ids}, headers=headers).status_code == 403
+
+    admin_headers = auth_headers(client, "admin@example.com", "admin123")
+    response = client.post(
+        "/api/projects/render/batch",
+        json={"project_ids": [*project_ids, 9999]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    records = {record["project_id"]: record for record in map(json.loads, response.text.splitlines())}
+    assert records[9999] == {"project_id": 9999, "error": "Project not found"}
+    assert "Batch one hero" in records[project_ids[0]]["html"]
+    assert "Batch two hero" in records[project_ids[1]]["html"]
+
+
+def test_render_timings_exposed_via_server_timing(
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    created = client.post(
+        "/api/projects",
+        json={"title": "Timed", "slug": "timed", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    block = client.post(
+        f"/api/projects/{project_id}/blocks",
+        json={"definition_key": "hero", "order_index": 0, "config": {"headline": "Timed"}},
+        headers=headers,
+    ).json()
+
+    plain = client.post(f"/api/projects/{project_id}/preview", json={}, headers=headers)
+    assert "server-timing" not in plain.headers
+
+    timed = client.post(f"/api/projects/{project_id}/preview?timings=true", json={}, headers=headers)
+    assert timed.status_code == 200
+    server_timing = timed.headers["server-timing"]
+    for metric in ("header;dur=", "footer;dur=", "base;dur=", f"block-{block['id']}-hero;dur=", "total;dur="):
+        assert metric in server_timing
+
+    export = client.get(f"/api/projects/{project_id}/export/html?timings=true", headers=headers)
+    assert "hero;dur=" in export.headers["server-timing"]
+    assert "Timed" in export.text
+
+
+def test_publish_all_locales_records_single_version(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    uploads: dict[str, str] = {}
+
+    def fake_upload(object_path: str, html: str, **kwargs):
+        uploads[object_path] = html
+        return object_path, f"https://cdn.local/{object_path}"
+
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+    monkeypatch.setattr("app.api.routes.publish.settings.project_subdomain_root", "pages.renderly.local")
+
+    created = client.post(
+        "/api/projects",
+        json={"title": "Polyglot", "slug": "polyglot", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    block = client.post(
+        f"/api/projects/{project_id}/blocks",
+        json={
+            "definition_key": "hero",
+            "order_index": 0,
+            "config": {"headline": "Privet"},
+            "translations": {"en": {"headline": "Hello"}, "de": {"headline": "Hallo"}},
+        },
+        headers=headers,
+    )
+    assert block.status_code == 200
+    client.put(
+        f"/api/projects/{project_id}/locales",
+        json={"default_locale": "ru", "locales": ["ru", "en", "de"]},
+        headers=headers,
+    )
+
+    response = client.post(f"/api/projects/{project_id}/publish?all_locales=true", headers=headers)
+    assert response.status_code == 200, response.text
+    publication = response.json()["publication"]
+    assert set(publication["locales"]) == {"ru", "en", "de"}
+    assert "Hallo" in uploads["domains/polyglot.pages.renderly.local/de/index.html"]
+    assert "Hello" in uploads["domains/polyglot.pages.renderly.local/en/index.html"]
+    assert "Privet" in uploads["domains/polyglot.pages.renderly.local/index.html"]
+    assert "Hello" in uploads[publication["locales"]["en"].removeprefix("https://cdn.local/")]
+    assert db_session.query(PublishedVersion).count() == 1
+
+
+def test_republishing_identical_content_skips_uploads(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    uploads: list[tuple[str, str | None]] = []
+
+    def fake_upload(object_path: str, html: str, **kwargs):
+        uploads.append((object_path, kwargs.get("cache_control")))
+        return object_path, f"https://cdn.local/{object_path}"
+
+    monkeypatch.setattr("app.services.publishing.upload_html", fake_upload)
+    monkeypatch.setattr("app.api.routes.publish.settings.project_subdomain_root", "pages.renderly.local")
+
+    created = client.post(
+        "/api/projects",
+        json={"title": "Stable", "slug": "stable", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    block = client.post(
+        f"/api/projects/{project_id}/blocks",
+        json={"definition_key": "hero", "order_index": 0, "config": {"headline": "Same"}},
+        headers=headers,
+    ).json()
+
+    first = client.post(f"/api/projects/{project_id}/publish", headers=headers)
+    assert first.status_code == 200, first.text
+    version = first.json()["publication"]["version"]
+    assert (f"stable/{version}.html", "public, max-age=31536000, immutable") in uploads
+    assert ("domains/stable.pages.renderly.local/index.html", None) in uploads
+
+    uploads.clear()
+    second = client.post(f"/api/projects/{project_id}/publish", headers=headers)
+    assert second.status_code == 200, second.text
+    assert second.json()["publication"]["version"] == version
+    assert uploads == []
+    assert db_session.query(PublishedVersion).count() == 1
+    events = db_session.query(AuditEvent).filter(AuditEvent.action == "project.publish").all()
+    assert events[-1].payload["deduplicated"] is True
+
+    client.put(
+        f"/api/projects/{project_id}/blocks/{block['id']}",
+        json={"config": {"headline": "Changed"}},
+        headers=headers,
+    )
+    third = client.post(f"/api/projects/{project_id}/publish", headers=headers)
+    assert third.json()["publication"]["version"] != version
+    assert uploads
+    assert db_session.query(PublishedVersion).count() == 2
+
+    # unpublish the changed version and go back to the first content: the older
+    # row has the same hash but nothing is live any more, so it must be uploaded again
+    deleted: list[str] = []
+    monkeypatch.setattr("app.services.publishing.delete_html", deleted.append)
+    assert client.delete(f"/api/projects/{project_id}/published/latest", headers=headers).status_code == 204
+    client.put(
+        f"/api/projects/{project_id}/blocks/{block['id']}",
+        json={"config": {"headline": "Same"}},
+        headers=headers,
+    )
+    uploads.clear()
+    fourth = client.post(f"/api/projects/{project_id}/publish", headers=headers)
+    assert fourth.status_code == 200, fourth.text
+    assert fourth.json()["publication"]["version"] == version
+    assert ("domains/stable.pages.renderly.local/index.html", None) in uploads
+    assert fourth.json()["project"]["status"] == "published"
+
+    # the first row still points at the same content-addressed object
+    deleted.clear()
+    assert client.delete(f"/api/projects/{project_id}/published/latest", headers=headers).status_code == 204
+    assert f"stable/{version}.html" not in deleted
+    assert "domains/stable.pages.renderly.local/index.html" in deleted
+
+
+def test_preview_websocket_session_pushes_block_fragments(
+    monkeypatch,
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    monkeypatch.setattr("app.api.routes.publish.SessionLocal", TestingSessionLocal)
+    ensure_hero_definition(db_session)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    token = headers["Authorization"].removeprefix("Bearer ")
+    created = client.post(
+        "/api/projects",
+        json={"title": "Live", "slug": "live", "description": "", "theme": {}, "settings": {}},
+        headers=headers,
+    )
+    project_id = created.json()["id"]
+    block = client.post(
+        f"/api/projects/{project_id}/blocks",
+        json={"definition_key": "hero", "order_index": 0, "config": {"headline": "Initial"}},
+        headers=headers,
+    ).json()
+
+    with client.websocket_connect(f"/api/projects/{project_id}/preview/ws?token={token}") as socket:
+        document = socket.receive_json()
+        assert document["type"] == "document"
+        assert "Initial" in document["html"]
+
+        socket.send_json({"op": "update_block", "seq": 1, "id": block["id"], "patch": {"headline": "Typed"}})
+        fragments = socket.receive_json()
+        assert fragments["type"] == "fragments"
+        assert fragments["seq"] == 1
+        assert [item["id"] for item in fragments["blocks"]] == [block["id"]]
+        assert "Typed" in fragments["blocks"][0]["html"]
+        assert "<html" not in fragments["blocks"][0]["html"]
+
+        socket.send_json({"op": "update_block", "seq": 2, "id": 12345, "patch": {}})
+        error = socket.receive_json()
+        assert error == {"type": "error", "seq": 2, "detail": "Unknown block: 12345"}
+
+        socket.send_json({"op": "move_block", "seq": 3, "id": block["id"], "order_index": "first"})
+        error = socket.receive_json()
+        assert error == {"type": "error", "seq": 3, "detail": "Invalid order_index: 'first'"}
+
+        # a failing render is reported and the session keeps rendering later edits
+        real_render = publish_routes.render_preview_request
+        failures = iter([RuntimeError("renderer crashed")])
+
+        def flaky_render(request):
+            failure = next(failures, None)
+            if failure is not None:
+                raise failure
+            return real_render(request)
+
+        monkeypatch.setattr(publish_routes, "render_preview_request", flaky_render)
+        socket.send_json({"op": "update_block", "seq": 4, "id": block["id"], "patch": {"headline": "Boom"}})
+        assert socket.receive_json() == {"type": "error", "seq": 4, "detail": "Render failed: renderer crashed"}
+        socket.send_json({"op": "update_block", "seq": 5, "id": block["id"], "patch": {"headline": "Recovered"}})
+        recovered = socket.receive_json()
+        assert recovered["seq"] == 5
+        assert "Recovered" in recovered["blocks"][0]["html"]
+
+        socket.send_json({"op": "remove_block", "seq": 6, "id": block["id"]})
+        removed = socket.receive_json()
+        assert removed["removed"] == [block["id"]]
+        assert removed["blocks"] == []
+
+    # the session edits never touch the stored project
+    detail = client.get(f"/api/projects/{project_id}", headers=headers).json()
+    assert detail["blocks"][0]["config"]["headline"] == "Initial"
+
+
+def test_preview_websocket_rejects_missing_token(monkeypatch, client: TestClient, user) -> None:  # type: ignore[override]
+    from starlette.websockets import WebSocketDisconnect
+
+    monkeypatch.setattr("app.api.routes.publish.SessionLocal", TestingSessionLocal)
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/projects/1/preview/ws") as socket:
+            socket.receive_json()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from app.services import publisher
+from app.services.render_cache import LRUCache
+
+
+def make_definition(key: str = "hero", **extra) -> SimpleNamespace:
+    data = {
+        "id": None,
+        "key": key,
+        "version": "1.0.0",
+        "default_config": {},
+        "template_markup": None,
+        "template_styles": None,
+        "updated_at": None,
+    }
+    data.update(extra)
+    return SimpleNamespace(**data)
+
+
+def make_project(blocks: list[SimpleNamespace]) -> SimpleNamespace:
+    return SimpleNamespace(title="Bench", theme={}, settings={}, blocks=blocks)
+
+
+def make_block(block_id: int, definition: SimpleNamespace, config: dict) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=block_id,
+        order_index=block_id,
+        definition=definition,
+        config=config,
+        translations={},
+    )
+
+
+def test_block_cache_rerenders_only_changed_blocks(monkeypatch) -> None:
+    cache = LRUCache(1024 * 1024, sizeof=lambda rendered: rendered.size)
+    monkeypatch.setattr(publisher, "BLOCK_RENDER_CACHE", cache)
+    hero = make_definition()
+    blocks = [make_block(index, hero, {"headline": f"Block {index}"}) for index in range(1, 11)]
+    project = make_project(blocks)
+
+    first = publisher.render_project_html(project)
+    assert cache.stats()["misses"] == 10
+
+    blocks[3].config = {"headline": "Changed"}
+    second = publisher.render_project_html(project)
+    stats = cache.stats()
+    assert stats["misses"] == 11
+    assert stats["hits"] == 9
+    assert "Changed" in second
+    assert first.replace("Block 4", "Changed") == second
+
+
+def test_block_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.set("c", "cccc")
+    assert "b" not in cache
+    assert cache.get("a") == "aaaa"
+    assert cache.stats()["evictions"] == 1
+    assert cache.bytes == 8
+
+
+def test_builtin_templates_share_precompiled_environment() -> None:
+    templates = [publisher.BASE_TEMPLATE, publisher.HEADER_TEMPLATE, publisher.FOOTER_TEMPLATE]
+    templates.extend(publisher.BLOCK_TEMPLATES.values())
+    assert all(template.environment is publisher.TEMPLATE_ENV for template in templates)
+    assert publisher.TEMPLATE_ENV.get_template("blocks/hero.html") is publisher.BLOCK_TEMPLATES["hero"]
+
+
+def test_stream_project_html_yields_one_chunk_per_block() -> None:
+    hero = make_definition()
+    custom = make_definition(
+        "promo",
+        template_markup="{{ helpers.text('title', tag='h2') }}",
+        template_styles=".promo { color: red; }",
+    )
+    blocks = [make_block(1, hero, {"headline": "One"}), make_block(2, custom, {"title": "Two"})]
+    project = make_project(blocks)
+
+    chunks = list(publisher.stream_project_html(project))
+
+    assert len(chunks) == len(blocks) + 6
+    assert "<!doctype html>" in chunks[0]
+    assert 'data-block-style="promo"' in chunks[2]
+    assert "".join(chunks) == publisher.render_project_html(project)
+
+
+def test_compiled_template_cache_keys_on_definition_revision(monkeypatch) -> None:
+    from datetime import datetime
+
+    cache = LRUCache(1024, sizeof=lambda entry: entry[1])
+    monkeypatch.setattr(publisher, "CUSTOM_TEMPLATE_CACHE", cache)
+    definition = make_definition(
+        "promo",
+        id=7,
+        updated_at=datetime(2025, 1, 1),
+        template_markup="<p>{{ payload.title }}</p>",
+    )
+
+    first = publisher._get_compiled_template(definition, definition.template_markup)
+    assert publisher._get_compiled_template(definition, definition.template_markup) is first
+    assert cache.stats()["hits"] == 1
+
+    definition.template_markup = "<h1>{{ payload.title }}</h1>"
+    definition.updated_at = datetime(2025, 1, 2)
+    second = publisher._get_compiled_template(definition, definition.template_markup)
+    assert second is not first
+    assert second.render(payload={"title": "x"}) == "<h1>x</h1>"
+    assert cache.stats()["bytes"] == len("<p>{{ payload.title }}</p>") + len(definition.template_markup)
+
+
+def test_page_stylesheet_only_includes_used_block_groups() -> None:
+    faq = make_definition("faq")
+    custom = make_definition("promo", template_markup='<div class="cta">{{ helpers.asset("cover") }}</div>')
+
+    faq_only = publisher.render_project_html(make_project([make_block(1, faq, {"items": []})]))
+    assert ".faq details" in faq_only
+    assert ".hero {" not in faq_only
+    assert ".asset-placeholder {" not in faq_only
+
+    mixed = publisher.render_project_html(make_project([make_block(1, faq, {}), make_block(2, custom, {})]))
+    assert "is-error" not in mixed and "Template error" not in mixed
+    assert 'data-field-kind="asset" data-field-label="Cover"><div class="asset-placeholder">' in mixed
+    assert publisher.css_groups_for_blocks([make_block(2, custom, {})]) == ["cta", "asset-placeholder"]
+    assert mixed.index(".cta {") < mixed.index(".faq details") < mixed.index(".asset-placeholder {")
+
+
+def test_custom_template_budgets_render_error_placeholder(monkeypatch) -> None:
+    monkeypatch.setattr(publisher, "BLOCK_RENDER_CACHE", LRUCache(1024 * 1024, sizeof=lambda rendered: rendered.size))
+    monkeypatch.setattr("app.services.template_sandbox.settings.custom_template_max_steps", 1000)
+    monkeypatch.setattr("app.services.template_sandbox.settings.custom_template_max_output_bytes", 10_000)
+    pathological = {
+        "loop": "{% for i in range(99999) %}{% for j in range(99999) %}.{% endfor %}{% endfor %}",
+        "repeat": "{{ 'x' * 10000000 }}",
+        "doubling": "{% set s = namespace(v='ab') %}{% for i in range(40) %}{% set s.v = s.v ~ s.v %}{% endfor %}{{ s.v }}",
+        "output": "{% for i in range(900) %}{{ '0123456789abcdef' }}{% endfor %}",
+        "huge_range": "{% for i in range(10**6) %}.{% endfor %}",
+        "replace": "{% set s = 'a' * 90 %}{% set s = s|replace('a', s) %}{% set s = s|replace('a', s) %}{{ s }}",
+        "padding": "{{ '%0999999999d'|format(1) }}{{ 'x'.rjust(999999999) }}",
+    }
+    for index, (key, markup) in enumerate(pathological.items(), start=1):
+        definition = make_definition(key, template_markup=markup)
+        block = make_block(index, definition, {})
+        rendered = publisher.render_block(block, "ru", {})
+        assert "is-error" in rendered.html, key
+        assert "Template error" in rendered.html
+        assert not rendered.cacheable
+        assert len(publisher.BLOCK_RENDER_CACHE) == 0
+
+    ok = make_definition("ok", template_markup="{% for i in range(3) %}{{ helpers.text('title') }}{% endfor %}")
+    rendered = publisher.render_block(make_block(9, ok, {"title": "Fine"}), "ru", {})
+    assert rendered.html.count("Fine") == 3
+    assert "is-error" not in rendered.html
+
+
+def test_field_paths_compile_once_and_support_batch_access() -> None:
+    publisher.compile_field_path.cache_clear()
+    assert publisher.compile_field_path("items[1].title") == (("items", None), ("1", 1), ("title", None))
+    assert publisher.compile_field_path("items.1.title") == publisher.compile_field_path("items[1].title")
+
+    markup = (
+        "{% set head = helpers.values('title', 'cta.label', default='-') %}{{ head['title'] }}|{{ head['cta.label'] }}"
+        "{% for item in helpers.items('items') %}{% set f = helpers.item_values(item, 'title', 'price') %}"
+        ";{{ f.title }}={{ f.price }}{{ helpers.item_text(item, 'title') }}{% endfor %}"
+    )
+    definition = make_definition("catalog", template_markup=markup)
+    payload = {"title": "Plans", "items": [{"title": "Basic", "price": 10}, {"title": "Pro", "price": 25}]}
+    rendered = publisher.render_block(make_block(1, definition, payload), "ru", {})
+
+    assert "Plans|-;Basic=10" in rendered.html
+    assert ";Pro=25" in rendered.html
+    assert 'data-field-path="items.1.title">Pro</span>' in rendered.html
+    assert publisher.compile_field_path.cache_info().hits > 0
+
+
+def test_render_model_from_snapshot_prefers_catalog_definitions() -> None:
+    from app.services.render_model import RenderProject
+
+    catalog = {"hero": make_definition("hero", id=3)}
+    snapshot = {
+        "project": {"title": "Snap", "theme": {}, "settings": {}},
+        "blocks": [
+            {"id": 1, "definition_key": "hero", "order_index": 0, "config": {"headline": "From catalog"}},
+            {
+                "id": 2,
+                "definition_key": "promo",
+                "order_index": 1,
+                "config": None,
+                "definition": {
+                    "key": "promo",
+                    "template_markup": "<p>{{ payload.title }}</p>",
+                    "default_config": {"title": "Inline default"},
+                },
+            },
+        ],
+    }
+    model = RenderProject.from_snapshot(snapshot, catalog, inline_definitions=True)
+
+    assert model.blocks[0].definition.id == 3
+    assert model.blocks[1].definition.template_markup == "<p>{{ payload.title }}</p>"
+    assert not hasattr(model.blocks[0], "__dict__")
+    html = publisher.render_project_html(model)
+    assert "From catalog" in html and "Inline default" in html
+    assert RenderProject.from_orm(model) is model
+
+    # editor payloads are client-supplied: their inline markup is ignored
+    editor = RenderProject.from_snapshot(snapshot, catalog)
+    assert editor.blocks[1].definition.key == "promo"
+    assert editor.blocks[1].definition.template_markup is None
+    assert "Inline default" not in publisher.render_project_html(editor)
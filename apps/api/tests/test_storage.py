@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import pytest
+import urllib3
+
+from app.services import storage
+from app.services.cdn import delete_html, upload_html
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    backend = storage.MemoryBackend()
+    monkeypatch.setattr(storage, "STORAGE_METRICS", storage.StorageMetrics())
+    storage.set_backend(backend)
+    yield backend
+    storage.set_backend(None)
+
+
+def test_bucket_check_runs_once_per_process(memory_backend, monkeypatch) -> None:
+    calls: list[str] = []
+    monkeypatch.setattr(memory_backend, "ensure_bucket", calls.append)
+    storage.put_bytes("pages", "a/index.html", b"a", "text/html")
+    storage.put_bytes("pages", "b/index.html", b"b", "text/html")
+    assert calls == ["pages"]
+
+
+def test_storage_operations_are_counted(memory_backend) -> None:
+    storage.put_bytes("pages", "a/index.html", b"<p>hi</p>", "text/html")
+    storage.put_bytes("pages", "b/index.html", b"<p>hi</p>", "text/html")
+    with pytest.raises(storage.StorageError):
+        storage.get_object("pages", "missing.html")
+
+    operations = storage.storage_stats()["operations"]
+    assert operations["put"]["calls"] == 2
+    assert operations["put"]["bytes"] == 18
+    assert operations["get"]["errors"] == 1
+
+
+def test_cdn_upload_and_delete_on_memory_backend(memory_backend) -> None:
+    object_name, url = upload_html("landing/v1.html", "<p>Привет</p>", cache_control="no-cache")
+    assert url == "memory://renderly-pages/landing/v1.html"
+    data, content_type, metadata = memory_backend.objects[("renderly-pages", object_name)]
+    assert data == "<p>Привет</p>".encode("utf-8")
+    assert content_type == "text/html"
+    assert metadata == {"Cache-Control": "no-cache"}
+    assert ("renderly-pages", "landing/v1.html.gz") in memory_backend.objects
+
+    delete_html(object_name)
+    delete_html(object_name)  # already gone: still fine
+    assert not memory_backend.objects
+
+
+def test_minio_transport_errors_become_storage_errors(monkeypatch) -> None:
+    class Unreachable:
+        def __getattr__(self, name):
+            def call(*args, **kwargs):
+                raise urllib3.exceptions.MaxRetryError(None, "/renderly-pages", "connection refused")
+
+            return call
+
+    backend = storage.MinioBackend()
+    monkeypatch.setattr(backend, "client", Unreachable())
+    for operation, args in (
+        (backend.ensure_bucket, ("pages",)),
+        (backend.put, ("pages", "a.html", b"a", "text/html", None)),
+        (backend.url, ("pages", "a.html", 60)),
+        (backend.remove, ("pages", "a.html")),
+        (backend.open, ("pages", "a.html")),
+    ):
+        with pytest.raises(storage.StorageError):
+            operation(*args)
+
+    storage.set_backend(backend)
+    try:
+        with pytest.raises(RuntimeError, match="CDN upload failed"):
+            upload_html("landing/v1.html", "<p>hi</p>")
+        with pytest.raises(RuntimeError, match="CDN delete failed"):
+            delete_html("landing/v1.html")
+    finally:
+        storage.set_backend(None)
+
+
+def test_local_backend_writes_atomically_and_streams(tmp_path) -> None:
+    backend = storage.LocalBackend(tmp_path)
+    backend.ensure_bucket("assets")
+    backend.put("assets", "user/1/photo.png", b"x" * (storage.CHUNK_SIZE + 10), "image/png", None)
+    backend.put("assets", "user/1/photo.png", b"new", "image/png", None)
+
+    stored = tmp_path / "assets" / "user" / "1" / "photo.png"
+    assert stored.read_bytes() == b"new"
+    assert [path.name for path in stored.parent.iterdir()] == ["photo.png"]
+    obj = backend.open("assets", "user/1/photo.png")
+    assert b"".join(obj.stream()) == b"new"
+    obj.close()
+
+    backend.remove("assets", "user/1/photo.png")
+    backend.remove("assets", "user/1/photo.png")
+    assert not stored.exists()
+    with pytest.raises(storage.StorageError):
+        backend.put("assets", "../escape.html", b"", "text/html", None)
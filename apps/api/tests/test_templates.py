@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import json
+
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.security import get_password_hash
 from app.models.block_definition import BlockDefinition
 from app.models.block_instance import BlockInstance
@@ -174,3 +177,41 @@ def test_template_preview_endpoint(
     html = payload["html"]
     assert "Sample" in html or "Preview hero" in html
     assert "body::-webkit-scrollbar" in html
+
+
+def test_template_preview_batch_streams_ndjson(
+    client: TestClient,
+    user,
+    db_session: Session,
+) -> None:  # type: ignore[override]
+    project = create_sample_project(db_session, user)
+    headers = auth_headers(client, "test@example.com", "secret123")
+    template_ids = []
+    for title in ("First", "Second"):
+        publish = client.post(
+            "/api/templates",
+            json={"project_id": project.id, "title": title},
+            headers=headers,
+        )
+        assert publish.status_code == 201, publish.text
+        template_ids.append(publish.json()["id"])
+
+    response = client.post(
+        "/api/templates/preview/batch",
+        json={"template_ids": [*template_ids, 9999]},
+    )
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = {record["template_id"]: record for record in map(json.loads, response.text.splitlines())}
+    assert set(records) == {*template_ids, 9999}
+    assert records[9999]["error"] == "Template not found"
+    for template_id in template_ids:
+        assert "Sample" in records[template_id]["html"]
+        assert "body::-webkit-scrollbar" in records[template_id]["html"]
+        assert records[template_id]["generated_at"]
+
+    too_many = client.post(
+        "/api/templates/preview/batch",
+        json={"template_ids": list(range(1, settings.batch_render_max_items + 2))},
+    )
+    assert too_many.status_code == 400
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+
+
+@dataclass(eq=False)
+class CachedFile:
+    path: Path
+    body: bytes | mmap.mmap
+    etag: str
+    signature: tuple[int, int, int]
+    checked_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def _signature(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileCache:
+    """Byte-bounded LRU of published files, revalidated against the disk.
+
+    Files at or above ``mmap_threshold`` are mapped instead of read, so large
+    pages live in the page cache rather than on the heap. Publishing swaps a
+    host's release link instead of rewriting files, which leaves an existing
+    mapping on the old inode valid; the next revalidation notices the new
+    inode and maps it instead.
+    """
+
+    def __init__(self, max_bytes: int, mmap_threshold: int, revalidate_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+        self.revalidate_seconds = revalidate_seconds
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Path, CachedFile] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, path: Path) -> CachedFile | None:
+        """The cached file at ``path``, loading it on a miss; ``None`` if it does not exist."""
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.checked_at < self.revalidate_seconds:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+        try:
+            stat = path.stat()
+        except OSError:
+            self.invalidate(path)
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.signature == _signature(stat):
+                entry.checked_at = now
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+        loaded = self._load(path, stat, now)
+        with self._lock:
+            self.misses += 1
+            if loaded is None:
+                return None
+            self._drop(path)
+            if loaded.size <= self.max_bytes:
+                self._entries[path] = loaded
+                self.bytes += loaded.size
+                while self.bytes > self.max_bytes and self._entries:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+        return loaded
+
+    def _load(self, path: Path, stat: os.stat_result, now: float) -> CachedFile | None:
+        try:
+            with path.open("rb") as handle:
+                if stat.st_size and stat.st_size >= self.mmap_threshold:
+                    body: bytes | mmap.mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    body = handle.read()
+                stat = os.fstat(handle.fileno())
+        except (OSError, ValueError):
+            return None
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        return CachedFile(path=path, body=body, etag=f'"{digest}"', signature=_signature(stat), checked_at=now)
+
+    def _drop(self, path: Path) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            # mappings are not closed here: a response still streaming one holds a reference
+            self.bytes -= entry.size
+
+    def invalidate(self, path: Path | None = None) -> int:
+        """Drop one path, or everything when ``path`` is ``None``; returns the number of entries dropped."""
+        with self._lock:
+            if path is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self.bytes = 0
+                return count
+            if path in self._entries:
+                self._drop(path)
+                return 1
+            return 0
+
+    def invalidate_tree(self, root: Path) -> int:
+        """Drop every entry at or below ``root``; returns the number of entries dropped."""
+        with self._lock:
+            paths = [path for path in self._entries if path == root or path.is_relative_to(root)]
+            for path in paths:
+                self._drop(path)
+            return len(paths)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
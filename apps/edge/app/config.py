@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+from pydantic import BaseModel
+
+
+class Settings(BaseModel):
+    domains_dir: str = os.getenv("EDGE_DOMAINS_DIR", "/var/renderly/domains")
+    default_dir: str | None = os.getenv("EDGE_DEFAULT_DIR") or None
+    cache_max_bytes: int = int(os.getenv("EDGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    mmap_threshold_bytes: int = int(os.getenv("EDGE_MMAP_THRESHOLD_BYTES", str(1024 * 1024)))
+    revalidate_seconds: float = float(os.getenv("EDGE_REVALIDATE_SECONDS", "1"))
+    cache_control: str = os.getenv("EDGE_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+    redis_url: str | None = os.getenv("EDGE_REDIS_URL") or None
+    origin_url: str | None = os.getenv("EDGE_ORIGIN_URL") or None
+    route_ttl_seconds: float = float(os.getenv("EDGE_ROUTE_TTL_SECONDS", "60"))
+    purge_token: str | None = os.getenv("EDGE_PURGE_TOKEN") or None
+    artifact_cache_max_bytes: int = int(os.getenv("EDGE_ARTIFACT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    artifact_miss_ttl_seconds: float = float(os.getenv("EDGE_ARTIFACT_MISS_TTL_SECONDS", "10"))
+
+
+settings = Settings()
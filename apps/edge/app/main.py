@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+from fastapi.responses import Response, StreamingResponse
+
+from .cache import CachedFile, FileCache
+from .config import settings
+from .routing import ArtifactStore, RouteTable, artifact_key, route_artifacts
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover
+    redis = None  # type: ignore
+
+# preferred first; suffixes match what the API writes next to every page
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+CHUNK_SIZE = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if routes is not None:
+        routes.start()
+    yield
+
+
+app = FastAPI(title="Renderly Edge", version="0.1.0", docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
+cache = FileCache(settings.cache_max_bytes, settings.mmap_threshold_bytes, settings.revalidate_seconds)
+# with Redis and a storage origin configured, hosts resolve through the API's routing table
+# and no shared domains volume is needed; the directory lookup stays as the fallback
+routes: RouteTable | None = None
+artifacts: ArtifactStore | None = None
+if settings.redis_url and settings.origin_url and redis is not None:
+    routes = RouteTable(redis.from_url(settings.redis_url), settings.route_ttl_seconds)
+    artifacts = ArtifactStore(
+        settings.origin_url,
+        settings.artifact_cache_max_bytes,
+        miss_ttl_seconds=settings.artifact_miss_ttl_seconds,
+    )
+
+
+class LatencyStats:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.requests = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.statuses: dict[int, int] = {}
+
+    def record(self, status_code: int, elapsed: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.total_ms += elapsed * 1000
+            self.max_ms = max(self.max_ms, elapsed * 1000)
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+
+    def snapshot(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "avg_ms": round(self.total_ms / self.requests, 3) if self.requests else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "statuses": dict(self.statuses),
+            }
+
+
+latency = LatencyStats()
+
+
+def _clean_host(value: str) -> str | None:
+    host = value.strip().lower().rstrip(".")
+    if not host or "/" in host or "\\" in host or host.startswith("."):
+        return None
+    return host
+
+
+def _hostname(request: Request) -> str | None:
+    return _clean_host((request.headers.get("host") or "").split(":", 1)[0])
+
+
+def _candidates(host: str, path: str) -> list[Path]:
+    """Same lookup order as the nginx ``try_files`` rule for custom domains."""
+    root = Path(settings.domains_dir) / host
+    segments = [segment for segment in path.split("/") if segment]
+    candidates = []
+    if segments and all(segment not in (".", "..") for segment in segments):
+        candidates.append(root.joinpath(*segments) / "index.html")
+    candidates.append(root / "index.html")
+    if settings.default_dir:
+        candidates.append(Path(settings.default_dir) / "default" / "index.html")
+    return candidates
+
+
+def _accepted_encodings(header: str | None) -> set[str]:
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            accepted.add(name.lower())
+    return accepted
+
+
+def _select(identity: Path, accept_encoding: str | None) -> tuple[CachedFile, str | None] | None:
+    accepted = _accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted or "*" in accepted:
+            variant = cache.get(identity.with_name(identity.name + suffix))
+            if variant is not None:
+                return variant, encoding
+    page = cache.get(identity)
+    return (page, None) if page is not None else None
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def _body_chunks(body: memoryview):
+    for offset in range(0, len(body), CHUNK_SIZE):
+        yield bytes(body[offset : offset + CHUNK_SIZE])
+
+
+def _page_response(
+    request: Request,
+    body: bytes | memoryview,
+    etag: str,
+    encoding: str | None,
+) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": settings.cache_control,
+        "Vary": "Accept-Encoding",
+        "X-Renderly-Proxy": "edge",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Length"] = str(len(body))
+    if request.method == "HEAD":
+        return Response(status_code=200, headers=headers, media_type="text/html")
+    if isinstance(body, bytes):
+        return Response(body, headers=headers, media_type="text/html")
+    return StreamingResponse(_body_chunks(body), headers=headers, media_type="text/html")
+
+
+def _serve_route(request: Request, host: str, path: str) -> Response | None:
+    route = routes.get(host)
+    if route is None:
+        return None
+    key = artifact_key(route, path)
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted or "*" in accepted:
+            variant = artifacts.get(key + suffix)
+            if variant is not None:
+                return _page_response(request, variant[0], variant[1], encoding)
+    page = artifacts.get(key)
+    if page is None:
+        return None
+    return _page_response(request, page[0], page[1], None)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = perf_counter()
+    response = await call_next(request)
+    latency.record(response.status_code, perf_counter() - started)
+    return response
+
+
+@app.get("/healthz")
+def health() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/_edge/metrics")
+def metrics() -> dict[str, object]:
+    return {
+        "cache": cache.stats(),
+        "latency": latency.snapshot(),
+        "routes": routes.stats() if routes is not None else None,
+        "artifacts": artifacts.stats() if artifacts is not None else None,
+    }
+
+
+class PurgeRequest(BaseModel):
+    hosts: list[str] = Field(default_factory=list)
+
+
+@app.post("/_edge/purge")
+def purge(payload: PurgeRequest, request: Request) -> dict[str, int]:
+    if not settings.purge_token:
+        # an open purge endpoint would let anyone flush every cache layer
+        raise HTTPException(status_code=403, detail="Purge is disabled: EDGE_PURGE_TOKEN is not set")
+    if request.headers.get("authorization") != f"Bearer {settings.purge_token}":
+        raise HTTPException(status_code=401, detail="Invalid purge token")
+    evicted = 0
+    for host in filter(None, map(_clean_host, payload.hosts)):
+        evicted += cache.invalidate_tree(Path(settings.domains_dir) / host)
+        if routes is not None:
+            route = routes.cached(host)
+            evicted += routes.invalidate(host)
+            if route is not None and artifacts is not None:
+                # also forgets variants remembered as missing before their upload finished
+                keys = route_artifacts(route)
+                evicted += artifacts.forget(key + suffix for key in keys for suffix in ("", *dict(ENCODINGS).values()))
+    return {"evicted": evicted}
+
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD"])
+def serve(path: str, request: Request) -> Response:
+    host = _hostname(request)
+    if host is None:
+        return Response(status_code=400)
+    if routes is not None and artifacts is not None:
+        response = _serve_route(request, host, path)
+        if response is not None:
+            return response
+    for identity in _candidates(host, path):
+        selected = _select(identity, request.headers.get("accept-encoding"))
+        if selected is None:
+            continue
+        page, encoding = selected
+        body = page.body if isinstance(page.body, bytes) else memoryview(page.body)
+        return _page_response(request, body, page.etag, encoding)
+    return Response(status_code=404, headers={"X-Renderly-Proxy": "edge"})
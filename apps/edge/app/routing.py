@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Any, Iterable
+
+logger = logging.getLogger("renderly.edge.routing")
+
+# written by the API (app/services/routing.py)
+ROUTE_KEY_PREFIX = "renderly:route:"
+ROUTE_CHANNEL = "renderly:routes"
+
+
+class RouteTable:
+    """Host → published artifact lookups from Redis, cached locally until the API says otherwise.
+
+    Every route change is announced on :data:`ROUTE_CHANNEL`; the listener
+    drops the matching entry, so a lookup after a publish goes back to Redis.
+    The TTL only bounds staleness if a message is lost while reconnecting.
+    """
+
+    def __init__(self, client: Any, ttl_seconds: float) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.invalidations = 0
+        self._routes: dict[str, tuple[float, dict[str, Any] | None]] = {}
+        self._lock = Lock()
+
+    def get(self, hostname: str) -> dict[str, Any] | None:
+        now = monotonic()
+        with self._lock:
+            cached = self._routes.get(hostname)
+        if cached is not None and now - cached[0] < self.ttl_seconds:
+            return cached[1]
+        try:
+            raw = self.client.get(f"{ROUTE_KEY_PREFIX}{hostname}")
+        except Exception:  # noqa: BLE001 - fall back to the domain directories
+            logger.warning("route lookup failed for %s", hostname, exc_info=True)
+            return None
+        route = json.loads(raw) if raw else None
+        with self._lock:
+            self._routes[hostname] = (now, route)
+        return route
+
+    def cached(self, hostname: str) -> dict[str, Any] | None:
+        """The locally cached route for ``hostname``, without asking Redis."""
+        with self._lock:
+            cached = self._routes.get(hostname)
+        return cached[1] if cached is not None else None
+
+    def invalidate(self, hostname: str | None = None) -> int:
+        """Forget one host's route, or all of them; returns the number of entries dropped."""
+        with self._lock:
+            self.invalidations += 1
+            if hostname is None:
+                count = len(self._routes)
+                self._routes.clear()
+                return count
+            return int(self._routes.pop(hostname, None) is not None)
+
+    def handle_message(self, message: dict[str, Any]) -> None:
+        if message.get("type") != "message":
+            return
+        data = message.get("data")
+        self.invalidate(data.decode() if isinstance(data, bytes) else data)
+
+    def _listen_forever(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                pubsub.subscribe(ROUTE_CHANNEL)
+                # anything published while we were disconnected is lost
+                self.invalidate()
+                for message in pubsub.listen():
+                    self.handle_message(message)
+            except Exception:  # noqa: BLE001
+                logger.warning("route channel disconnected, retrying", exc_info=True)
+                sleep(1)
+
+    def start(self) -> None:
+        Thread(target=self._listen_forever, name="route-invalidation", daemon=True).start()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._routes), "invalidations": self.invalidations}
+
+
+class ArtifactStore:
+    """Byte-bounded LRU of versioned page objects fetched from the storage origin.
+
+    Versioned objects are content-addressed and never rewritten, so a cached
+    copy never needs revalidation. A missing object may still be on its way
+    (a route can be announced before every variant is uploaded), so misses are
+    only remembered for ``miss_ttl_seconds``, and a purge of the host forgets it.
+    """
+
+    def __init__(
+        self,
+        origin_url: str,
+        max_bytes: int,
+        timeout: float = 5.0,
+        max_entries: int = 10_000,
+        miss_ttl_seconds: float = 10.0,
+    ) -> None:
+        self.origin_url = origin_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        # key -> monotonic time after which the origin is asked again
+        self._missing: OrderedDict[str, float] = OrderedDict()
+        self._lock = Lock()
+
+    def fetch(self, key: str) -> bytes | None:
+        try:
+            with urllib.request.urlopen(f"{self.origin_url}/{key}", timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as exc:
+            if exc.code in (403, 404):
+                return None
+            raise
+
+    def get(self, key: str) -> tuple[bytes, str] | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if key in self._missing:
+                if monotonic() < self._missing[key]:
+                    self.hits += 1
+                    return None
+                del self._missing[key]
+        try:
+            body = self.fetch(key)
+        except Exception:  # noqa: BLE001 - do not remember transient failures
+            logger.warning("origin fetch failed for %s", key, exc_info=True)
+            return None
+        entry = (body, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"') if body is not None else None
+        with self._lock:
+            self.misses += 1
+            if entry is None:
+                if self.miss_ttl_seconds > 0:
+                    self._missing[key] = monotonic() + self.miss_ttl_seconds
+                    while len(self._missing) > self.max_entries:
+                        self._missing.popitem(last=False)
+            elif key not in self._entries and len(entry[0]) <= self.max_bytes:
+                self._entries[key] = entry
+                self.bytes += len(entry[0])
+                while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= len(evicted[0])
+        return entry
+
+    def forget(self, keys: Iterable[str]) -> int:
+        """Drop ``keys`` whether cached or remembered as missing; returns the number of entries dropped."""
+        count = 0
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.bytes -= len(entry[0])
+                    count += 1
+                count += self._missing.pop(key, None) is not None
+        return count
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "missing": len(self._missing),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def route_artifacts(route: dict[str, Any]) -> list[str]:
+    """Every versioned object a route serves: the default page and each locale page."""
+    return [route["artifact"], *(route.get("locales") or {}).values()]
+
+
+def artifact_key(route: dict[str, Any], path: str) -> str:
+    """The versioned object for ``path``: a locale page when the first segment names one."""
+    locales = route.get("locales") or {}
+    segments = [segment for segment in path.split("/") if segment]
+    if segments and segments[0] in locales:
+        return locales[segments[0]]
+    return route["artifact"]
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.cache import FileCache
+from app.routing import ROUTE_KEY_PREFIX, ArtifactStore, RouteTable
+
+
+@pytest.fixture
+def domains(monkeypatch, tmp_path):
+    monkeypatch.setattr(main.settings, "domains_dir", str(tmp_path))
+    monkeypatch.setattr(main, "cache", FileCache(1024 * 1024, mmap_threshold=64, revalidate_seconds=0))
+    return tmp_path
+
+
+def write_page(root, host: str, html: str, locale: str | None = None) -> None:
+    target = root / host / locale if locale else root / host
+    target.mkdir(parents=True, exist_ok=True)
+    (target / "index.html.tmp").write_text(html, encoding="utf-8")
+    os.replace(target / "index.html.tmp", target / "index.html")
+    (target / "index.html.gz").write_bytes(gzip.compress(html.encode("utf-8")))
+
+
+def test_serves_page_with_etag_and_304(domains) -> None:
+    write_page(domains, "promo.example.edu", "<p>Главная</p>")
+    client = TestClient(main.app)
+
+    first = client.get("/", headers={"Host": "promo.example.edu", "Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    assert first.text == "<p>Главная</p>"
+    etag = first.headers["etag"]
+
+    again = client.get("/", headers={"Host": "promo.example.edu", "If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    write_page(domains, "promo.example.edu", "<p>Новая версия</p>")
+    changed = client.get("/", headers={"Host": "promo.example.edu", "If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert changed.status_code == 200
+    assert changed.text == "<p>Новая версия</p>"
+
+    stats = client.get("/_edge/metrics").json()
+    assert stats["cache"]["hits"] >= 1
+    assert stats["latency"]["statuses"]["304"] == 1
+
+
+def test_prefers_precompressed_variant_and_locale_dirs(domains) -> None:
+    write_page(domains, "promo.example.edu", "<p>ru</p>" * 20)
+    write_page(domains, "promo.example.edu", "<p>en</p>" * 20, locale="en")
+    client = TestClient(main.app)
+
+    page = client.get("/en/", headers={"Host": "promo.example.edu:8088", "Accept-Encoding": "gzip, br;q=0"})
+    assert page.headers["content-encoding"] == "gzip"
+    assert page.headers["vary"] == "Accept-Encoding"
+    assert page.text == "<p>en</p>" * 20
+
+    assert client.get("/missing", headers={"Host": "promo.example.edu"}).text.startswith("<p>ru</p>")
+    assert client.get("/", headers={"Host": "unknown.example.edu"}).status_code == 404
+    assert client.get("/../promo.example.edu", headers={"Host": ".."}).status_code == 400
+
+
+def test_file_cache_is_byte_bounded(tmp_path) -> None:
+    cache = FileCache(max_bytes=100, mmap_threshold=10_000, revalidate_seconds=60)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_bytes(b"x" * 40)
+        assert cache.get(tmp_path / name) is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 80
+    assert stats["evictions"] == 1
+    assert cache.get(tmp_path / "missing") is None
+
+
+class FakeRedis:
+    def __init__(self, routes: dict[str, dict]) -> None:
+        self.routes = routes
+        self.lookups = 0
+
+    def get(self, key: str):
+        self.lookups += 1
+        route = self.routes.get(key.removeprefix(ROUTE_KEY_PREFIX))
+        return json.dumps(route).encode() if route else None
+
+
+def test_routes_resolve_through_table_until_invalidated(domains, monkeypatch) -> None:
+    redis = FakeRedis({"promo.example.edu": {"artifact": "projects/1/v1.html", "locales": {"en": "projects/1/v1/en.html"}}})
+    routes = RouteTable(redis, ttl_seconds=60)
+    artifacts = ArtifactStore("http://origin.local/renderly-html", max_bytes=1024)
+    objects = {"projects/1/v1.html": b"<p>v1</p>", "projects/1/v1/en.html": b"<p>en</p>", "projects/1/v2.html": b"<p>v2</p>"}
+    monkeypatch.setattr(artifacts, "fetch", objects.get)
+    monkeypatch.setattr(main, "routes", routes)
+    monkeypatch.setattr(main, "artifacts", artifacts)
+    client = TestClient(main.app)
+
+    first = client.get("/", headers={"Host": "promo.example.edu"})
+    assert first.text == "<p>v1</p>"
+    assert client.get("/en/", headers={"Host": "promo.example.edu"}).text == "<p>en</p>"
+    assert client.get("/", headers={"Host": "promo.example.edu", "If-None-Match": first.headers["etag"]}).status_code == 304
+    assert redis.lookups == 1
+
+    redis.routes["promo.example.edu"]["artifact"] = "projects/1/v2.html"
+    assert client.get("/", headers={"Host": "promo.example.edu"}).text == "<p>v1</p>"
+    routes.handle_message({"type": "message", "channel": b"renderly:routes", "data": b"promo.example.edu"})
+    assert client.get("/", headers={"Host": "promo.example.edu"}).text == "<p>v2</p>"
+    assert redis.lookups == 2
+
+    # hosts without a route still come from the domain directories
+    write_page(domains, "legacy.example.edu", "<p>disk</p>")
+    assert client.get("/", headers={"Host": "legacy.example.edu", "Accept-Encoding": "identity"}).text == "<p>disk</p>"
+    assert client.get("/_edge/metrics").json()["routes"]["invalidations"] == 1
+
+
+def test_purge_evicts_host_entries_and_checks_token(domains, monkeypatch) -> None:
+    write_page(domains, "promo.example.edu", "<p>ru</p>")
+    write_page(domains, "promo.example.edu", "<p>en</p>", locale="en")
+    write_page(domains, "other.example.edu", "<p>other</p>")
+    client = TestClient(main.app)
+    for host, path in (("promo.example.edu", "/"), ("promo.example.edu", "/en/"), ("other.example.edu", "/")):
+        assert client.get(path, headers={"Host": host, "Accept-Encoding": "identity"}).status_code == 200
+
+    monkeypatch.setattr(main.settings, "purge_token", None)
+    assert client.post("/_edge/purge", json={"hosts": ["promo.example.edu"]}).status_code == 403
+    monkeypatch.setattr(main.settings, "purge_token", "secret")
+    assert client.post("/_edge/purge", json={"hosts": ["promo.example.edu"]}).status_code == 401
+    purged = client.post(
+        "/_edge/purge",
+        json={"hosts": ["Promo.Example.Edu.", "../etc"]},
+        headers={"Authorization": "Bearer secret"},
+    )
+    assert purged.json() == {"evicted": 2}
+    assert main.cache.stats()["entries"] == 1
+
+
+def test_artifact_misses_expire_and_purge_forgets_only_the_hosts_objects(monkeypatch) -> None:
+    redis = FakeRedis({"promo.example.edu": {"artifact": "projects/1/v1.html"}, "other.example.edu": {"artifact": "projects/2/v1.html"}})
+    routes = RouteTable(redis, ttl_seconds=60)
+    artifacts = ArtifactStore("http://origin.local/renderly-html", max_bytes=1024, miss_ttl_seconds=60)
+    objects = {"projects/1/v1.html": b"<p>one</p>", "projects/2/v1.html": b"<p>two</p>"}
+    fetched: list[str] = []
+    monkeypatch.setattr(artifacts, "fetch", lambda key: fetched.append(key) or objects.get(key))
+    monkeypatch.setattr(main, "routes", routes)
+    monkeypatch.setattr(main, "artifacts", artifacts)
+    monkeypatch.setattr(main.settings, "purge_token", "secret")
+    client = TestClient(main.app)
+
+    for host in ("promo.example.edu", "other.example.edu"):
+        assert client.get("/", headers={"Host": host, "Accept-Encoding": "br"}).status_code == 200
+    objects["projects/1/v1.html.br"] = b"late"
+    # the missing variant is remembered for a while instead of asking the origin on every request
+    assert client.get("/", headers={"Host": "promo.example.edu", "Accept-Encoding": "br"}).text == "<p>one</p>"
+    assert fetched.count("projects/1/v1.html.br") == 1
+
+    purged = client.post("/_edge/purge", json={"hosts": ["promo.example.edu"]}, headers={"Authorization": "Bearer secret"})
+    # the route, the cached page and the remembered miss; the other host keeps its objects
+    assert purged.json() == {"evicted": 3}
+    assert artifacts.stats()["entries"] == 1
+    assert client.get("/", headers={"Host": "promo.example.edu", "Accept-Encoding": "br"}).headers["content-encoding"] == "br"
+
+    artifacts.miss_ttl_seconds = 0
+    assert artifacts.get("projects/1/missing.html") is None
+    assert artifacts.get("projects/1/missing.html") is None
+    assert fetched.count("projects/1/missing.html") == 2
+    assert artifacts.stats()["missing"] == 1